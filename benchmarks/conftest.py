@@ -0,0 +1,94 @@
+"""
+micro-benchmarks for the per-event hot paths, using pytest-benchmark.
+
+    # record a baseline, e.g. on main before starting performance work
+    pytest benchmarks --benchmark-save=baseline
+
+    # compare against the newest baseline. fails when a median is 25% slower
+    pytest benchmarks
+
+baselines are JSON files under benchmarks/baselines/<machine>/, and only the
+ones recorded on this machine and python version are compared against. without
+one, the benchmarks just run.
+
+async code runs on a VirtualTimeEventLoop, so timers cost no wall time, and each
+round handles `BATCH_SIZE` events, so the loop's own overhead is amortized.
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Coroutine, Iterator
+
+import pytest
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.virtual_time import VirtualTimeEventLoop
+from pytest_benchmark.fixture import BenchmarkFixture
+from pytest_benchmark.utils import get_machine_id, parse_compare_fail
+
+BATCH_SIZE = 1000
+
+_BASELINE_NAME = "baseline"
+_REGRESSION_THRESHOLD = "median:25%"
+_DEFAULT_STORAGE = "file://./.benchmarks"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config: pytest.Config) -> None:
+    """
+    keeps runs in benchmarks/baselines wherever pytest is started from, and
+    compares against the newest baseline unless told what to compare against
+    """
+    baselines_directory = Path(config.rootpath, "baselines")
+    if config.getoption("benchmark_storage") == _DEFAULT_STORAGE:
+        config.option.benchmark_storage = f"file://{baselines_directory}"
+    if config.getoption("benchmark_compare") or config.getoption("benchmark_save"):
+        return
+    baselines = sorted(
+        Path(baselines_directory, get_machine_id()).glob(f"*_{_BASELINE_NAME}.json")
+    )
+    if not baselines:
+        return
+    config.option.benchmark_compare = str(baselines[-1])
+    if not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = [
+            parse_compare_fail(_REGRESSION_THRESHOLD)
+        ]
+
+
+RunAsync = Callable[[Callable[[], Coroutine[Any, Any, Any]]], None]
+
+
+@pytest.fixture
+def virtual_time_event_loop() -> Iterator[VirtualTimeEventLoop]:
+    loop = VirtualTimeEventLoop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run_async(
+    benchmark: BenchmarkFixture, virtual_time_event_loop: VirtualTimeEventLoop
+) -> RunAsync:
+    """benchmarks a coroutine function, with a fresh coroutine for every round"""
+
+    def _run_async(coroutine_function: Callable[[], Coroutine[Any, Any, Any]]):
+        benchmark(
+            lambda: virtual_time_event_loop.run_until_complete(coroutine_function())
+        )
+
+    return _run_async
+
+
+def pico_remotes(count: int) -> list[PicoRemote]:
+    return [
+        PicoRemote(
+            remote_id,
+            PicoRemoteType.PICO_THREE_BUTTON_RAISE_LOWER,
+            f"remote-{remote_id}",
+            "benchmark-room",
+            {
+                button_number: button_id
+                for button_number, button_id in enumerate(ButtonId)
+            },
+        )
+        for remote_id in range(count)
+    ]
@@ -0,0 +1,50 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from conftest import BATCH_SIZE, RunAsync, pico_remotes
+from pico_to_mqtt.caseta.button_watcher import ButtonHistory, ButtonTracker
+from pico_to_mqtt.caseta.model import ButtonAction, ButtonId
+from pico_to_mqtt.clock import LoopClock
+from pico_to_mqtt.config import ButtonWatcherConfig, TaskSupervisionConfig
+from pico_to_mqtt.event_handler import EventHandler
+
+
+def test_process_button_event(run_async: RunAsync):
+    remotes = pico_remotes(BATCH_SIZE // 2)
+    event_handler = Mock(EventHandler)
+    event_handler.handle_event = AsyncMock()
+
+    async def _press_and_release_every_remote():
+        button_tracker = ButtonTracker(
+            asyncio.Condition(),
+            event_handler,
+            ButtonWatcherConfig(),
+            LoopClock(),
+            TaskSupervisionConfig(
+                max_button_watchers=BATCH_SIZE, metrics_log_interval_sec=0
+            ),
+        )
+        for remote in remotes:
+            await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+                remote, ButtonId.POWER_ON, ButtonAction.PRESS
+            )
+            await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+                remote, ButtonId.POWER_ON, ButtonAction.RELEASE
+            )
+        # the watchers would otherwise run into the next round
+        await button_tracker.button_watcher_tasks.cancel_all()
+
+    run_async(_press_and_release_every_remote)
+
+
+def test_button_history_increment(run_async: RunAsync):
+    async def _double_press_many_buttons():
+        clock = LoopClock()
+        for _ in range(BATCH_SIZE // 4):
+            button_history = ButtonHistory(5.0, clock)
+            await button_history.increment(ButtonAction.PRESS)
+            await button_history.increment(ButtonAction.RELEASE)
+            await button_history.increment(ButtonAction.PRESS)
+            await button_history.increment(ButtonAction.RELEASE)
+
+    run_async(_double_press_many_buttons)
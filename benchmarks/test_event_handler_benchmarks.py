@@ -0,0 +1,45 @@
+import asyncio
+from pathlib import Path
+from typing import Any, cast
+
+import aiomqtt
+from conftest import BATCH_SIZE, RunAsync, pico_remotes
+from pico_to_mqtt.caseta.model import ButtonEvent, ButtonId, CasetaEvent
+from pico_to_mqtt.clock import LoopClock
+from pico_to_mqtt.config import MqttConfig, PublishSchedulerConfig
+from pico_to_mqtt.event_handler import EventHandler
+
+
+class _NoOpMqttClient:
+    async def publish(self, *_args: Any, **_kwargs: Any) -> None:
+        pass
+
+
+def test_handle_event_and_publish(run_async: RunAsync):
+    events = [
+        CasetaEvent(remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED)
+        for remote in pico_remotes(BATCH_SIZE)
+    ]
+    mqtt_config = MqttConfig(
+        Path("client.crt"),
+        Path("client.key"),
+        Path("ca.pem"),
+        "mosquitto-broker.local",
+        8883,
+    )
+
+    async def _handle_and_publish_every_event():
+        event_handler = EventHandler(
+            cast(aiomqtt.Client, _NoOpMqttClient()),
+            asyncio.Condition(),
+            mqtt_config,
+            PublishSchedulerConfig(metrics_log_interval_sec=0),
+            LoopClock(),
+        )
+        run_task = asyncio.create_task(event_handler.run())
+        for event in events:
+            await event_handler.handle_event(event)
+        await event_handler.drain()
+        run_task.cancel()
+
+    run_async(_handle_and_publish_every_event)
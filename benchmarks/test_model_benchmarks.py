@@ -0,0 +1,36 @@
+from conftest import BATCH_SIZE
+from pico_to_mqtt.caseta.model import ButtonAction, ButtonId, ButtonState
+from pytest_benchmark.fixture import BenchmarkFixture
+
+
+def test_button_state_transitions(benchmark: BenchmarkFixture):
+    def _double_presses():
+        for _ in range(BATCH_SIZE):
+            button_state = ButtonState.NOT_PRESSED
+            for button_action in (
+                ButtonAction.PRESS,
+                ButtonAction.RELEASE,
+                ButtonAction.PRESS,
+                ButtonAction.RELEASE,
+            ):
+                assert button_state.is_button_action_valid(button_action)
+                button_state = button_state.next_state()
+
+    benchmark(_double_presses)
+
+
+def test_button_id_of_int(benchmark: BenchmarkFixture):
+    def _of_int():
+        for button_number in range(BATCH_SIZE):
+            ButtonId.of_int(button_number % 5)
+
+    benchmark(_of_int)
+
+
+def test_button_action_of_str(benchmark: BenchmarkFixture):
+    def _of_str():
+        for _ in range(BATCH_SIZE // 2):
+            ButtonAction.of_str("Press")
+            ButtonAction.of_str("Release")
+
+    benchmark(_of_str)
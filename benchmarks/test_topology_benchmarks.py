@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any
+from unittest.mock import Mock
+
+from conftest import RunAsync
+from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.caseta.model import PicoRemoteType
+from pico_to_mqtt.caseta.topology import Topology
+
+_REMOTE_COUNT = 500
+_AREA_COUNT = 50
+
+
+class _FakeSmartbridge:
+    """answers like a bridge with hundreds of remotes, without any I/O"""
+
+    def __init__(self) -> None:
+        self.areas = {
+            str(area_id): {"id": str(area_id), "name": f"Area {area_id}"}
+            for area_id in range(_AREA_COUNT)
+        }
+        self._devices: dict[str, dict[str, Any]] = {
+            "1": {"device_id": "1", "name": "Smart Bridge", "type": "SmartBridge"}
+        }
+        self._buttons: dict[str, dict[str, Any]] = {}
+        for remote_number in range(_REMOTE_COUNT):
+            remote_id = str(1000 + remote_number)
+            self._devices[remote_id] = {
+                "device_id": remote_id,
+                "name": f"Area {remote_number % _AREA_COUNT}_Remote {remote_number}",
+                "area": str(remote_number % _AREA_COUNT),
+                "type": PicoRemoteType.PICO_THREE_BUTTON_RAISE_LOWER.value,
+            }
+            for button_number in range(5):
+                button_id = str(100_000 + remote_number * 5 + button_number)
+                self._buttons[button_id] = {
+                    "device_id": button_id,
+                    "button_number": button_number,
+                    "parent_device": remote_id,
+                }
+
+    async def connect(self) -> None:
+        pass
+
+    def get_buttons(self) -> dict[str, dict[str, Any]]:
+        return self._buttons
+
+    def get_devices(self) -> dict[str, dict[str, Any]]:
+        return self._devices
+
+
+def test_topology_connect(run_async: RunAsync):
+    fake_smartbridge = _FakeSmartbridge()
+    button_tracker = Mock(ButtonTracker)
+
+    async def _connect():
+        topology = Topology(
+            fake_smartbridge,  # pyright: ignore[reportArgumentType]
+            asyncio.Condition(),
+            button_tracker,
+        )
+        await topology.connect()
+        assert topology.remotes_by_id is not None
+        assert len(topology.remotes_by_id) == _REMOTE_COUNT
+
+    run_async(_connect)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from pico_to_mqtt.caseta.model import CasetaEvent
+from pico_to_mqtt.clock import Clock, LoopClock
+from pico_to_mqtt.config import AggregateTopicConfig
+
+LOGGER = logging.getLogger(__name__)
+
+_ENCODING_VERSION = 1
+
+
+def button_topic_suffix(event: CasetaEvent) -> str:
+    return (
+        f"{event.remote.area_name}"
+        f"/{event.remote.name}"
+        f"/{event.button_id.as_mqtt_topic_friendly_name}"
+    )
+
+
+class AggregateBatcher:
+    """
+    collects published events into batches for a single aggregate topic. a batch
+    is published once it holds `max_batch_events` events, or `max_batch_delay_ms`
+    after its first event, whichever comes first.
+
+    a batch is compact JSON:
+
+        {"v": 1, "session": "<hex>", "seq": 7, "t": <unix ms of the first event>,
+         "events": [[<ms since t>, "<area>/<remote>/<button>", <ButtonEvent value>,
+                     <hold duration ms, optional>, <gesture id, optional>], ...]}
+
+    `seq` counts up from 0 for every batch of a session; a new session starts
+    whenever the service does, so a consumer can tell a restart from lost batches.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str, int, bool], Awaitable[None]],
+        aggregate_topic_config: AggregateTopicConfig,
+        clock: Clock = LoopClock(),
+    ) -> None:
+        self._publish = publish
+        self._aggregate_topic_config = aggregate_topic_config
+        self._clock = clock
+        self._session = uuid.uuid4().hex[:12]
+        self._next_sequence_number = 0
+        self._batch: list[list[Any]] = []
+        self._batch_started_at: float = 0.0
+        self._batch_started_at_unix_ms: int = 0
+        self._first_event_added = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self.published_batches: int = 0
+
+    def add(self, event: CasetaEvent) -> None:
+        now = self._clock.now()
+        if not self._batch:
+            self._batch_started_at = now
+            self._batch_started_at_unix_ms = round(time.time() * 1000)
+            self._first_event_added.set()
+        encoded_event: list[Any] = [
+            round((now - self._batch_started_at) * 1000),
+            button_topic_suffix(event),
+            event.button_event.value,
+        ]
+        if event.hold_duration_sec is not None or event.gesture_id is not None:
+            encoded_event.append(
+                round(event.hold_duration_sec * 1000)
+                if event.hold_duration_sec is not None
+                else None
+            )
+        if event.gesture_id is not None:
+            encoded_event.append(event.gesture_id)
+        self._batch.append(encoded_event)
+        if len(self._batch) >= self._aggregate_topic_config.max_batch_events:
+            self._batch_full.set()
+
+    async def run(self) -> None:
+        """publishes batches until cancelled"""
+        max_batch_delay_sec = self._aggregate_topic_config.max_batch_delay_ms / 1000
+        while True:
+            await self._first_event_added.wait()
+            flush_at = self._batch_started_at + max_batch_delay_sec
+            try:
+                async with asyncio.timeout(max(0.0, flush_at - self._clock.now())):
+                    await self._batch_full.wait()
+            except TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch = self._take_batch()
+        if batch is None:
+            return
+        await self._publish(
+            self._aggregate_topic_config.topic,
+            batch,
+            self._aggregate_topic_config.qos,
+            False,
+        )
+        self.published_batches += 1
+
+    def _take_batch(self) -> Optional[str]:
+        if not self._batch:
+            return None
+        encoded_batch = json.dumps(
+            {
+                "v": _ENCODING_VERSION,
+                "session": self._session,
+                "seq": self._next_sequence_number,
+                "t": self._batch_started_at_unix_ms,
+                "events": self._batch,
+            },
+            separators=(",", ":"),
+        )
+        self._next_sequence_number += 1
+        self._batch = []
+        self._first_event_added.clear()
+        self._batch_full.clear()
+        return encoded_batch
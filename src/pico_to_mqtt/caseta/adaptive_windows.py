@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, MutableMapping, Optional
+
+from pico_to_mqtt.caseta.model import ButtonAction, ButtonId, PicoRemote
+from pico_to_mqtt.config import AdaptiveDoubleClickConfig
+
+LOGGER = logging.getLogger(__name__)
+
+_STATE_FILE_VERSION = 1
+
+
+class GapHistogram:
+    """
+    counts the gaps between a button's release and its next press in fixed-width
+    buckets up to `max_window_ms`; longer gaps share one overflow count. once the
+    total passes `max_samples` every count is halved, so memory stays constant and
+    old habits fade.
+    """
+
+    def __init__(
+        self, bucket_width_ms: int, max_window_ms: int, max_samples: int
+    ) -> None:
+        self._bucket_width_ms = bucket_width_ms
+        self._max_samples = max_samples
+        self.buckets: list[int] = [0] * math.ceil(max_window_ms / bucket_width_ms)
+        self.overflow: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.in_range_total + self.overflow
+
+    @property
+    def in_range_total(self) -> int:
+        return sum(self.buckets)
+
+    def record(self, gap_sec: float) -> None:
+        bucket_index = int(gap_sec * 1000 // self._bucket_width_ms)
+        if bucket_index < len(self.buckets):
+            self.buckets[bucket_index] += 1
+        else:
+            self.overflow += 1
+        if self.total > self._max_samples:
+            self.buckets = [count // 2 for count in self.buckets]
+            self.overflow //= 2
+
+    def percentile_upper_bound_ms(self, percentile: float) -> Optional[int]:
+        """
+        the upper edge of the bucket holding the given percentile of the gaps that
+        fell inside the histogram, or None when there are none
+        """
+        in_range_total = self.in_range_total
+        if in_range_total == 0:
+            return None
+        rank = max(math.ceil(percentile / 100 * in_range_total), 1)
+        seen = 0
+        for bucket_index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return (bucket_index + 1) * self._bucket_width_ms
+        return len(self.buckets) * self._bucket_width_ms
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"buckets": list(self.buckets), "overflow": self.overflow}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        """loads saved counts. they are dropped if the bucket layout changed"""
+        buckets = state.get("buckets")
+        if not isinstance(buckets, list) or len(buckets) != len(self.buckets):
+            return
+        self.buckets = [int(count) for count in buckets]
+        self.overflow = int(state.get("overflow", 0))
+
+
+class AdaptiveDoubleClickWindows:
+    """
+    learns each button's double click window from the gaps between its presses.
+    a button that is rarely pressed twice in quick succession ends up with a short
+    window, so its single presses are published sooner; one that is often pressed
+    again just after the window closed gets a longer window.
+    """
+
+    def __init__(self, adaptive_double_click_config: AdaptiveDoubleClickConfig) -> None:
+        self._config = adaptive_double_click_config
+        self._histograms: MutableMapping[tuple[int, ButtonId], GapHistogram] = {}
+        self._last_release_at: MutableMapping[tuple[int, ButtonId], float] = {}
+        self._learned_windows_sec: MutableMapping[
+            tuple[int, ButtonId], Optional[float]
+        ] = {}
+        self._dirty = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.enabled
+
+    def reconfigure(self, adaptive_double_click_config: AdaptiveDoubleClickConfig):
+        if adaptive_double_click_config == self._config:
+            return
+        saved_state = self.as_dict()
+        self._config = adaptive_double_click_config
+        self._histograms = {}
+        self._learned_windows_sec = {}
+        self.restore(saved_state)
+
+    def observe(
+        self,
+        remote: PicoRemote,
+        button_id: ButtonId,
+        button_action: ButtonAction,
+        now: float,
+    ) -> None:
+        if not self._config.enabled:
+            return
+        button_key = (remote.device_id, button_id)
+        if button_action == ButtonAction.RELEASE:
+            self._last_release_at[button_key] = now
+            return
+        last_release_at = self._last_release_at.pop(button_key, None)
+        if last_release_at is None:
+            return
+        self._histogram(button_key).record(now - last_release_at)
+        self._learned_windows_sec.pop(button_key, None)
+        self._dirty = True
+
+    def double_click_window_sec(
+        self, remote: PicoRemote, button_id: ButtonId, configured_window_sec: float
+    ) -> float:
+        """the learned window, or the configured one until enough gaps were seen"""
+        if not self._config.enabled:
+            return configured_window_sec
+        button_key = (remote.device_id, button_id)
+        if button_key not in self._learned_windows_sec:
+            self._learned_windows_sec[button_key] = self._learn_window_sec(button_key)
+        learned_window_sec = self._learned_windows_sec[button_key]
+        if learned_window_sec is None:
+            return configured_window_sec
+        return learned_window_sec
+
+    def _learn_window_sec(self, button_key: tuple[int, ButtonId]) -> Optional[float]:
+        histogram = self._histograms.get(button_key)
+        if histogram is None or histogram.total < self._config.min_samples:
+            return None
+        percentile_ms = histogram.percentile_upper_bound_ms(self._config.gap_percentile)
+        if (
+            percentile_ms is None
+            or histogram.in_range_total * 100
+            < histogram.total * self._config.min_in_range_gap_percent
+        ):
+            # the button is (hardly) ever pressed again within the largest window
+            return self._config.min_window_ms / 1000
+        window_ms = min(
+            max(percentile_ms + self._config.margin_ms, self._config.min_window_ms),
+            self._config.max_window_ms,
+        )
+        return window_ms / 1000
+
+    def _histogram(self, button_key: tuple[int, ButtonId]) -> GapHistogram:
+        histogram = self._histograms.get(button_key)
+        if histogram is None:
+            histogram = GapHistogram(
+                self._config.bucket_width_ms,
+                self._config.max_window_ms,
+                self._config.max_samples,
+            )
+            self._histograms[button_key] = histogram
+        return histogram
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "version": _STATE_FILE_VERSION,
+            "bucket_width_ms": self._config.bucket_width_ms,
+            "histograms": {
+                f"{remote_id}/{button_id.name}": histogram.as_dict()
+                for (remote_id, button_id), histogram in self._histograms.items()
+            },
+        }
+
+    def restore(self, state: dict[str, Any]) -> None:
+        if (
+            state.get("version") != _STATE_FILE_VERSION
+            or state.get("bucket_width_ms") != self._config.bucket_width_ms
+        ):
+            LOGGER.info("the saved double click windows do not match the config")
+            return
+        for key, histogram_state in state.get("histograms", {}).items():
+            remote_id, button_name = key.split("/", 1)
+            if button_name not in ButtonId.__members__:
+                continue
+            button_key = (int(remote_id), ButtonId[button_name])
+            self._histogram(button_key).restore(histogram_state)
+            self._learned_windows_sec.pop(button_key, None)
+
+    def load(self, state_file: Path) -> None:
+        try:
+            self.restore(json.loads(state_file.read_text()))
+        except FileNotFoundError:
+            LOGGER.info("no saved double click windows at %s", state_file)
+        except (ValueError, AttributeError, TypeError) as e:
+            LOGGER.warning(
+                "ignoring the unreadable double click windows at %s. exception: %s",
+                state_file,
+                e,
+            )
+
+    def save(self, state_file: Path) -> None:
+        self._dirty = False
+        _write_state(state_file, self.as_dict())
+
+    async def save_periodically(self, state_file: Path) -> None:
+        """saves the learned windows whenever they changed, and once more on exit"""
+        try:
+            while True:
+                await asyncio.sleep(self._config.save_interval_sec)
+                if self._dirty:
+                    # the state is copied on the loop; only the write is offloaded
+                    state = self.as_dict()
+                    self._dirty = False
+                    await asyncio.to_thread(_write_state, state_file, state)
+        finally:
+            if self._dirty:
+                self.save(state_file)
+
+
+def _write_state(state_file: Path, state: dict[str, Any]) -> None:
+    """writes to a temporary file first, so a crash never leaves half a file"""
+    temporary_file = state_file.with_name(f"{state_file.name}.tmp")
+    temporary_file.write_text(json.dumps(state))
+    os.replace(temporary_file, state_file)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import time
+from typing import Any, Mapping, Optional
+
+from pylutron_caseta.leap import LeapProtocol
+from pylutron_caseta.smartbridge import LEAP_PORT
+
+from pico_to_mqtt.config import CasetaConfig
+from pico_to_mqtt.metrics import LatencyRecorder
+
+LOGGER = logging.getLogger(__name__)
+
+# what `pylutron_caseta.leap.open_connection` uses. the bridge sends the whole
+# device list in one message
+_LEAP_STREAM_LIMIT = 2**18
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """an ssl context that offers `resumable_session` to every connection it makes"""
+
+    resumable_session: Optional[ssl.SSLSession] = None
+
+    def wrap_bio(
+        self,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+        server_side: bool = False,
+        server_hostname: str | bytes | None = None,
+        session: Optional[ssl.SSLSession] = None,
+    ) -> ssl.SSLObject:
+        # asyncio has no way to pass a session through to here
+        return super().wrap_bio(
+            incoming,
+            outgoing,
+            server_side,
+            server_hostname,
+            session if session is not None else self.resumable_session,
+        )
+
+
+def _new_ssl_context(caseta_config: CasetaConfig) -> _ResumingSSLContext:
+    """the same settings as `Smartbridge.create_tls`. reads the files, so it blocks"""
+    ssl_context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
+    ssl_context.load_verify_locations(caseta_config.path_to_caseta_client_ca)
+    ssl_context.load_cert_chain(
+        caseta_config.path_to_caseta_client_cert,
+        caseta_config.path_to_caseta_client_key,
+    )
+    ssl_context.verify_mode = ssl.CERT_REQUIRED
+    return ssl_context
+
+
+class BridgeConnector:
+    """
+    opens LEAP connections to the bridge for every `Smartbridge` the service
+    creates, in place of `Smartbridge.create_tls`. the ssl context is built once
+    and only rebuilt when a key or certificate file changes, and each connection
+    offers the previous connection's tls session, so the bridge can resume it
+    instead of doing a full handshake. how long connecting takes is recorded.
+    """
+
+    def __init__(self, caseta_config: CasetaConfig, port: int = LEAP_PORT) -> None:
+        self._caseta_config = caseta_config
+        self._port = port
+        self._ssl_context: Optional[_ResumingSSLContext] = None
+        self._ssl_files_stamp: Optional[tuple[int, ...]] = None
+        self._building_ssl_context = asyncio.Lock()
+        # tls 1.3 sends session tickets after the handshake, so the session to
+        # resume is only read from the last connection when the next one opens
+        self._last_ssl_object: Optional[ssl.SSLObject] = None
+        self.handshake_latency = LatencyRecorder()
+        self.resumed_handshakes: int = 0
+        self.full_handshakes: int = 0
+
+    def _ssl_files_stamps(self) -> tuple[int, ...]:
+        return tuple(
+            os.stat(path).st_mtime_ns
+            for path in (
+                self._caseta_config.path_to_caseta_client_ca,
+                self._caseta_config.path_to_caseta_client_cert,
+                self._caseta_config.path_to_caseta_client_key,
+            )
+        )
+
+    async def _current_ssl_context(self) -> _ResumingSSLContext:
+        async with self._building_ssl_context:
+            ssl_files_stamp = await asyncio.to_thread(self._ssl_files_stamps)
+            if self._ssl_context is None or ssl_files_stamp != self._ssl_files_stamp:
+                if self._ssl_context is not None:
+                    LOGGER.info("caseta tls files changed. rebuilding the ssl context")
+                self._ssl_context = await asyncio.to_thread(
+                    _new_ssl_context, self._caseta_config
+                )
+                self._ssl_files_stamp = ssl_files_stamp
+                # a session only resumes with the context that created it
+                self._last_ssl_object = None
+            return self._ssl_context
+
+    async def connect(self) -> LeapProtocol:
+        ssl_context = await self._current_ssl_context()
+        ssl_context.resumable_session = (
+            self._last_ssl_object.session if self._last_ssl_object is not None else None
+        )
+        started_at = time.monotonic()
+        reader, writer = await asyncio.open_connection(
+            self._caseta_config.caseta_bridge_hostname,
+            self._port,
+            limit=_LEAP_STREAM_LIMIT,
+            server_hostname="",
+            ssl=ssl_context,
+            family=socket.AF_INET,
+        )
+        handshake_sec = time.monotonic() - started_at
+        self.handshake_latency.record(handshake_sec)
+
+        ssl_object: Optional[ssl.SSLObject] = writer.get_extra_info("ssl_object")
+        resumed = ssl_object is not None and ssl_object.session_reused
+        if resumed:
+            self.resumed_handshakes += 1
+        else:
+            self.full_handshakes += 1
+        self._last_ssl_object = ssl_object
+        LOGGER.info(
+            "connected to the caseta bridge in %.0f ms (%s tls handshake)",
+            handshake_sec * 1000,
+            "resumed" if resumed else "full",
+        )
+        return LeapProtocol(reader, writer)
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            "handshake_latency": self.handshake_latency.snapshot(),
+            "resumed_handshakes": self.resumed_handshakes,
+            "full_handshakes": self.full_handshakes,
+        }
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from typing import Iterable, Mapping, Optional
+
+import attrs
+
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote
+from pico_to_mqtt.config import (
+    ButtonWatcherConfig,
+    GestureProfile,
+    LongPressRepeatPolicy,
+)
+
+
+@attrs.frozen
+class ButtonTimings:
+    """the timing parameters of a single button, in float seconds"""
+
+    double_click_enabled: bool
+    double_click_window_sec: float
+    sleep_duration_sec: float = attrs.field(validator=attrs.validators.gt(0))
+    max_duration_sec: float
+    min_repeat_interval_sec: float = attrs.field(validator=attrs.validators.gt(0))
+    accelerating_repeat_factor: float
+    long_press_repeat_policy: LongPressRepeatPolicy
+    optimistic_single_press: bool
+
+    @classmethod
+    def of_config(
+        cls, button_watcher_config: ButtonWatcherConfig, button_id: ButtonId
+    ) -> ButtonTimings:
+        return cls(
+            double_click_enabled=True,
+            double_click_window_sec=(
+                button_watcher_config.double_click_window.get_double_click_window(
+                    button_id
+                ).total_seconds()
+            ),
+            sleep_duration_sec=button_watcher_config.sleep_duration_ms / 1000,
+            max_duration_sec=button_watcher_config.max_duration_ms / 1000,
+            min_repeat_interval_sec=button_watcher_config.min_repeat_interval_ms / 1000,
+            accelerating_repeat_factor=button_watcher_config.accelerating_repeat_factor,
+            long_press_repeat_policy=(
+                button_watcher_config.long_press_repeat_policies.get_repeat_policy(
+                    button_id
+                )
+            ),
+            optimistic_single_press=button_watcher_config.optimistic_single_press,
+        )
+
+    @classmethod
+    def of_remote_button(
+        cls,
+        button_watcher_config: ButtonWatcherConfig,
+        remote: PicoRemote,
+        button_id: ButtonId,
+    ) -> ButtonTimings:
+        """applies the gesture profiles that match this button, broadest first"""
+        gesture_profiles = button_watcher_config.gesture_profiles
+        remote_key = f"{remote.area_name}/{remote.name}"
+        matching_profiles = [
+            gesture_profiles.by_area.get(remote.area_name),
+            gesture_profiles.by_remote.get(remote_key),
+            gesture_profiles.by_button.get(
+                f"{remote_key}/{button_id.as_mqtt_topic_friendly_name}"
+            ),
+        ]
+        button_timings = cls.of_config(button_watcher_config, button_id)
+        for gesture_profile in matching_profiles:
+            if gesture_profile is not None:
+                button_timings = button_timings._with_profile(gesture_profile)
+        return button_timings
+
+    def _with_profile(self, gesture_profile: GestureProfile) -> ButtonTimings:
+        button_timings = self
+        if gesture_profile.double_click_enabled is not None:
+            button_timings = attrs.evolve(
+                button_timings,
+                double_click_enabled=gesture_profile.double_click_enabled,
+            )
+        if gesture_profile.double_click_window_ms is not None:
+            button_timings = attrs.evolve(
+                button_timings,
+                double_click_window_sec=gesture_profile.double_click_window_ms / 1000,
+            )
+        if gesture_profile.long_press_repeat_policy is not None:
+            button_timings = attrs.evolve(
+                button_timings,
+                long_press_repeat_policy=gesture_profile.long_press_repeat_policy,
+            )
+        if gesture_profile.optimistic_single_press is not None:
+            button_timings = attrs.evolve(
+                button_timings,
+                optimistic_single_press=gesture_profile.optimistic_single_press,
+            )
+        return button_timings
+
+
+class ButtonTimingTable:
+    """
+    the resolved timings of every button of every attached remote, so looking them
+    up on the hot path is a single dict access. buttons of remotes that were not
+    part of the table fall back to the global button watcher config.
+    """
+
+    def __init__(
+        self,
+        button_watcher_config: ButtonWatcherConfig,
+        remotes: Iterable[PicoRemote] = (),
+    ) -> None:
+        self._button_timings_by_button_id: Mapping[ButtonId, ButtonTimings] = {
+            button_id: ButtonTimings.of_config(button_watcher_config, button_id)
+            for button_id in ButtonId
+        }
+        self._button_timings_by_remote_button: Mapping[
+            tuple[int, ButtonId], ButtonTimings
+        ] = {
+            (remote.device_id, button_id): ButtonTimings.of_remote_button(
+                button_watcher_config, remote, button_id
+            )
+            for remote in remotes
+            for button_id in remote.buttons_by_button_id.values()
+        }
+
+    def get(self, remote: PicoRemote, button_id: ButtonId) -> ButtonTimings:
+        button_timings: Optional[ButtonTimings] = (
+            self._button_timings_by_remote_button.get((remote.device_id, button_id))
+        )
+        if button_timings is None:
+            return self._button_timings_by_button_id[button_id]
+        return button_timings
@@ -1,21 +1,34 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
-from datetime import datetime, timedelta
-from typing import Any, Callable, MutableMapping, Optional
+import uuid
+from typing import Any, Callable, Iterable, Mapping, MutableMapping, Optional
 
 import attrs
 
+from pico_to_mqtt.caseta.adaptive_windows import AdaptiveDoubleClickWindows
+from pico_to_mqtt.caseta.button_timings import ButtonTimingTable, ButtonTimings
 from pico_to_mqtt.caseta.model import (
     ButtonAction,
+    ButtonEvent,
     ButtonId,
     ButtonState,
+    CasetaEvent,
     IllegalStateTransitionError,
     PicoRemote,
 )
-from pico_to_mqtt.config import ButtonWatcherConfig
-from pico_to_mqtt.event_handler import ButtonEvent, CasetaEvent, EventHandler
+from pico_to_mqtt.clock import Clock, LoopClock
+from pico_to_mqtt.config import (
+    ButtonWatcherConfig,
+    LongPressRepeatPolicy,
+    TaskSupervisionConfig,
+)
+from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.journal import EventJournal
+from pico_to_mqtt.logging_config import ButtonLogContext
+from pico_to_mqtt.task_supervisor import SupervisedTaskGroup
 
 LOGGER = logging.getLogger(__name__)
 
@@ -33,15 +46,17 @@ class MutexLockedButtonState:
 class ButtonHistory:
     def __init__(
         self,
-        button_watcher_timeout: timedelta,
-        current_time_provider: Callable[[], datetime],
+        button_watcher_timeout_sec: float,
+        clock: Clock,
     ) -> None:
         self.mutex_locked_button_state = MutexLockedButtonState.new_instance()
         self._button_state: ButtonState = ButtonState.NOT_PRESSED
-        self._tracking_started_at: Optional[datetime] = None
+        self._tracking_started_at: Optional[float] = None
+        self._first_release_at: Optional[float] = None
+        self.first_release = asyncio.Event()
         self.is_finished: bool = False
-        self._button_watcher_timeout = button_watcher_timeout
-        self._current_time_provider = current_time_provider
+        self._button_watcher_timeout_sec = button_watcher_timeout_sec
+        self._clock = clock
 
     async def increment(self, button_action: ButtonAction) -> None:
         async with self.mutex_locked_button_state.mutex:
@@ -53,135 +68,231 @@ class ButtonHistory:
                     f"button action of {button_action}"
                 )
             if self.mutex_locked_button_state.state == ButtonState.NOT_PRESSED:
-                self._tracking_started_at = self._current_time_provider()
+                self._tracking_started_at = self._clock.now()
+            elif (
+                self.mutex_locked_button_state.state
+                == ButtonState.FIRST_PRESS_AWAITING_RELEASE
+            ):
+                self._first_release_at = self._clock.now()
+                self.first_release.set()
             self.mutex_locked_button_state.state = (
                 self.mutex_locked_button_state.state.next_state()
             )
 
-    def is_timed_out(self, now: datetime) -> bool:
+    def is_timed_out(self, now: float) -> bool:
         return (
             self._tracking_started_at is not None
-            and (now - self._tracking_started_at) > self._button_watcher_timeout
+            and (now - self._tracking_started_at) > self._button_watcher_timeout_sec
         )
 
+    @property
+    def hold_duration_sec(self) -> Optional[float]:
+        """how long the first press was held, once it has been released"""
+        if self._tracking_started_at is None or self._first_release_at is None:
+            return None
+        return self._first_release_at - self._tracking_started_at
+
+
+class LongPressRepeatSchedule:
+    """hands out the intervals between follow-up checkpoints of a held button"""
+
+    def __init__(self, button_timings: ButtonTimings) -> None:
+        self._repeat_policy = button_timings.long_press_repeat_policy
+        self._next_interval_sec = button_timings.sleep_duration_sec
+        self._min_interval_sec = button_timings.min_repeat_interval_sec
+        self._accelerating_repeat_factor = button_timings.accelerating_repeat_factor
+
+    def next_interval_sec(self) -> float:
+        interval_sec = self._next_interval_sec
+        if self._repeat_policy == LongPressRepeatPolicy.ACCELERATING:
+            self._next_interval_sec = max(
+                self._min_interval_sec,
+                self._next_interval_sec * self._accelerating_repeat_factor,
+            )
+        return interval_sec
+
 
 class ButtonWatcher:
     def __init__(
         self,
         pico_remote: PicoRemote,
         button_id: ButtonId,
-        button_watcher_config: ButtonWatcherConfig,
+        button_timings: ButtonTimings,
         event_handler: EventHandler,
         shutdown_condition: asyncio.Condition,
-        current_instant_provider: Callable[[], datetime],
+        clock: Clock,
     ) -> None:
         self._pico_remote = pico_remote
         self._button_id = button_id
-        self._button_watcher_config = button_watcher_config
+        self._button_timings = button_timings
         self._event_handler = event_handler
-        self._current_instant_provider = current_instant_provider
+        self._clock = clock
         self._shutdown_condition = shutdown_condition
-        self.button_history = ButtonHistory(
-            button_watcher_config.max_duration,
-            current_time_provider=current_instant_provider,
+        self._repeat_policy = button_timings.long_press_repeat_policy
+        self.button_history = ButtonHistory(button_timings.max_duration_sec, clock)
+        self.log_context = ButtonLogContext(pico_remote, button_id)
+        self._optimistic_single_press = (
+            button_timings.optimistic_single_press
+            and button_timings.double_click_enabled
         )
-
-    @property
-    def button_log_prefix(self) -> str:
-        return (
-            f"remote: <id: {self._pico_remote.device_id}, "
-            f"type: {self._pico_remote.type}, "
-            f"name: {self._pico_remote.name}>, "
-            f"button:{self._button_id}"
+        # shared by every event of an optimistic gesture, so consumers can match
+        # a later DOUBLE_PRESS_COMPLETED with the OPTIMISTIC_SINGLE_PRESS before it
+        self._gesture_id: Optional[str] = (
+            uuid.uuid4().hex if self._optimistic_single_press else None
         )
+        self._optimistic_single_press_emitted = False
 
     async def button_watcher_loop(self) -> None:
         try:
             button_history = self.button_history
 
             button_tracking_window_end = (
-                self._current_instant_provider()
-                + self._button_watcher_config.max_duration
+                self._clock.now() + self._button_timings.max_duration_sec
             )
 
-            await asyncio.sleep(
-                self._button_watcher_config.double_click_window.get_double_click_window(
-                    self._button_id
-                ).total_seconds()
-            )
+            if self._optimistic_single_press:
+                double_click_window_end = (
+                    self._clock.now() + self._button_timings.double_click_window_sec
+                )
+                await self._wait_for_first_release(
+                    self._button_timings.double_click_window_sec
+                )
+                if button_history.first_release.is_set():
+                    await self._emit_optimistic_single_press()
+                    await asyncio.sleep(
+                        max(0.0, double_click_window_end - self._clock.now())
+                    )
+            elif self._button_timings.double_click_enabled:
+                await asyncio.sleep(self._button_timings.double_click_window_sec)
+            else:
+                # without double clicks to wait for, a release is a finished
+                # single press. only a button that is still held after the window
+                # is a long press
+                await self._wait_for_first_release(
+                    self._button_timings.double_click_window_sec
+                )
 
             await self._handle_initial_tracking_checkpoint()
             if button_history.is_finished:
                 return
 
-            while self._current_instant_provider() < button_tracking_window_end:
-                await asyncio.sleep(
-                    self._button_watcher_config.sleep_duration.total_seconds()
-                )
+            repeat_schedule = LongPressRepeatSchedule(self._button_timings)
+            next_checkpoint_at = self._clock.now() + repeat_schedule.next_interval_sec()
+            while self._clock.now() < button_tracking_window_end:
+                await asyncio.sleep(max(0.0, next_checkpoint_at - self._clock.now()))
 
                 await self._handle_followup_tracking_checkpoints()
                 if button_history.is_finished:
                     return
+
+                next_checkpoint_at += repeat_schedule.next_interval_sec()
+                # if publishing fell behind, collapse the checkpoints we missed
+                # into the next one instead of emitting them back to back
+                coalesced_checkpoints = 0
+                while next_checkpoint_at <= self._clock.now():
+                    next_checkpoint_at += repeat_schedule.next_interval_sec()
+                    coalesced_checkpoints += 1
+                if coalesced_checkpoints:
+                    LOGGER.debug(
+                        "%s: coalesced %d missed long press checkpoints",
+                        self.log_context,
+                        coalesced_checkpoints,
+                    )
             button_history.is_finished = True
             LOGGER.debug(
                 (
                     "%s: the button tracking window ended without the button "
                     "reaching a terminal state"
                 ),
-                self.button_log_prefix,
+                self.log_context,
             )
         except Exception as e:
             LOGGER.error(
                 "%s: encountered a problem watching this button. exception: %s",
-                self.button_log_prefix,
+                self.log_context,
                 e,
             )
             async with self._shutdown_condition:
                 self._shutdown_condition.notify()
             raise e
 
+    async def _wait_for_first_release(self, timeout_sec: float) -> None:
+        try:
+            async with asyncio.timeout(timeout_sec):
+                await self.button_history.first_release.wait()
+        except TimeoutError:
+            pass
+
+    async def _emit_optimistic_single_press(self) -> None:
+        LOGGER.debug(
+            "%s: the first press was released, optimistically emitting a single press",
+            self.log_context,
+        )
+        self._optimistic_single_press_emitted = True
+        await self._event_handler.handle_event(
+            CasetaEvent(
+                self._pico_remote,
+                self._button_id,
+                ButtonEvent.OPTIMISTIC_SINGLE_PRESS,
+                gesture_id=self._gesture_id,
+            )
+        )
+
     async def _handle_initial_tracking_checkpoint(self):
         button_history = self.button_history
         async with button_history.mutex_locked_button_state.mutex:
             current_state = button_history.mutex_locked_button_state.state
-            if current_state == ButtonState.FIRST_PRESS_AND_FIRST_RELEASE:
-                LOGGER.debug("%s a single press has completed", self.button_log_prefix)
+            if (
+                current_state == ButtonState.FIRST_PRESS_AND_FIRST_RELEASE
+                and self._optimistic_single_press_emitted
+            ):
+                LOGGER.debug(
+                    "%s a single press has completed. it was already emitted",
+                    self.log_context,
+                )
+                button_history.is_finished = True
+                return
+            elif current_state == ButtonState.FIRST_PRESS_AND_FIRST_RELEASE:
+                LOGGER.debug("%s a single press has completed", self.log_context)
                 button_history.is_finished = True
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.SINGLE_PRESS_COMPLETED,
+                        gesture_id=self._gesture_id,
                     )
                 )
                 return
             elif current_state == ButtonState.DOUBLE_PRESS_FINISHED:
-                LOGGER.debug("%s: A double press has completed", self.button_log_prefix)
+                LOGGER.debug("%s: A double press has completed", self.log_context)
                 button_history.is_finished = True
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.DOUBLE_PRESS_COMPLETED,
+                        gesture_id=self._gesture_id,
                     )
                 )
                 return
             elif current_state == ButtonState.FIRST_PRESS_AWAITING_RELEASE:
                 LOGGER.debug(
                     "%s: A long press has started but not completed",
-                    self.button_log_prefix,
+                    self.log_context,
                 )
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.LONG_PRESS_ONGOING,
+                        gesture_id=self._gesture_id,
                     )
                 )
             else:
                 LOGGER.debug(
                     "%s: current button state is %s",
-                    self.button_log_prefix,
+                    self.log_context,
                     current_state,
                 )
 
@@ -189,43 +300,56 @@ class ButtonWatcher:
         async with self.button_history.mutex_locked_button_state.mutex:
             current_state = self.button_history.mutex_locked_button_state.state
             if current_state == ButtonState.FIRST_PRESS_AND_FIRST_RELEASE:
-                LOGGER.debug("%s a long press has completed", self.button_log_prefix)
+                LOGGER.debug("%s a long press has completed", self.log_context)
                 self.button_history.is_finished = True
+                hold_duration_sec = (
+                    self.button_history.hold_duration_sec
+                    if self._repeat_policy == LongPressRepeatPolicy.START_AND_DURATION
+                    else None
+                )
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.LONG_PRESS_COMPLETED,
+                        hold_duration_sec,
+                        gesture_id=self._gesture_id,
                     )
                 )
                 return
             elif current_state == ButtonState.DOUBLE_PRESS_FINISHED:
-                LOGGER.debug("%s: A double press has completed", self.button_log_prefix)
+                LOGGER.debug("%s: A double press has completed", self.log_context)
                 self.button_history.is_finished = True
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.DOUBLE_PRESS_COMPLETED,
+                        gesture_id=self._gesture_id,
                     )
                 )
                 return
             elif current_state == ButtonState.FIRST_PRESS_AWAITING_RELEASE:
                 LOGGER.debug(
                     "%s: A long press is still ongoing",
-                    self.button_log_prefix,
+                    self.log_context,
                 )
+                if self._repeat_policy == LongPressRepeatPolicy.START_AND_DURATION:
+                    # the LONG_PRESS_ONGOING event was already emitted
+                    # at the initial checkpoint
+                    return
                 await self._event_handler.handle_event(
                     CasetaEvent(
                         self._pico_remote,
                         self._button_id,
                         ButtonEvent.LONG_PRESS_ONGOING,
+                        gesture_id=self._gesture_id,
                     )
                 )
             else:
                 LOGGER.debug(
                     "%s: current button state is %s",
-                    self.button_log_prefix,
+                    self.log_context,
                     current_state,
                 )
 
@@ -233,6 +357,10 @@ class ButtonWatcher:
         await self.button_history.increment(button_action)
 
 
+def _mark_finished(button_history: ButtonHistory, _task: asyncio.Task[Any]) -> None:
+    button_history.is_finished = True
+
+
 @attrs.frozen(kw_only=True)
 class MutexLockedButtonTrackers:
     mutex: asyncio.Lock
@@ -245,38 +373,128 @@ class ButtonTracker:
         shutdown_condition: asyncio.Condition,
         caseta_event_handler: EventHandler,
         button_watcher_config: ButtonWatcherConfig,
-        current_instant_provider: Callable[[], datetime] = datetime.now,
+        clock: Clock = LoopClock(),
+        task_supervision_config: TaskSupervisionConfig = (
+            TaskSupervisionConfig.default_instance()
+        ),
+        journal: Optional[EventJournal] = None,
     ) -> None:
         self._shutdown_condition = shutdown_condition
         self._caseta_event_handler = caseta_event_handler
+        self._task_supervision_config = task_supervision_config
+        self._journal = journal
+        self.button_event_tasks = SupervisedTaskGroup(
+            "button events",
+            task_supervision_config.max_pending_button_events,
+            task_supervision_config.shedding_policy,
+        )
+        self.button_watcher_tasks = SupervisedTaskGroup(
+            "button watchers",
+            task_supervision_config.max_button_watchers,
+            task_supervision_config.shedding_policy,
+        )
         self._button_watcher_config = button_watcher_config
+        self._remotes: Iterable[PicoRemote] = ()
+        self._button_timing_table = ButtonTimingTable(button_watcher_config)
+        self.adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+            button_watcher_config.adaptive_double_click
+        )
         self._mutex_locked_button_watchers = MutexLockedButtonTrackers(
             mutex=asyncio.Lock(), button_watchers_by_remote_id=dict()
         )
-        self._current_instant_provider = current_instant_provider
+        self._clock = clock
+
+    @property
+    def button_watcher_config(self) -> ButtonWatcherConfig:
+        return self._button_watcher_config
+
+    def update_button_watcher_config(
+        self, button_watcher_config: ButtonWatcherConfig
+    ) -> None:
+        """
+        new button watchers use the new config. watchers that are already tracking
+        a gesture keep the timings they started with.
+        """
+        button_timing_table = ButtonTimingTable(button_watcher_config, self._remotes)
+        self._button_watcher_config = button_watcher_config
+        self._button_timing_table = button_timing_table
+        self.adaptive_double_click_windows.reconfigure(
+            button_watcher_config.adaptive_double_click
+        )
+
+    def attach_remotes(self, remotes: Iterable[PicoRemote]) -> None:
+        """resolves the gesture profiles of these remotes' buttons"""
+        self._remotes = list(remotes)
+        self._button_timing_table = ButtonTimingTable(
+            self._button_watcher_config, self._remotes
+        )
+
+    def _button_timings(self, remote: PicoRemote, button_id: ButtonId) -> ButtonTimings:
+        button_timings = self._button_timing_table.get(remote, button_id)
+        if not self.adaptive_double_click_windows.enabled:
+            return button_timings
+        return attrs.evolve(
+            button_timings,
+            double_click_window_sec=(
+                self.adaptive_double_click_windows.double_click_window_sec(
+                    remote, button_id, button_timings.double_click_window_sec
+                )
+            ),
+        )
 
     def button_event_callback(
         self, remote: PicoRemote, button_id: ButtonId
     ) -> Callable[[str], Any]:
-        return lambda button_event_str: asyncio.get_running_loop().create_task(
+        return lambda button_event_str: self.button_event_tasks.spawn(
             self._process_button_event(
                 remote, button_id, ButtonAction.of_str(button_event_str)
             )
         )
 
+    async def drain(self) -> None:
+        """
+        stops watching new gestures and waits for the gestures already being
+        watched to finish or time out. bridge events for those gestures are still
+        processed, so a held button can still be released.
+        """
+        self.button_watcher_tasks.close()
+        await self.button_watcher_tasks.wait()
+        self.button_event_tasks.close()
+        await self.button_event_tasks.wait()
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            "button_events": self.button_event_tasks.metrics_snapshot(),
+            "button_watchers": self.button_watcher_tasks.metrics_snapshot(),
+            "tracked_remotes": len(
+                self._mutex_locked_button_watchers.button_watchers_by_remote_id
+            ),
+        }
+
+    async def log_metrics_periodically(self) -> None:
+        interval_sec = self._task_supervision_config.metrics_log_interval_sec
+        if interval_sec <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval_sec)
+            LOGGER.info("button tracker task metrics: %s", self.metrics_snapshot())
+
     async def _process_button_event(
         self, remote: PicoRemote, button_id: ButtonId, button_action: ButtonAction
     ):
         """visible for testing"""
-        remote_info_logging_str = (
-            f"remote: (name: {remote.name}, "
-            "id: {remote.device_id}, button_id: {button_id})"
-        )
+        log_context = ButtonLogContext(remote, button_id)
         LOGGER.debug(
             "got a button event: %s, button_action: %s",
-            remote_info_logging_str,
+            log_context,
             button_action,
         )
+        now = self._clock.now()
+        if self._journal is not None:
+            self._journal.record_button_action(remote, button_id, button_action, now)
+        self.adaptive_double_click_windows.observe(
+            remote, button_id, button_action, now
+        )
 
         async with self._mutex_locked_button_watchers.mutex:
             button_watcher: Optional[
@@ -288,9 +506,7 @@ class ButtonTracker:
                 not button_watcher
                 or not button_watcher.button_history
                 or button_watcher.button_history.is_finished
-                or button_watcher.button_history.is_timed_out(
-                    self._current_instant_provider()
-                )
+                or button_watcher.button_history.is_timed_out(self._clock.now())
             ):
                 if button_action == ButtonAction.RELEASE:
                     LOGGER.debug(
@@ -299,20 +515,34 @@ class ButtonTracker:
                             "button action does not correspond to a "
                             "button currently being tracked. ignoring it"
                         ),
-                        remote_info_logging_str,
+                        log_context,
                         button_action,
                     )
                     return
                 button_watcher = ButtonWatcher(
                     remote,
                     button_id,
-                    self._button_watcher_config,
+                    self._button_timings(remote, button_id),
                     self._caseta_event_handler,
                     self._shutdown_condition,
-                    self._current_instant_provider,
+                    self._clock,
                 )
                 await button_watcher.increment_history(button_action)
-                asyncio.create_task(button_watcher.button_watcher_loop())
+                button_watcher_task = self.button_watcher_tasks.spawn(
+                    button_watcher.button_watcher_loop()
+                )
+                if button_watcher_task is None:
+                    LOGGER.debug(
+                        "%s: not watching this press. too many buttons are being "
+                        "watched, or the service is shutting down",
+                        log_context,
+                    )
+                    return
+                # a watcher cancelled to make room, possibly before it ever ran,
+                # must not take the remote's next presses
+                button_watcher_task.add_done_callback(
+                    functools.partial(_mark_finished, button_watcher.button_history)
+                )
             else:
                 await button_watcher.increment_history(button_action)
             self._mutex_locked_button_watchers.button_watchers_by_remote_id[
@@ -1,5 +1,5 @@
 from enum import Enum, StrEnum
-from typing import Iterable, Mapping
+from typing import Iterable, Mapping, Optional
 
 import attrs
 
@@ -105,3 +105,25 @@ class PicoRemote:
     name: str
     area_name: str
     buttons_by_button_id: Mapping[int, ButtonId]
+
+
+class ButtonEvent(Enum):
+    SINGLE_PRESS_COMPLETED = 0
+    LONG_PRESS_ONGOING = 1
+    LONG_PRESS_COMPLETED = 3
+    DOUBLE_PRESS_COMPLETED = 4
+    # emitted on the first release of buttons in optimistic single press mode,
+    # before the double click window has passed
+    OPTIMISTIC_SINGLE_PRESS = 5
+
+
+@attrs.frozen
+class CasetaEvent:
+    remote: PicoRemote
+    button_id: ButtonId
+    button_event: ButtonEvent
+    # only set for LONG_PRESS_COMPLETED events of buttons using the
+    # START_AND_DURATION long press repeat policy
+    hold_duration_sec: Optional[float] = None
+    # only set for buttons in optimistic single press mode
+    gesture_id: Optional[str] = None
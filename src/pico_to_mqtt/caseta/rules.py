@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Iterable, Mapping, Optional
+
+import attrs
+from pylutron_caseta.smartbridge import Smartbridge
+
+from pico_to_mqtt.caseta.model import ButtonEvent, ButtonId, CasetaEvent, PicoRemote
+from pico_to_mqtt.config import Rule, RuleAction, RulesConfig
+
+LOGGER = logging.getLogger(__name__)
+
+RuleKey = tuple[int, ButtonId, ButtonEvent]
+
+
+@attrs.frozen
+class CompiledRule:
+    rule: Rule
+    run: Callable[[], Awaitable[Any]]
+
+
+def _find_id(
+    target: str, candidates_by_id: Mapping[str, Mapping[str, Any]]
+) -> Optional[str]:
+    """the id of the candidate `target` names, by id or case-insensitive name"""
+    if target in candidates_by_id:
+        return target
+    for candidate_id, candidate in candidates_by_id.items():
+        if str(candidate.get("name", "")).lower() == target.lower():
+            return candidate_id
+    return None
+
+
+def _compile_rule(rule: Rule, caseta_bridge: Smartbridge) -> Optional[CompiledRule]:
+    if rule.action == RuleAction.ACTIVATE_SCENE:
+        scene_id = _find_id(rule.target, caseta_bridge.get_scenes())
+        if scene_id is None:
+            LOGGER.warning("rule for %s: no scene `%s`", rule.button, rule.target)
+            return None
+        return CompiledRule(
+            rule, functools.partial(caseta_bridge.activate_scene, scene_id)
+        )
+
+    device_id = _find_id(rule.target, caseta_bridge.get_devices())
+    if device_id is None:
+        LOGGER.warning("rule for %s: no device `%s`", rule.button, rule.target)
+        return None
+    fade_time: dict[str, Any] = (
+        {"fade_time": timedelta(milliseconds=rule.fade_time_ms)}
+        if rule.fade_time_ms is not None
+        else {}
+    )
+    match rule.action:
+        case RuleAction.TURN_ON:
+            run = functools.partial(caseta_bridge.turn_on, device_id, **fade_time)
+        case RuleAction.TURN_OFF:
+            run = functools.partial(caseta_bridge.turn_off, device_id, **fade_time)
+        case RuleAction.SET_LEVEL:
+            run = functools.partial(
+                caseta_bridge.set_value, device_id, rule.level, **fade_time
+            )
+        case RuleAction.RAISE_COVER:
+            run = functools.partial(caseta_bridge.raise_cover, device_id)
+        case RuleAction.LOWER_COVER:
+            run = functools.partial(caseta_bridge.lower_cover, device_id)
+        case RuleAction.STOP_COVER:
+            run = functools.partial(caseta_bridge.stop_cover, device_id)
+    return CompiledRule(rule, run)
+
+
+def compile_rules(
+    rules: Iterable[Rule], caseta_bridge: Smartbridge, remotes: Iterable[PicoRemote]
+) -> Mapping[RuleKey, tuple[CompiledRule, ...]]:
+    """
+    resolves every rule's button and target against the bridge, so an event only
+    costs one dict lookup. rules whose button or target is unknown are skipped
+    """
+    remote_buttons_by_name = {
+        f"{remote.area_name}/{remote.name}/{button_id.as_mqtt_topic_friendly_name}": (
+            remote.device_id,
+            button_id,
+        )
+        for remote in remotes
+        for button_id in remote.buttons_by_button_id.values()
+    }
+    compiled_rules: dict[RuleKey, tuple[CompiledRule, ...]] = {}
+    for rule in rules:
+        remote_button = remote_buttons_by_name.get(rule.button)
+        if remote_button is None:
+            LOGGER.warning("rule for %s: no such button", rule.button)
+            continue
+        compiled_rule = _compile_rule(rule, caseta_bridge)
+        if compiled_rule is None:
+            continue
+        remote_id, button_id = remote_button
+        key = (remote_id, button_id, rule.button_event)
+        compiled_rules[key] = compiled_rules.get(key, ()) + (compiled_rule,)
+    return compiled_rules
+
+
+class RulesEngine:
+    """
+    an event sink that runs the configured bridge actions for each event, over the
+    bridge session of the current topology. `attach` must be called whenever a
+    topology attaches; until then events are ignored.
+    """
+
+    name = "rules"
+
+    def __init__(self, rules_config: RulesConfig) -> None:
+        self._rules_config = rules_config
+        self._compiled_rules: Mapping[RuleKey, tuple[CompiledRule, ...]] = {}
+
+    def attach(self, caseta_bridge: Smartbridge, remotes: Iterable[PicoRemote]) -> None:
+        self._compiled_rules = compile_rules(
+            self._rules_config.rules, caseta_bridge, remotes
+        )
+        LOGGER.info(
+            "compiled %d of %d rules",
+            sum(len(rules) for rules in self._compiled_rules.values()),
+            len(self._rules_config.rules),
+        )
+
+    async def open(self) -> None:
+        pass
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        compiled_rules = self._compiled_rules.get(
+            (event.remote.device_id, event.button_id, event.button_event)
+        )
+        if compiled_rules is None:
+            return
+        LOGGER.debug(
+            "%s %s: running %d rules",
+            event.remote.name,
+            event.button_event.name,
+            len(compiled_rules),
+        )
+        # the bridge takes the commands in parallel, and one failure doesn't stop
+        # the other rules
+        results = await asyncio.gather(
+            *(compiled_rule.run() for compiled_rule in compiled_rules),
+            return_exceptions=True,
+        )
+        for compiled_rule, result in zip(compiled_rules, results):
+            if isinstance(result, BaseException):
+                raise RuntimeError(
+                    f"{compiled_rule.rule.action.name} {compiled_rule.rule.target} "
+                    f"failed: {result}"
+                ) from result
+
+    async def close(self) -> None:
+        pass
@@ -1,13 +1,16 @@
+import hashlib
 import itertools
+import json
 import logging
 from asyncio import Condition
 from typing import Mapping, Optional
 
 from pylutron_caseta.smartbridge import Smartbridge
 
+from pico_to_mqtt.caseta.bridge_connector import BridgeConnector
 from pico_to_mqtt.caseta.button_watcher import ButtonTracker
 from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
-from pico_to_mqtt.config import CasetaConfig
+from pico_to_mqtt.caseta.rules import RulesEngine
 
 LOGGER = logging.getLogger(__name__)
 
@@ -19,13 +22,34 @@ class TopologyInitializationException(Exception):
     pass
 
 
-def default_bridge(caseta_config: CasetaConfig) -> Smartbridge:
-    return Smartbridge.create_tls(
-        caseta_config.caseta_bridge_hostname,
-        caseta_config.path_to_caseta_client_key,
-        caseta_config.path_to_caseta_client_cert,
-        caseta_config.path_to_caseta_client_ca,
+def default_bridge(bridge_connector: BridgeConnector) -> Smartbridge:
+    """a bridge that connects, and reconnects, through the shared connector"""
+    return Smartbridge(bridge_connector.connect)
+
+
+def remote_fingerprint(remote: PicoRemote) -> str:
+    """a stable digest of everything there is to know about a remote"""
+    encoded_remote = json.dumps(
+        [
+            remote.device_id,
+            remote.type.value,
+            remote.name,
+            remote.area_name,
+            sorted(
+                (button_device_id, button_id.name)
+                for button_device_id, button_id in remote.buttons_by_button_id.items()
+            ),
+        ],
+        separators=(",", ":"),
     )
+    return hashlib.blake2b(encoded_remote.encode(), digest_size=16).hexdigest()
+
+
+def topology_fingerprint(remote_fingerprints: Mapping[int, str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for remote_id, fingerprint in sorted(remote_fingerprints.items()):
+        digest.update(f"{remote_id}:{fingerprint};".encode())
+    return digest.hexdigest()
 
 
 class Topology:
@@ -34,11 +58,18 @@ class Topology:
         caseta_bridge: Smartbridge,
         shutdown_condition: Condition,
         button_tracker: ButtonTracker,
+        rules_engine: Optional[RulesEngine] = None,
     ) -> None:
         self._caseta_bridge: Smartbridge = caseta_bridge
         self._shutdown_condition = shutdown_condition
         self._button_tracker = button_tracker
+        self._rules_engine = rules_engine
         self.remotes_by_id: Optional[Mapping[int, PicoRemote]]
+        # set by connect(). topologies with the same fingerprint have the same
+        # remotes, so a refresh only needs to compare these
+        self.remote_fingerprints: Mapping[int, str] = {}
+        self.fingerprint: Optional[str] = None
+        self.attached: bool = False
 
     async def connect(self) -> None:
         LOGGER.info("connecting to caseta bridge")
@@ -98,6 +129,11 @@ class Topology:
                     device["type"],
                 )
         self.remotes_by_id = remotes_by_id
+        self.remote_fingerprints = {
+            remote_id: remote_fingerprint(remote)
+            for remote_id, remote in remotes_by_id.items()
+        }
+        self.fingerprint = topology_fingerprint(self.remote_fingerprints)
         LOGGER.info("done connecting to caseta bridge")
 
     async def close(self) -> None:
@@ -112,6 +148,11 @@ class Topology:
                 self._shutdown_condition.notify()
             raise e
 
+    @property
+    def bridge_logged_in(self) -> bool:
+        """whether the bridge session is up. cheap enough to poll"""
+        return self._caseta_bridge.logged_in
+
     @staticmethod
     def _as_mqtt_friendly_name(raw_name: str) -> str:
         return raw_name.lower().replace("_", "-").replace(" ", "-")
@@ -124,9 +165,14 @@ class Topology:
                 "topology has not been initialized yet"
             )
 
+        self._button_tracker.attach_remotes(remotes_by_id.values())
+        if self._rules_engine is not None:
+            self._rules_engine.attach(self._caseta_bridge, remotes_by_id.values())
+
         for _remote_id, remote in remotes_by_id.items():
             for button_id, button in remote.buttons_by_button_id.items():
                 self._caseta_bridge.add_button_subscriber(
                     str(button_id),
                     self._button_tracker.button_event_callback(remote, button),
                 )
+        self.attached = True
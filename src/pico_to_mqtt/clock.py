@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional, Protocol
+
+
+class Clock(Protocol):
+    """a monotonic time source, in float seconds"""
+
+    def now(self) -> float:
+        ...
+
+
+class LoopClock:
+    """
+    reads the event loop's monotonic clock, so wall-clock jumps (e.g. from NTP)
+    don't affect button tracking. uses the running loop unless one is given.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self._loop = loop
+
+    def now(self) -> float:
+        if self._loop is None:
+            return asyncio.get_running_loop().time()
+        return self._loop.time()
+
+
+class FakeClock:
+    """a clock that only moves when it is told to. useful for tests and benchmarks"""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+
+    def now(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        self._now += seconds
+
+    def set(self, now: float) -> None:
+        self._now = now
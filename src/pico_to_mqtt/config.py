@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import os
 from datetime import timedelta
+from enum import Enum
 from pathlib import Path
+from typing import Mapping, Optional, Sequence
 
 import typed_settings as ts
-from attr import Factory, field
+from attr import Attribute, Factory, field, validators
 
-from pico_to_mqtt.caseta.model import ButtonId
+from pico_to_mqtt.caseta.model import ButtonEvent, ButtonId
 
 from . import APP_NAME
 
@@ -17,6 +20,36 @@ class AllConfig:
     mqtt_config: MqttConfig
     mqtt_credentials: MqttCredentials
     button_watcher_config: ButtonWatcherConfig
+    publish_scheduler_config: PublishSchedulerConfig = field(
+        default=Factory(lambda: PublishSchedulerConfig.default_instance())
+    )
+    loop_monitor_config: LoopMonitorConfig = field(
+        default=Factory(lambda: LoopMonitorConfig.default_instance())
+    )
+    hot_reload_config: HotReloadConfig = field(
+        default=Factory(lambda: HotReloadConfig.default_instance())
+    )
+    task_supervision_config: TaskSupervisionConfig = field(
+        default=Factory(lambda: TaskSupervisionConfig.default_instance())
+    )
+    shutdown_config: ShutdownConfig = field(
+        default=Factory(lambda: ShutdownConfig.default_instance())
+    )
+    journal_config: JournalConfig = field(
+        default=Factory(lambda: JournalConfig.default_instance())
+    )
+    sinks_config: SinksConfig = field(
+        default=Factory(lambda: SinksConfig.default_instance())
+    )
+    rules_config: RulesConfig = field(
+        default=Factory(lambda: RulesConfig.default_instance())
+    )
+    memory_diagnostics_config: MemoryDiagnosticsConfig = field(
+        default=Factory(lambda: MemoryDiagnosticsConfig.default_instance())
+    )
+    health_config: HealthConfig = field(
+        default=Factory(lambda: HealthConfig.default_instance())
+    )
 
 
 @ts.settings(frozen=True)
@@ -73,13 +106,132 @@ class DoubleClickWindow:
         return cls()
 
 
+class LongPressRepeatPolicy(Enum):
+    """how often LONG_PRESS_ONGOING events are emitted while a button is held"""
+
+    # one LONG_PRESS_ONGOING event every `sleep_duration_ms`
+    FIXED_RATE = 0
+    # start at `sleep_duration_ms` and shrink the interval by
+    # `accelerating_repeat_factor` on every tick, down to `min_repeat_interval_ms`
+    ACCELERATING = 1
+    # a single LONG_PRESS_ONGOING event when the hold starts, and a
+    # LONG_PRESS_COMPLETED event that carries the hold duration
+    START_AND_DURATION = 2
+
+
+@ts.settings(frozen=True)
+class LongPressRepeatPolicies:
+    power_on_repeat_policy: LongPressRepeatPolicy = LongPressRepeatPolicy.FIXED_RATE
+    favorite_repeat_policy: LongPressRepeatPolicy = LongPressRepeatPolicy.FIXED_RATE
+    power_off_repeat_policy: LongPressRepeatPolicy = LongPressRepeatPolicy.FIXED_RATE
+    increase_repeat_policy: LongPressRepeatPolicy = LongPressRepeatPolicy.FIXED_RATE
+    decrease_repeat_policy: LongPressRepeatPolicy = LongPressRepeatPolicy.FIXED_RATE
+
+    def get_repeat_policy(self, button_id: ButtonId) -> LongPressRepeatPolicy:
+        match button_id:
+            case ButtonId.POWER_ON:
+                return self.power_on_repeat_policy
+            case ButtonId.FAVORITE:
+                return self.favorite_repeat_policy
+            case ButtonId.POWER_OFF:
+                return self.power_off_repeat_policy
+            case ButtonId.INCREASE:
+                return self.increase_repeat_policy
+            case ButtonId.DECREASE:
+                return self.decrease_repeat_policy
+
+    @classmethod
+    def default_instance(cls) -> LongPressRepeatPolicies:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class GestureProfile:
+    """overrides for a set of buttons. unset fields fall through to broader profiles"""
+
+    # when double clicks are disabled, a single press is emitted as soon as the
+    # button is released, and `double_click_window_ms` is only used as the time
+    # a button must be held before it counts as a long press
+    double_click_enabled: Optional[bool] = None
+    double_click_window_ms: Optional[int] = None
+    long_press_repeat_policy: Optional[LongPressRepeatPolicy] = None
+    optimistic_single_press: Optional[bool] = None
+
+
+@ts.settings(frozen=True)
+class GestureProfiles:
+    """
+    gesture profiles, from the least to the most specific. keys use the names from
+    the mqtt topics: `by_area` is keyed by `<area>`, `by_remote` by
+    `<area>/<remote>` and `by_button` by `<area>/<remote>/<button>`,
+    e.g. `kitchen/entryway/power-on`.
+    """
+
+    by_area: Mapping[str, GestureProfile] = field(factory=dict)
+    by_remote: Mapping[str, GestureProfile] = field(factory=dict)
+    by_button: Mapping[str, GestureProfile] = field(factory=dict)
+
+    @classmethod
+    def default_instance(cls) -> GestureProfiles:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class AdaptiveDoubleClickConfig:
+    """
+    learns each button's double click window from the gaps between a release and
+    the next press of the same button. a button's window is the `gap_percentile`
+    of its gaps shorter than `max_window_ms`, plus `margin_ms`, clamped to
+    [`min_window_ms`, `max_window_ms`]. buttons keep their configured window until
+    `min_samples` gaps were seen.
+    """
+
+    enabled: bool = False
+    min_window_ms: int = 150
+    max_window_ms: int = 1000
+    gap_percentile: float = 95.0
+    margin_ms: int = 50
+    # a button whose gaps are shorter than `max_window_ms` less often than this
+    # is taken as never double pressed and gets `min_window_ms`, so its rare
+    # quick re-presses don't stretch its window
+    min_in_range_gap_percent: float = 5.0
+    min_samples: int = 20
+    bucket_width_ms: int = 25
+    # once a button has more gaps than this, its counts are halved, so the
+    # histogram stays small and follows changing habits
+    max_samples: int = 256
+    # where the learned gaps survive restarts. unset keeps them in memory only
+    state_file: Optional[Path] = None
+    save_interval_sec: int = 300
+
+    @classmethod
+    def default_instance(cls) -> AdaptiveDoubleClickConfig:
+        return cls()
+
+
 @ts.settings(frozen=True)
 class ButtonWatcherConfig:
     double_click_window: DoubleClickWindow = field(
         default=Factory(DoubleClickWindow.default_instance)
     )
-    sleep_duration_ms: int = 250
+    long_press_repeat_policies: LongPressRepeatPolicies = field(
+        default=Factory(LongPressRepeatPolicies.default_instance)
+    )
+    gesture_profiles: GestureProfiles = field(
+        default=Factory(GestureProfiles.default_instance)
+    )
+    adaptive_double_click: AdaptiveDoubleClickConfig = field(
+        default=Factory(AdaptiveDoubleClickConfig.default_instance)
+    )
+    # the long press checkpoints are spaced by these, so they must be positive
+    sleep_duration_ms: int = field(default=250, validator=validators.gt(0))
     max_duration_ms: int = 5000
+    accelerating_repeat_factor: float = 0.7
+    min_repeat_interval_ms: int = field(default=100, validator=validators.gt(0))
+    # emit OPTIMISTIC_SINGLE_PRESS on the first release instead of waiting out the
+    # double click window. a second press then also emits DOUBLE_PRESS_COMPLETED,
+    # with the same gesture_id, and no SINGLE_PRESS_COMPLETED is emitted
+    optimistic_single_press: bool = False
 
     @property
     def sleep_duration(self) -> timedelta:
@@ -90,6 +242,97 @@ class ButtonWatcherConfig:
         return timedelta(milliseconds=self.max_duration_ms)
 
 
+@ts.settings(frozen=True)
+class PublishOptions:
+    qos: int = 0
+    retain: bool = False
+
+
+@ts.settings(frozen=True)
+class PublishOptionsByButtonEvent:
+    single_press_completed: PublishOptions = field(default=Factory(PublishOptions))
+    long_press_ongoing: PublishOptions = field(default=Factory(PublishOptions))
+    long_press_completed: PublishOptions = field(default=Factory(PublishOptions))
+    double_press_completed: PublishOptions = field(default=Factory(PublishOptions))
+    optimistic_single_press: PublishOptions = field(default=Factory(PublishOptions))
+
+    def get_publish_options(self, button_event: ButtonEvent) -> PublishOptions:
+        match button_event:
+            case ButtonEvent.SINGLE_PRESS_COMPLETED:
+                return self.single_press_completed
+            case ButtonEvent.LONG_PRESS_ONGOING:
+                return self.long_press_ongoing
+            case ButtonEvent.LONG_PRESS_COMPLETED:
+                return self.long_press_completed
+            case ButtonEvent.DOUBLE_PRESS_COMPLETED:
+                return self.double_press_completed
+            case ButtonEvent.OPTIMISTIC_SINGLE_PRESS:
+                return self.optimistic_single_press
+
+    @classmethod
+    def default_instance(cls) -> PublishOptionsByButtonEvent:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class AggregateTopicConfig:
+    """
+    also publishes every event in batches on one topic, for consumers that would
+    rather take one message per batch than one per gesture. see
+    `pico_to_mqtt.aggregate_batcher` for the encoding
+    """
+
+    enabled: bool = False
+    topic: str = "picotomqtt/aggregate"
+    max_batch_events: int = 100
+    max_batch_delay_ms: int = 1000
+    qos: int = 0
+
+    @classmethod
+    def default_instance(cls) -> AggregateTopicConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class Mqtt5Config:
+    """
+    connects with MQTT v5, which can shrink each publish: a topic alias replaces
+    the full topic after its first use, and the event metadata can travel as user
+    properties next to a payload that only holds the action
+    """
+
+    enabled: bool = False
+    # aliases handed out per connection; 0 turns them off. capped at the Topic
+    # Alias Maximum the broker sends when connecting (mosquitto's max_topic_alias
+    # defaults to 10). topics beyond the limit are always sent in full.
+    max_topic_aliases: int = 0
+    metadata_as_user_properties: bool = False
+
+    @classmethod
+    def default_instance(cls) -> Mqtt5Config:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class DiscoveryConfig:
+    """
+    publishes retained messages that describe every remote: home assistant device
+    triggers under `home_assistant_prefix`, and a manifest per remote under
+    `manifest_topic_prefix`. only remotes that changed are republished on a
+    topology refresh, and the messages of removed remotes are cleared.
+    see `pico_to_mqtt.discovery`
+    """
+
+    enabled: bool = False
+    home_assistant_prefix: str = "homeassistant"
+    manifest_topic_prefix: str = "picotomqtt/manifest"
+    qos: int = 1
+
+    @classmethod
+    def default_instance(cls) -> DiscoveryConfig:
+        return cls()
+
+
 @ts.settings(frozen=True)
 class MqttConfig:
     path_to_mqtt_client_cert: Path
@@ -97,7 +340,294 @@ class MqttConfig:
     path_to_mqtt_client_ca: Path
     hostname: str
     port: int
+    publish_options: PublishOptionsByButtonEvent = field(
+        default=Factory(PublishOptionsByButtonEvent.default_instance)
+    )
+    # the most QoS 1 and 2 messages that can be awaiting acknowledgement at once
+    max_inflight_messages: int = 20
+    aggregate_topic: AggregateTopicConfig = field(
+        default=Factory(AggregateTopicConfig.default_instance)
+    )
+    mqtt5: Mqtt5Config = field(default=Factory(Mqtt5Config.default_instance))
+    discovery: DiscoveryConfig = field(
+        default=Factory(DiscoveryConfig.default_instance)
+    )
+
+
+@ts.settings(frozen=True)
+class PublishSchedulerConfig:
+    # LONG_PRESS_ONGOING events that waited longer than this are dropped
+    max_repeat_tick_age_ms: int = 500
+    # once this many LONG_PRESS_ONGOING events are queued, the oldest are dropped
+    max_repeat_backlog: int = 64
+    # once this many other events are queued, the oldest are dropped. this is
+    # also what holds gestures detected while the broker connection is still
+    # being set up
+    max_terminal_backlog: int = 256
+    # how often the per-lane queueing delays are logged. 0 disables this
+    metrics_log_interval_sec: int = 300
+
+    @property
+    def max_repeat_tick_age_sec(self) -> float:
+        return self.max_repeat_tick_age_ms / 1000
+
+    @classmethod
+    def default_instance(cls) -> PublishSchedulerConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class LoopMonitorConfig:
+    enabled: bool = True
+    sample_interval_ms: int = 250
+    # a callback that holds the loop for longer than this is logged with its stack
+    slow_callback_threshold_ms: int = 100
+    # when loop lag stays above `watchdog_lag_threshold_ms` for
+    # `watchdog_trip_after_ms`, the service shuts down. 0 disables the watchdog
+    watchdog_lag_threshold_ms: int = 1000
+    watchdog_trip_after_ms: int = 30000
+    # how often the lag percentiles are logged. 0 disables this
+    metrics_log_interval_sec: int = 300
+
+    @classmethod
+    def default_instance(cls) -> LoopMonitorConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class HotReloadConfig:
+    # how often the settings files are checked for changes. 0 disables polling;
+    # SIGHUP always triggers a reload
+    config_file_poll_interval_sec: int = 0
+
+    @classmethod
+    def default_instance(cls) -> HotReloadConfig:
+        return cls()
+
+
+class SheddingPolicy(Enum):
+    """what a full group of supervised tasks does with a new task"""
+
+    # the new task is dropped, the ones already running are left alone
+    REJECT_NEW = 0
+    # the oldest running task is cancelled to make room for the new one
+    CANCEL_OLDEST = 1
+
+
+@ts.settings(frozen=True)
+class TaskSupervisionConfig:
+    # bridge events that are waiting for the button tracker
+    max_pending_button_events: int = 256
+    # gestures that are being watched at once
+    max_button_watchers: int = 64
+    shedding_policy: SheddingPolicy = SheddingPolicy.REJECT_NEW
+    # how often the task counts are logged. 0 disables this
+    metrics_log_interval_sec: int = 300
+
+    @classmethod
+    def default_instance(cls) -> TaskSupervisionConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class ShutdownConfig:
+    # how long a termination signal waits for watched gestures to finish and for
+    # their events to be published before the remaining tasks are cancelled
+    drain_deadline_sec: float = 10.0
+
+    @classmethod
+    def default_instance(cls) -> ShutdownConfig:
+        return cls()
+
+
+def _holds_a_journal_record(
+    _journal_config: JournalConfig, _attribute: Attribute[int], segment_size_bytes: int
+) -> None:
+    # imported here, since the journal imports this module
+    from pico_to_mqtt.journal import MIN_SEGMENT_SIZE_BYTES
+
+    if segment_size_bytes < MIN_SEGMENT_SIZE_BYTES:
+        raise ValueError(
+            f"segment_size_bytes must be at least {MIN_SEGMENT_SIZE_BYTES}, "
+            f"the size of a segment header and one record, not {segment_size_bytes}"
+        )
+
+
+@ts.settings(frozen=True)
+class JournalConfig:
+    """
+    a binary journal of every raw bridge event and every emitted caseta event,
+    for postmortems. see `pico_to_mqtt.journal`
+    """
+
+    enabled: bool = False
+    directory: Path = Path("journal")
+    # segments are preallocated to this size and rotated once full. each must
+    # hold at least one record
+    segment_size_bytes: int = field(
+        default=4 * 1024 * 1024, validator=_holds_a_journal_record
+    )
+    # the oldest segments are removed once there are more than this many
+    max_segments: int = 16
+    flush_interval_ms: int = 200
+    # records beyond this many waiting for a flush are dropped
+    max_pending_records: int = 65536
+
+    @classmethod
+    def default_instance(cls) -> JournalConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class UnixSocketSinkConfig:
+    enabled: bool = False
+    path: Path = Path("pico-to-mqtt.sock")
+    # a consumer that falls this far behind is disconnected
+    max_client_buffer_bytes: int = 64 * 1024
+
+    @classmethod
+    def default_instance(cls) -> UnixSocketSinkConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class NdjsonSinkConfig:
+    enabled: bool = False
+    # stdout when unset
+    path: Optional[Path] = None
+
+    @classmethod
+    def default_instance(cls) -> NdjsonSinkConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class WebhookSinkConfig:
+    enabled: bool = False
+    # an http:// or https:// url each event is POSTed to
+    url: str = ""
+    timeout_sec: float = 5.0
+    # keep-alive connections kept open between deliveries
+    max_idle_connections: int = 2
+
+    @classmethod
+    def default_instance(cls) -> WebhookSinkConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class SinksConfig:
+    """
+    local destinations that get every event next to the mqtt broker, each from its
+    own queue. see `pico_to_mqtt.sinks`
+    """
+
+    # events beyond this many waiting for a sink are dropped, oldest first
+    queue_size: int = 1024
+    unix_socket: UnixSocketSinkConfig = field(
+        default=Factory(UnixSocketSinkConfig.default_instance)
+    )
+    ndjson: NdjsonSinkConfig = field(default=Factory(NdjsonSinkConfig.default_instance))
+    webhook: WebhookSinkConfig = field(
+        default=Factory(WebhookSinkConfig.default_instance)
+    )
+
+    @classmethod
+    def default_instance(cls) -> SinksConfig:
+        return cls()
+
+
+class RuleAction(Enum):
+    TURN_ON = 0
+    TURN_OFF = 1
+    SET_LEVEL = 2
+    ACTIVATE_SCENE = 3
+    RAISE_COVER = 4
+    LOWER_COVER = 5
+    STOP_COVER = 6
+
+
+@ts.settings(frozen=True)
+class Rule:
+    """
+    runs `action` on the bridge when `button` emits `button_event`. `button` uses
+    the names from the mqtt topics, `<area>/<remote>/<button>`, e.g.
+    `kitchen/entryway/power-on`
+    """
+
+    button: str
+    button_event: ButtonEvent
+    action: RuleAction
+    # the bridge's id or name of the device, or of the scene for ACTIVATE_SCENE
+    target: str
+    # 0-100, for SET_LEVEL
+    level: int = 100
+    # for TURN_ON, TURN_OFF and SET_LEVEL. unset uses the bridge's default fade
+    fade_time_ms: Optional[int] = None
+
+
+@ts.settings(frozen=True)
+class RulesConfig:
+    """
+    bridge actions run right here, without a round trip through mqtt and an
+    automation server. events are still published as usual.
+    see `pico_to_mqtt.caseta.rules`
+    """
+
+    rules: Sequence[Rule] = field(factory=list)
+
+    @classmethod
+    def default_instance(cls) -> RulesConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class MemoryDiagnosticsConfig:
+    """
+    SIGUSR1 logs a memory report: live counts of the objects that could leak and
+    the allocation sites that grew the most, as traced by tracemalloc. see
+    `pico_to_mqtt.memory_diagnostics`
+    """
+
+    # tracing slows down every allocation and needs memory of its own, so by
+    # default each report only traces for `trace_window_sec`, shows what grew in
+    # that time and stops tracing again. tracing from startup keeps it on for
+    # good, and each report shows what grew since the previous one
+    trace_from_startup: bool = False
+    trace_window_sec: float = 60.0
+    top_allocation_sites: int = 15
+
+    @classmethod
+    def default_instance(cls) -> MemoryDiagnosticsConfig:
+        return cls()
+
+
+@ts.settings(frozen=True)
+class HealthConfig:
+    """
+    an HTTP endpoint for orchestrators: GET /livez, /readyz and /health. see
+    `pico_to_mqtt.health`
+    """
+
+    enabled: bool = False
+    host: str = "127.0.0.1"
+    port: int = 8080
+    # the process counts as not live once the loop monitor measured more lag
+    # than this. without the loop monitor, answering at all is the only check
+    max_loop_lag_ms: int = 1000
+    # keep-alive connections that send nothing for this long are closed
+    idle_timeout_sec: float = 30.0
+
+    @classmethod
+    def default_instance(cls) -> HealthConfig:
+        return cls()
 
 
 def get_config() -> AllConfig:
     return ts.load(AllConfig, APP_NAME)
+
+
+def config_file_paths() -> Sequence[Path]:
+    """the settings files typed-settings reads, from PICO_TO_MQTT_SETTINGS"""
+    config_files_var = os.environ.get(f"{APP_NAME.upper()}_SETTINGS", "")
+    return [Path(path) for path in config_files_var.split(":") if path]
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Mapping, Optional, Sequence
+
+import attrs
+
+from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.config import AllConfig, config_file_paths, get_config
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ConfigReloader:
+    """
+    re-reads the settings and applies button watcher changes without restarting.
+    the bridge and mqtt sessions stay up; changes to any other section are only
+    picked up on the next restart.
+    """
+
+    def __init__(
+        self,
+        button_tracker: ButtonTracker,
+        current_configuration: AllConfig,
+        config_loader: Callable[[], AllConfig] = get_config,
+    ) -> None:
+        self._button_tracker = button_tracker
+        self._current_configuration = current_configuration
+        self._config_loader = config_loader
+        self._reload_lock = asyncio.Lock()
+
+    async def reload(self) -> None:
+        async with self._reload_lock:
+            try:
+                new_configuration = await asyncio.to_thread(self._config_loader)
+            except Exception as e:
+                LOGGER.error(
+                    "could not reload the configuration. keeping the current one. "
+                    "exception: %s",
+                    e,
+                )
+                return
+
+            restart_required_sections = [
+                section.name
+                for section in attrs.fields(AllConfig)
+                if section.name != "button_watcher_config"
+                and getattr(new_configuration, section.name)
+                != getattr(self._current_configuration, section.name)
+            ]
+            if restart_required_sections:
+                LOGGER.warning(
+                    "changes to %s only take effect after a restart",
+                    restart_required_sections,
+                )
+
+            if (
+                new_configuration.button_watcher_config
+                == self._button_tracker.button_watcher_config
+            ):
+                LOGGER.info("reloaded the configuration. button watchers unchanged")
+            else:
+                self._button_tracker.update_button_watcher_config(
+                    new_configuration.button_watcher_config
+                )
+                LOGGER.info(
+                    "reloaded the button watcher configuration: %s",
+                    new_configuration.button_watcher_config,
+                )
+            self._current_configuration = attrs.evolve(
+                self._current_configuration,
+                button_watcher_config=new_configuration.button_watcher_config,
+            )
+
+    async def watch_config_files(self, poll_interval_sec: int) -> None:
+        """reloads whenever one of the settings files is modified"""
+        if poll_interval_sec <= 0:
+            return
+        last_modified_times = _modified_times(config_file_paths())
+        while True:
+            await asyncio.sleep(poll_interval_sec)
+            modified_times = _modified_times(config_file_paths())
+            if modified_times != last_modified_times:
+                last_modified_times = modified_times
+                LOGGER.info("a settings file changed. reloading the configuration")
+                await self.reload()
+
+
+def _modified_times(paths: Sequence[Path]) -> Mapping[Path, Optional[float]]:
+    modified_times: dict[Path, Optional[float]] = {}
+    for path in paths:
+        try:
+            modified_times[path] = path.stat().st_mtime
+        except OSError:
+            modified_times[path] = None
+    return modified_times
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Iterable, Mapping
+
+from pico_to_mqtt.caseta.model import ButtonEvent, ButtonId, PicoRemote
+from pico_to_mqtt.config import MqttConfig
+
+LOGGER = logging.getLogger(__name__)
+
+_MANUFACTURER = "Lutron"
+# OPTIMISTIC_SINGLE_PRESS has no home assistant counterpart, so it isn't announced
+_HOME_ASSISTANT_TRIGGER_TYPES: Mapping[ButtonEvent, str] = {
+    ButtonEvent.SINGLE_PRESS_COMPLETED: "button_short_press",
+    ButtonEvent.DOUBLE_PRESS_COMPLETED: "button_double_press",
+    ButtonEvent.LONG_PRESS_ONGOING: "button_long_press",
+    ButtonEvent.LONG_PRESS_COMPLETED: "button_long_release",
+}
+
+
+def _button_topic(remote: PicoRemote, button_id: ButtonId) -> str:
+    return (
+        f"picotomqtt/{remote.area_name}/{remote.name}"
+        f"/{button_id.as_mqtt_topic_friendly_name}"
+    )
+
+
+class DiscoveryPublisher:
+    """
+    keeps the retained discovery messages in line with the topology. it remembers
+    the fingerprint it last published for each remote, so a refresh only costs
+    publishes for the remotes that changed. the first update after a start
+    publishes every remote, since what the broker retained isn't known.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, str, int, bool], Awaitable[None]],
+        mqtt_config: MqttConfig,
+    ) -> None:
+        self._publish = publish
+        self._discovery_config = mqtt_config.discovery
+        # events carry their action in a json field, unless it is the whole payload
+        self._action_is_payload = (
+            mqtt_config.mqtt5.enabled and mqtt_config.mqtt5.metadata_as_user_properties
+        )
+        # the fingerprint and the topics last published for each remote
+        self._published_remotes: dict[int, tuple[str, frozenset[str]]] = {}
+        self._updating = asyncio.Lock()
+        self.published_messages: int = 0
+
+    def discovery_messages(self, remote: PicoRemote) -> Mapping[str, str]:
+        """every retained message for a remote, by topic"""
+        node_id = f"pico_to_mqtt_{remote.device_id}"
+        device = {
+            "identifiers": [node_id],
+            "name": f"{remote.area_name} {remote.name}",
+            "manufacturer": _MANUFACTURER,
+            "model": remote.type.value,
+            "suggested_area": remote.area_name,
+        }
+        button_ids = sorted(
+            remote.buttons_by_button_id.values(), key=lambda button_id: button_id.value
+        )
+        messages: dict[str, str] = {}
+        for button_id in button_ids:
+            for button_event, trigger_type in _HOME_ASSISTANT_TRIGGER_TYPES.items():
+                trigger: dict[str, Any] = {
+                    "automation_type": "trigger",
+                    "topic": _button_topic(remote, button_id),
+                    "type": trigger_type,
+                    "subtype": button_id.as_mqtt_topic_friendly_name,
+                    "payload": button_event.name,
+                    "device": device,
+                }
+                if not self._action_is_payload:
+                    trigger["value_template"] = "{{ value_json.action }}"
+                object_id = (
+                    f"{button_id.as_mqtt_topic_friendly_name}"
+                    f"_{button_event.name.lower()}"
+                )
+                messages[
+                    f"{self._discovery_config.home_assistant_prefix}"
+                    f"/device_automation/{node_id}/{object_id}/config"
+                ] = json.dumps(trigger)
+        manifest = {
+            "device_id": remote.device_id,
+            "area": remote.area_name,
+            "remote": remote.name,
+            "remote_type": remote.type.value,
+            "buttons": {
+                button_id.as_mqtt_topic_friendly_name: _button_topic(remote, button_id)
+                for button_id in button_ids
+            },
+        }
+        messages[
+            f"{self._discovery_config.manifest_topic_prefix}/{remote.device_id}"
+        ] = json.dumps(manifest)
+        return messages
+
+    async def update(
+        self, remotes: Iterable[PicoRemote], remote_fingerprints: Mapping[int, str]
+    ) -> None:
+        """publishes the remotes whose fingerprint changed, and clears removed ones"""
+        async with self._updating:
+            remotes_by_id = {remote.device_id: remote for remote in remotes}
+            for remote_id, remote in remotes_by_id.items():
+                fingerprint = remote_fingerprints[remote_id]
+                published_remote = self._published_remotes.get(remote_id)
+                if published_remote is not None and published_remote[0] == fingerprint:
+                    continue
+                messages = self.discovery_messages(remote)
+                stale_topics = (
+                    published_remote[1] - messages.keys()
+                    if published_remote is not None
+                    else frozenset()
+                )
+                await self._publish_retained(messages, stale_topics)
+                self._published_remotes[remote_id] = (
+                    fingerprint,
+                    frozenset(messages.keys()),
+                )
+                LOGGER.info(
+                    "published discovery messages for remote %s/%s",
+                    remote.area_name,
+                    remote.name,
+                )
+            for remote_id in self._published_remotes.keys() - remotes_by_id.keys():
+                _fingerprint, topics = self._published_remotes.pop(remote_id)
+                await self._publish_retained({}, topics)
+                LOGGER.info(
+                    "cleared discovery messages for removed remote %d", remote_id
+                )
+
+    async def _publish_retained(
+        self, messages: Mapping[str, str], stale_topics: Iterable[str]
+    ) -> None:
+        # an empty retained message clears what the broker retained for a topic
+        for topic, payload in [
+            *messages.items(),
+            *((topic, "") for topic in stale_topics),
+        ]:
+            await self._publish(topic, payload, self._discovery_config.qos, True)
+            self.published_messages += 1
@@ -1,28 +1,26 @@
 import asyncio
+import functools
 import json
 import logging
-from enum import Enum
+import time
+from typing import Any, Mapping, Optional, Sequence
 
 import aiomqtt
-import attrs
 
-from pico_to_mqtt.caseta.model import ButtonId, PicoRemote
+from pico_to_mqtt.aggregate_batcher import AggregateBatcher, button_topic_suffix
+from pico_to_mqtt.caseta.model import ButtonEvent, CasetaEvent
+from pico_to_mqtt.clock import Clock, LoopClock
+from pico_to_mqtt.config import MqttConfig, PublishSchedulerConfig
+from pico_to_mqtt.discovery import DiscoveryPublisher
+from pico_to_mqtt.journal import EventJournal
+from pico_to_mqtt.metrics import LatencyRecorder
+from pico_to_mqtt.mqtt5 import TopicAliasTable, publish_properties
+from pico_to_mqtt.publish_scheduler import PublishScheduler
+from pico_to_mqtt.sinks import QueuedSink
 
-LOGGER = logging.getLogger(__name__)
-
-
-class ButtonEvent(Enum):
-    SINGLE_PRESS_COMPLETED = 0
-    LONG_PRESS_ONGOING = 1
-    LONG_PRESS_COMPLETED = 3
-    DOUBLE_PRESS_COMPLETED = 4
+__all__ = ["ButtonEvent", "CasetaEvent", "EventHandler"]
 
-
-@attrs.frozen
-class CasetaEvent:
-    remote: PicoRemote
-    button_id: ButtonId
-    button_event: ButtonEvent
+LOGGER = logging.getLogger(__name__)
 
 
 class EventHandler:
@@ -30,26 +28,224 @@ class EventHandler:
         self,
         context_managed_mqtt_client: aiomqtt.Client,
         shutdown_condition: asyncio.Condition,
+        mqtt_config: MqttConfig,
+        publish_scheduler_config: PublishSchedulerConfig = (
+            PublishSchedulerConfig.default_instance()
+        ),
+        clock: Clock = LoopClock(),
+        journal: Optional[EventJournal] = None,
+        sinks: Sequence[QueuedSink] = (),
     ) -> None:
         self._context_managed_mqtt_client = context_managed_mqtt_client
         self._shutdown_condition = shutdown_condition
+        self._mqtt_config = mqtt_config
+        self._publish_scheduler_config = publish_scheduler_config
+        self._clock = clock
+        self._journal = journal
+        self.sinks = sinks
+        # unix time of the last event handled, for the health endpoint
+        self.last_event_at: Optional[float] = None
+        # whether the client is connected to the broker, for the health endpoint.
+        # set by `connected`; cleared once a publish fails or `watch_connection`
+        # sees the client disconnect
+        self.mqtt_connected: bool = False
+        self.publish_scheduler = PublishScheduler(
+            self._publish_event, publish_scheduler_config, clock
+        )
+        # QoS > 0 publishes wait for their acknowledgement in the background, so
+        # the scheduler can keep going. this bounds how many of them are pending.
+        self._inflight_window = asyncio.Semaphore(mqtt_config.max_inflight_messages)
+        self._inflight_publishes: set[asyncio.Task[None]] = set()
+        self.publish_ack_latency = LatencyRecorder()
+        # set up by `connected`, once the broker said how many aliases it takes
+        self._topic_aliases: Optional[TopicAliasTable] = None
+        self.aggregate_batcher: Optional[AggregateBatcher] = (
+            AggregateBatcher(self._publish, mqtt_config.aggregate_topic, clock)
+            if mqtt_config.aggregate_topic.enabled
+            else None
+        )
+        self.discovery_publisher: Optional[DiscoveryPublisher] = (
+            DiscoveryPublisher(
+                # one-off topics would only use up the aliases
+                functools.partial(self._publish, use_topic_alias=False),
+                mqtt_config,
+            )
+            if mqtt_config.discovery.enabled
+            else None
+        )
 
     async def handle_event(self, event: CasetaEvent):
-        topic = (
-            f"picotomqtt/{event.remote.area_name}"
-            f"/{event.remote.name}"
-            f"/{event.button_id.as_mqtt_topic_friendly_name}"
+        self.last_event_at = time.time()
+        if self._journal is not None:
+            self._journal.record_caseta_event(event, self._clock.now())
+        for sink in self.sinks:
+            sink.submit(event)
+        self.publish_scheduler.submit(event)
+
+    async def run(self) -> None:
+        """publishes the queued events and feeds the sinks until cancelled"""
+        await asyncio.gather(self.run_publishing(), self.run_sinks())
+
+    async def run_publishing(self) -> None:
+        """publishes the queued events until cancelled. needs a connected client"""
+        await asyncio.gather(
+            self.publish_scheduler.run(),
+            self._log_metrics_periodically(),
+            *([self.aggregate_batcher.run()] if self.aggregate_batcher else []),
         )
-        payload = {
+
+    async def run_sinks(self) -> None:
+        """feeds the sinks until cancelled. they don't need the broker"""
+        await asyncio.gather(*(sink.run() for sink in self.sinks))
+
+    def connected(self, broker_topic_alias_maximum: int) -> None:
+        """
+        marks the client as connected. topic aliases are handed out up to the
+        lower of `max_topic_aliases` and the broker's Topic Alias Maximum, so a
+        broker that takes none turns them off
+        """
+        self.mqtt_connected = True
+        configured_max_aliases = (
+            self._mqtt_config.mqtt5.max_topic_aliases
+            if self._mqtt_config.mqtt5.enabled
+            else 0
+        )
+        max_aliases = min(configured_max_aliases, broker_topic_alias_maximum)
+        if max_aliases < configured_max_aliases:
+            LOGGER.info(
+                "the broker takes %d topic aliases, fewer than the %d configured",
+                broker_topic_alias_maximum,
+                configured_max_aliases,
+            )
+        # aliases only last as long as the connection they were handed out on
+        self._topic_aliases = TopicAliasTable(max_aliases) if max_aliases > 0 else None
+
+    async def watch_connection(self) -> None:
+        """clears `mqtt_connected` once the client disconnects"""
+        try:
+            # nothing is subscribed to, so the messages only ever end in a
+            # disconnect
+            async with self._context_managed_mqtt_client.messages() as messages:
+                async for _message in messages:
+                    pass
+        except aiomqtt.MqttError as e:
+            LOGGER.warning("disconnected from the mqtt broker: %s", e)
+            self.mqtt_connected = False
+
+    async def drain(self) -> None:
+        """
+        returns once every event handled so far was published and, for QoS > 0,
+        acknowledged, and was delivered to the sinks. the scheduler and the sinks
+        must still be running.
+        """
+        await asyncio.gather(*(sink.drain() for sink in self.sinks))
+        await self.publish_scheduler.wait_until_idle()
+        if self.aggregate_batcher is not None:
+            await self.aggregate_batcher.flush()
+        if self._inflight_publishes:
+            await asyncio.gather(*self._inflight_publishes, return_exceptions=True)
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            **self.publish_scheduler.metrics_snapshot(),
+            "inflight_publishes": len(self._inflight_publishes),
+            "publish_ack_latency": self.publish_ack_latency.snapshot(),
+            "sinks": {sink.sink.name: sink.metrics_snapshot() for sink in self.sinks},
+        }
+
+    async def _log_metrics_periodically(self) -> None:
+        interval_sec = self._publish_scheduler_config.metrics_log_interval_sec
+        if interval_sec <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval_sec)
+            LOGGER.info("publish metrics: %s", self.metrics_snapshot())
+
+    async def _publish_event(self, event: CasetaEvent):
+        if self.aggregate_batcher is not None:
+            self.aggregate_batcher.add(event)
+        topic = f"picotomqtt/{button_topic_suffix(event)}"
+        payload: dict[str, Any] = {
             "button_id": event.button_id.name,
             "area": event.remote.area_name,
             "action": event.button_event.name,
             "remote_type": event.remote.type,
         }
-        payload_str = json.dumps(payload)
+        if event.hold_duration_sec is not None:
+            payload["hold_duration_ms"] = round(event.hold_duration_sec * 1000)
+        if event.gesture_id is not None:
+            payload["gesture_id"] = event.gesture_id
+        user_properties: list[tuple[str, str]] = []
+        if (
+            self._mqtt_config.mqtt5.enabled
+            and self._mqtt_config.mqtt5.metadata_as_user_properties
+        ):
+            payload_str = payload.pop("action")
+            user_properties = [(key, str(value)) for key, value in payload.items()]
+        else:
+            payload_str = json.dumps(payload)
+        publish_options = self._mqtt_config.publish_options.get_publish_options(
+            event.button_event
+        )
+        if publish_options.qos == 0:
+            await self._publish(
+                topic,
+                payload_str,
+                publish_options.qos,
+                publish_options.retain,
+                user_properties,
+            )
+            return
+
+        await self._inflight_window.acquire()
+        inflight_publish = asyncio.create_task(
+            self._publish(
+                topic,
+                payload_str,
+                publish_options.qos,
+                publish_options.retain,
+                user_properties,
+            )
+        )
+        self._inflight_publishes.add(inflight_publish)
+        inflight_publish.add_done_callback(self._on_inflight_publish_done)
+
+    def _on_inflight_publish_done(self, inflight_publish: asyncio.Task[None]) -> None:
+        self._inflight_publishes.discard(inflight_publish)
+        self._inflight_window.release()
+
+    async def _publish(
+        self,
+        topic: str,
+        payload_str: str,
+        qos: int,
+        retain: bool,
+        user_properties: Sequence[tuple[str, str]] = (),
+        use_topic_alias: bool = True,
+    ):
+        published_at = self._clock.now()
+        topic_aliases = self._topic_aliases if use_topic_alias else None
+        topic_alias = topic_aliases.alias_for(topic) if topic_aliases else None
+        # once the broker knows the alias, an empty topic stands in for the full one
+        topic_to_send = (
+            ""
+            if topic_aliases and topic_alias and topic_aliases.is_established(topic)
+            else topic
+        )
         try:
-            await self._context_managed_mqtt_client.publish(topic, payload_str)
+            await self._context_managed_mqtt_client.publish(
+                topic_to_send,
+                payload_str,
+                qos=qos,
+                retain=retain,
+                properties=publish_properties(topic_alias, user_properties),
+            )
+            if topic_aliases and topic_alias:
+                topic_aliases.mark_established(topic)
+            if qos > 0:
+                self.publish_ack_latency.record(self._clock.now() - published_at)
         except Exception as e:
+            self.mqtt_connected = False
             LOGGER.error(
                 (
                     "encountered an error trying to publish mqtt message. "
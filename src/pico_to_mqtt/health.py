@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+from aiohttp import web
+
+from pico_to_mqtt.caseta.topology import Topology
+from pico_to_mqtt.config import HealthConfig
+from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.loop_monitor import LoopLagMonitor
+
+LOGGER = logging.getLogger(__name__)
+
+
+class HealthServer:
+    """
+    answers health checks over HTTP with an aiohttp server on the service's own
+    event loop:
+
+    - GET /livez is 200 while the event loop keeps up
+    - GET /readyz is 200 once the broker connection and the bridge session are up
+      and a topology is attached
+    - GET /health is 200 when both are
+
+    every response carries the same JSON status, including the unix time of the
+    last event handled. the checks only read flags, so polling every second
+    costs next to nothing. a loop that is blocked outright can't answer at all,
+    which a client's timeout reports as not live.
+    """
+
+    def __init__(
+        self,
+        health_config: HealthConfig,
+        event_handler: EventHandler,
+        loop_lag_monitor: Optional[LoopLagMonitor] = None,
+    ) -> None:
+        self._health_config = health_config
+        self._event_handler = event_handler
+        self._loop_lag_monitor = loop_lag_monitor
+        # set by whoever owns the topology
+        self.topology: Optional[Topology] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/livez", self._handler("live"))
+        app.router.add_get("/readyz", self._handler("ready"))
+        app.router.add_get("/health", self._handler("live", "ready"))
+        self._runner = web.AppRunner(
+            app,
+            handle_signals=False,
+            # polled every few seconds, so not worth a log line each
+            access_log=None,
+            keepalive_timeout=self._health_config.idle_timeout_sec,
+        )
+        await self._runner.setup()
+        await web.TCPSite(
+            self._runner, self._health_config.host, self._health_config.port
+        ).start()
+        LOGGER.info(
+            "serving health checks on %s:%d", self._health_config.host, self.port
+        )
+
+    @property
+    def port(self) -> int:
+        """the bound port, which differs from the configured one when that is 0"""
+        assert self._runner is not None
+        return self._runner.addresses[0][1]
+
+    async def close(self) -> None:
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    def status(self) -> Mapping[str, Any]:
+        topology = self.topology
+        status: dict[str, Any] = {
+            "loop_responsive": True,
+            "mqtt_connected": self._event_handler.mqtt_connected,
+            "bridge_logged_in": topology is not None and topology.bridge_logged_in,
+            "topology_attached": topology is not None and topology.attached,
+            "last_event_at": self._event_handler.last_event_at,
+        }
+        if self._loop_lag_monitor is not None:
+            loop_lag_ms = self._loop_lag_monitor.current_lag_sec() * 1000
+            status["loop_lag_ms"] = round(loop_lag_ms, 1)
+            status["loop_responsive"] = (
+                loop_lag_ms <= self._health_config.max_loop_lag_ms
+            )
+        status["live"] = status["loop_responsive"]
+        status["ready"] = (
+            status["mqtt_connected"]
+            and status["bridge_logged_in"]
+            and status["topology_attached"]
+        )
+        return status
+
+    def _handler(
+        self, *required: str
+    ) -> Callable[[web.Request], Awaitable[web.Response]]:
+        """a handler that answers 200 when every `required` status key is true"""
+
+        async def handle(_request: web.Request) -> web.Response:
+            status = self.status()
+            healthy = all(status[key] for key in required)
+            return web.json_response(
+                status,
+                status=200 if healthy else 503,
+                headers={"Cache-Control": "no-store"},
+            )
+
+        return handle
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional
+
+import attrs
+
+from pico_to_mqtt.caseta.model import (
+    ButtonAction,
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+)
+from pico_to_mqtt.config import JournalConfig
+
+LOGGER = logging.getLogger(__name__)
+
+_SEGMENT_MAGIC = b"PTMJ"
+_SEGMENT_VERSION = 1
+_SEGMENT_HEADER = struct.Struct("<4sB3x")
+# kind, timestamp, remote id, button id, action or event, hold duration in ms
+# (-1 when unset), gesture id (zeros when unset)
+_RECORD = struct.Struct("<BdIBBi16s")
+# a smaller segment couldn't hold a single record, so every write would rotate
+MIN_SEGMENT_SIZE_BYTES = _SEGMENT_HEADER.size + _RECORD.size
+_SEGMENT_NAME_PATTERN = re.compile(r"journal-(\d{8})\.bin")
+_NO_GESTURE_ID = bytes(16)
+
+
+class JournalRecordKind(Enum):
+    # 0 is left out on purpose: it marks the unwritten tail of a segment
+    BUTTON_ACTION = 1
+    CASETA_EVENT = 2
+
+
+@attrs.frozen
+class JournalRecord:
+    kind: JournalRecordKind
+    timestamp: float
+    remote_id: int
+    button_id: ButtonId
+    button_action: Optional[ButtonAction] = None
+    button_event: Optional[ButtonEvent] = None
+    hold_duration_sec: Optional[float] = None
+    gesture_id: Optional[str] = None
+
+    @classmethod
+    def unpack(cls, packed_record: tuple[Any, ...]) -> JournalRecord:
+        (
+            kind,
+            timestamp,
+            remote_id,
+            button_id,
+            action_or_event,
+            hold_duration_ms,
+            gesture_id,
+        ) = packed_record
+        record_kind = JournalRecordKind(kind)
+        return cls(
+            record_kind,
+            timestamp,
+            remote_id,
+            ButtonId.of_int(button_id),
+            button_action=(
+                ButtonAction(action_or_event)
+                if record_kind == JournalRecordKind.BUTTON_ACTION
+                else None
+            ),
+            button_event=(
+                ButtonEvent(action_or_event)
+                if record_kind == JournalRecordKind.CASETA_EVENT
+                else None
+            ),
+            hold_duration_sec=(
+                hold_duration_ms / 1000 if hold_duration_ms >= 0 else None
+            ),
+            gesture_id=gesture_id.hex() if gesture_id != _NO_GESTURE_ID else None,
+        )
+
+
+class _Segment:
+    """a preallocated, memory-mapped journal file"""
+
+    def __init__(self, path: Path, size_bytes: int) -> None:
+        self.path = path
+        self._file: IO[bytes] = open(path, "w+b")
+        self._file.truncate(size_bytes)
+        self._mmap = mmap.mmap(self._file.fileno(), size_bytes)
+        self._mmap[: _SEGMENT_HEADER.size] = _SEGMENT_HEADER.pack(
+            _SEGMENT_MAGIC, _SEGMENT_VERSION
+        )
+        self._position = _SEGMENT_HEADER.size
+
+    def free_records(self) -> int:
+        return (len(self._mmap) - self._position) // _RECORD.size
+
+    def write(self, packed_records: bytes) -> None:
+        end = self._position + len(packed_records)
+        self._mmap[self._position : end] = packed_records
+        self._position = end
+
+    def close(self) -> None:
+        """trims the unused preallocated tail, so a finished segment has no gaps"""
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.truncate(self._position)
+        self._file.close()
+
+
+class EventJournal:
+    """
+    appends raw bridge events and emitted caseta events to size-rotated,
+    memory-mapped segment files. recording only appends a tuple to a buffer; the
+    buffer is packed and written in batches by `run`, on a worker thread.
+    """
+
+    def __init__(self, journal_config: JournalConfig) -> None:
+        self._journal_config = journal_config
+        self._pending_records: list[tuple[Any, ...]] = []
+        self._segment: Optional[_Segment] = None
+        # held by whichever thread is writing: a flush on a worker thread can
+        # still be running when the final flush on shutdown starts
+        self._write_lock = threading.Lock()
+        self.written_records: int = 0
+        self.dropped_records: int = 0
+
+    def record_button_action(
+        self,
+        remote: PicoRemote,
+        button_id: ButtonId,
+        button_action: ButtonAction,
+        timestamp: float,
+    ) -> None:
+        self._append(
+            (
+                JournalRecordKind.BUTTON_ACTION.value,
+                timestamp,
+                remote.device_id,
+                button_id.value,
+                button_action.value,
+                -1,
+                _NO_GESTURE_ID,
+            )
+        )
+
+    def record_caseta_event(self, event: CasetaEvent, timestamp: float) -> None:
+        self._append(
+            (
+                JournalRecordKind.CASETA_EVENT.value,
+                timestamp,
+                event.remote.device_id,
+                event.button_id.value,
+                event.button_event.value,
+                (
+                    round(event.hold_duration_sec * 1000)
+                    if event.hold_duration_sec is not None
+                    else -1
+                ),
+                (
+                    bytes.fromhex(event.gesture_id)
+                    if event.gesture_id is not None
+                    else _NO_GESTURE_ID
+                ),
+            )
+        )
+
+    def _append(self, record: tuple[Any, ...]) -> None:
+        if len(self._pending_records) >= self._journal_config.max_pending_records:
+            self.dropped_records += 1
+            return
+        self._pending_records.append(record)
+
+    async def run(self) -> None:
+        """writes the buffered records every flush interval until cancelled"""
+        flush_interval_sec = self._journal_config.flush_interval_ms / 1000
+        try:
+            while True:
+                await asyncio.sleep(flush_interval_sec)
+                await self.flush()
+        finally:
+            # cancellation on shutdown: write whatever is left, right here
+            with self._write_lock:
+                self._write_locked(self._take_pending_records())
+                self._close_segment()
+
+    async def flush(self) -> None:
+        pending_records = self._take_pending_records()
+        if pending_records:
+            await asyncio.to_thread(self._write, pending_records)
+
+    def _take_pending_records(self) -> list[tuple[Any, ...]]:
+        pending_records = self._pending_records
+        self._pending_records = []
+        return pending_records
+
+    def _write(self, records: list[tuple[Any, ...]]) -> None:
+        with self._write_lock:
+            self._write_locked(records)
+
+    def _write_locked(self, records: list[tuple[Any, ...]]) -> None:
+        while records:
+            segment = self._current_segment()
+            free_records = segment.free_records()
+            if free_records == 0:
+                self._rotate()
+                continue
+            batch, records = records[:free_records], records[free_records:]
+            segment.write(b"".join(_RECORD.pack(*record) for record in batch))
+            self.written_records += len(batch)
+
+    def _current_segment(self) -> _Segment:
+        if self._segment is None:
+            directory = self._journal_config.directory
+            directory.mkdir(parents=True, exist_ok=True)
+            existing_segments = segment_paths(directory)
+            next_sequence = (
+                _segment_sequence(existing_segments[-1]) + 1 if existing_segments else 0
+            )
+            self._segment = _Segment(
+                directory / f"journal-{next_sequence:08d}.bin",
+                self._journal_config.segment_size_bytes,
+            )
+            LOGGER.debug("opened journal segment %s", self._segment.path)
+            self._remove_old_segments()
+        return self._segment
+
+    def _rotate(self) -> None:
+        self._close_segment()
+        self._current_segment()
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _remove_old_segments(self) -> None:
+        existing_segments = segment_paths(self._journal_config.directory)
+        for old_segment in existing_segments[: -self._journal_config.max_segments]:
+            LOGGER.debug("removing old journal segment %s", old_segment)
+            os.remove(old_segment)
+
+    def metrics_snapshot(self) -> dict[str, int]:
+        return {
+            "pending_records": len(self._pending_records),
+            "written_records": self.written_records,
+            "dropped_records": self.dropped_records,
+        }
+
+
+def _segment_sequence(segment_path: Path) -> int:
+    match = _SEGMENT_NAME_PATTERN.fullmatch(segment_path.name)
+    assert match is not None
+    return int(match.group(1))
+
+
+def segment_paths(directory: Path) -> list[Path]:
+    """the journal segments in a directory, oldest first"""
+    return sorted(
+        path
+        for path in directory.iterdir()
+        if _SEGMENT_NAME_PATTERN.fullmatch(path.name)
+    )
+
+
+def read_journal(directory: Path) -> Iterator[JournalRecord]:
+    """
+    reads every record, oldest first. a segment that is still open, or was not
+    closed cleanly, ends at its first unwritten (zeroed) record.
+    """
+    for segment_path in segment_paths(directory):
+        with open(segment_path, "rb") as segment_file:
+            if os.fstat(segment_file.fileno()).st_size < _SEGMENT_HEADER.size:
+                continue
+            with mmap.mmap(
+                segment_file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as segment_mmap:
+                magic, version = _SEGMENT_HEADER.unpack_from(segment_mmap)
+                if magic != _SEGMENT_MAGIC or version != _SEGMENT_VERSION:
+                    LOGGER.warning("skipping unknown journal segment %s", segment_path)
+                    continue
+                records_end = (
+                    len(segment_mmap) - _SEGMENT_HEADER.size
+                ) // _RECORD.size * _RECORD.size + _SEGMENT_HEADER.size
+                for packed_record in _RECORD.iter_unpack(
+                    segment_mmap[_SEGMENT_HEADER.size : records_end]
+                ):
+                    if packed_record[0] == 0:
+                        break
+                    yield JournalRecord.unpack(packed_record)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from enum import Enum
+from pathlib import PurePath
+from typing import Any, Mapping, Optional
+
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote
+
+_TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+
+class ButtonLogContext:
+    """
+    identifies a remote's button in log messages. pass it as a logging argument:
+    the string is only built if a record is actually emitted, and that happens on
+    the log writer thread rather than on the event loop.
+    """
+
+    __slots__ = ("_remote", "_button_id", "_formatted")
+
+    def __init__(self, remote: PicoRemote, button_id: ButtonId) -> None:
+        self._remote = remote
+        self._button_id = button_id
+        self._formatted: Optional[str] = None
+
+    def as_dict(self) -> Mapping[str, Any]:
+        return {
+            "remote_id": self._remote.device_id,
+            "remote_type": self._remote.type.as_str(),
+            "remote_name": self._remote.name,
+            "area": self._remote.area_name,
+            "button_id": self._button_id.name,
+        }
+
+    def __str__(self) -> str:
+        if self._formatted is None:
+            self._formatted = (
+                f"remote: <id: {self._remote.device_id}, "
+                f"type: {self._remote.type}, "
+                f"name: {self._remote.name}>, "
+                f"button:{self._button_id}"
+            )
+        return self._formatted
+
+
+class JsonFormatter(logging.Formatter):
+    """one JSON object per line. ButtonLogContext arguments become fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_entry: dict[str, Any] = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        record_args = record.args if isinstance(record.args, tuple) else ()
+        for record_arg in record_args:
+            if isinstance(record_arg, ButtonLogContext):
+                log_entry.update(record_arg.as_dict())
+        if record.exc_info:
+            log_entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log_entry)
+
+
+class _ArgSnapshot:
+    """a logging argument as it read when it was logged"""
+
+    __slots__ = ("_str", "_repr")
+
+    def __init__(self, arg: object) -> None:
+        self._str = str(arg)
+        self._repr = repr(arg)
+
+    def __str__(self) -> str:
+        return self._str
+
+    def __repr__(self) -> str:
+        return self._repr
+
+
+# arguments of these types can't change between logging and formatting
+_IMMUTABLE_ARG_TYPES: tuple[type, ...] = (
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    type(None),
+    Enum,
+    PurePath,
+    ButtonLogContext,
+)
+
+
+def _frozen_arg(arg: object) -> object:
+    if isinstance(arg, _IMMUTABLE_ARG_TYPES):
+        return arg
+    if isinstance(arg, tuple) and all(
+        isinstance(item, _IMMUTABLE_ARG_TYPES) for item in arg
+    ):
+        return arg
+    return _ArgSnapshot(arg)
+
+
+class _DeferredFormattingQueueHandler(logging.handlers.QueueHandler):
+    """
+    the stock QueueHandler formats each record before enqueueing it, which would
+    happen on the event loop. the queue never leaves this process, so the record
+    is handed over unformatted and formatted by the writer thread instead. by
+    then a mutable argument could have changed, so those are snapshotted here;
+    immutable ones, including ButtonLogContext, are passed along as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not isinstance(record.msg, str):
+            record.msg = str(record.msg)
+        if isinstance(record.args, tuple):
+            record.args = tuple(_frozen_arg(arg) for arg in record.args)
+        elif record.args:
+            record.args = {name: _frozen_arg(arg) for name, arg in record.args.items()}
+        return record
+
+
+def configure_logging(
+    log_level: str, json_output: bool = False
+) -> logging.handlers.QueueListener:
+    """
+    routes all logging through a queue. the returned listener owns the only
+    thread that writes to stderr; stop it on shutdown to flush pending records.
+    """
+    stream_handler = logging.StreamHandler(stream=sys.stderr)
+    stream_handler.setLevel(log_level)
+    stream_handler.setFormatter(
+        JsonFormatter() if json_output else logging.Formatter(_TEXT_FORMAT)
+    )
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, respect_handler_level=True
+    )
+    logging.basicConfig(
+        level=log_level,
+        handlers=[_DeferredFormattingQueueHandler(log_queue)],
+        force=True,
+    )
+    queue_listener.start()
+    return queue_listener
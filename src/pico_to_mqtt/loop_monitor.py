@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Mapping, Optional
+
+import attrs
+
+from pico_to_mqtt.config import LoopMonitorConfig
+from pico_to_mqtt.metrics import LatencyRecorder
+
+LOGGER = logging.getLogger(__name__)
+
+_MAX_SLOW_CALLBACKS = 16
+
+
+@attrs.frozen
+class SlowCallback:
+    blocked_for_sec: float
+    task_description: str
+    stack: str
+
+
+class LoopLagMonitor:
+    """
+    samples how late the event loop wakes up from a fixed sleep, and watches from a
+    separate thread for callbacks that hold the loop. when one does, that thread
+    captures the loop thread's stack so the blocking code can be found.
+    """
+
+    def __init__(
+        self,
+        loop_monitor_config: LoopMonitorConfig,
+        shutdown_condition: asyncio.Condition,
+    ) -> None:
+        self._loop_monitor_config = loop_monitor_config
+        self._shutdown_condition = shutdown_condition
+        self._sample_interval_sec = loop_monitor_config.sample_interval_ms / 1000
+        self._slow_callback_threshold_sec = (
+            loop_monitor_config.slow_callback_threshold_ms / 1000
+        )
+        self.lag = LatencyRecorder()
+        self.slow_callbacks: deque[SlowCallback] = deque(maxlen=_MAX_SLOW_CALLBACKS)
+        # time.monotonic() of the last sample, shared with the watchdog thread
+        self.last_sample_at: float = time.monotonic()
+        self.last_lag_sec: float = 0.0
+        self._stopped = threading.Event()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        slow_callback_watcher = threading.Thread(
+            target=self._watch_for_slow_callbacks,
+            args=(loop, threading.get_ident()),
+            name="loop-lag-monitor",
+            daemon=True,
+        )
+        slow_callback_watcher.start()
+
+        watchdog_lag_threshold_sec = (
+            self._loop_monitor_config.watchdog_lag_threshold_ms / 1000
+        )
+        watchdog_trip_after_sec = (
+            self._loop_monitor_config.watchdog_trip_after_ms / 1000
+        )
+        metrics_log_interval_sec = self._loop_monitor_config.metrics_log_interval_sec
+        next_metrics_log_at = loop.time() + metrics_log_interval_sec
+        lagging_since: Optional[float] = None
+        try:
+            while True:
+                expected_wake_up = loop.time() + self._sample_interval_sec
+                await asyncio.sleep(self._sample_interval_sec)
+                now = loop.time()
+                lag_sec = max(0.0, now - expected_wake_up)
+                self.lag.record(lag_sec)
+                self.last_lag_sec = lag_sec
+                self.last_sample_at = time.monotonic()
+
+                if lag_sec <= watchdog_lag_threshold_sec:
+                    lagging_since = None
+                elif lagging_since is None:
+                    lagging_since = now
+                elif (
+                    watchdog_trip_after_sec > 0
+                    and now - lagging_since >= watchdog_trip_after_sec
+                ):
+                    LOGGER.error(
+                        "event loop lag has stayed above %d ms for %.1f seconds. "
+                        "recent slow callbacks: %s",
+                        self._loop_monitor_config.watchdog_lag_threshold_ms,
+                        now - lagging_since,
+                        [
+                            slow_callback.task_description
+                            for slow_callback in self.slow_callbacks
+                        ],
+                    )
+                    lagging_since = None
+                    async with self._shutdown_condition:
+                        self._shutdown_condition.notify()
+
+                if metrics_log_interval_sec > 0 and now >= next_metrics_log_at:
+                    next_metrics_log_at = now + metrics_log_interval_sec
+                    LOGGER.info("event loop lag: %s", self.metrics_snapshot())
+        finally:
+            self._stopped.set()
+
+    def current_lag_sec(self) -> float:
+        """the last sample's lag, or how overdue the next sample is if that's more"""
+        overdue_sec = time.monotonic() - self.last_sample_at - self._sample_interval_sec
+        return max(self.last_lag_sec, overdue_sec)
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            **self.lag.snapshot(),
+            "slow_callbacks": len(self.slow_callbacks),
+        }
+
+    def _watch_for_slow_callbacks(
+        self, loop: asyncio.AbstractEventLoop, loop_thread_id: int
+    ) -> None:
+        reported_sample_at: Optional[float] = None
+        while not self._stopped.wait(self._slow_callback_threshold_sec / 2):
+            last_sample_at = self.last_sample_at
+            # the loop only samples once per interval, so lateness beyond that is
+            # time the loop spent unable to run the monitor
+            blocked_for_sec = (
+                time.monotonic() - last_sample_at - self._sample_interval_sec
+            )
+            if (
+                blocked_for_sec <= self._slow_callback_threshold_sec
+                or last_sample_at == reported_sample_at
+            ):
+                continue
+            reported_sample_at = last_sample_at
+
+            loop_frame = sys._current_frames().get(loop_thread_id)  # pyright: ignore[reportPrivateUsage]
+            stack = (
+                "".join(traceback.format_stack(loop_frame))
+                if loop_frame
+                else "<unavailable>"
+            )
+            current_task = asyncio.current_task(loop)
+            task_description = (
+                repr(current_task.get_coro()) if current_task else "<no running task>"
+            )
+            self.slow_callbacks.append(
+                SlowCallback(blocked_for_sec, task_description, stack)
+            )
+            LOGGER.warning(
+                "the event loop has been blocked for at least %.0f ms by %s. "
+                "stack of the loop thread:\n%s",
+                blocked_for_sec * 1000,
+                task_description,
+                stack,
+            )
@@ -1,29 +1,36 @@
 import asyncio
-import datetime
+import contextlib
+import functools
 import logging
 import os
 import signal
-import sys
 import traceback
 from typing import Any, Mapping, Optional
 
 import aiomqtt
 
+from pico_to_mqtt.caseta.bridge_connector import BridgeConnector
 from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.caseta.rules import RulesEngine
 from pico_to_mqtt.caseta.topology import Topology, default_bridge
+from pico_to_mqtt.clock import LoopClock
 from pico_to_mqtt.config import AllConfig, MqttConfig, MqttCredentials, get_config
+from pico_to_mqtt.config_reload import ConfigReloader
+from pico_to_mqtt.discovery import DiscoveryPublisher
 from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.health import HealthServer
+from pico_to_mqtt.journal import EventJournal
+from pico_to_mqtt.logging_config import configure_logging
+from pico_to_mqtt.loop_monitor import LoopLagMonitor
+from pico_to_mqtt.memory_diagnostics import MemoryDiagnostics
+from pico_to_mqtt.mqtt5 import BrokerTopicAliasMaximum
+from pico_to_mqtt.sinks import QueuedSink, queued_sinks
 
 _LOGLEVEL = os.environ.get("LOGLEVEL", "INFO").upper()
-_HANDLER = logging.StreamHandler(stream=sys.stderr)
-_HANDLER.setLevel(_LOGLEVEL)
-_FORMATTER = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-_HANDLER.setFormatter(_FORMATTER)
-logging.basicConfig(level=_LOGLEVEL, handlers=[_HANDLER])
+_LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
 LOGGER = logging.getLogger(__name__)
 
 _TERMINATION_SIGNALS = [
-    signal.SIGHUP,
     signal.SIGTERM,
     signal.SIGINT,
 ]
@@ -47,6 +54,49 @@ async def shutdown(
     loop.stop()
 
 
+def _on_termination_signal(
+    loop: asyncio.AbstractEventLoop,
+    termination_signal: signal.Signals,
+    termination_requested: asyncio.Event,
+):
+    if termination_requested.is_set():
+        LOGGER.warning(
+            "received %s while draining. shutting down right away",
+            termination_signal.name,
+        )
+        asyncio.create_task(shutdown(loop, termination_signal))
+        return
+    LOGGER.info(
+        "received termination signal %s. draining before shutting down",
+        termination_signal.name,
+    )
+    termination_requested.set()
+
+
+async def drain(
+    button_tracker: ButtonTracker,
+    caseta_event_handler: EventHandler,
+    drain_deadline_sec: float,
+) -> None:
+    """
+    lets the gestures that are being watched finish, then waits for their events
+    to be published, all within the deadline
+    """
+    try:
+        async with asyncio.timeout(drain_deadline_sec):
+            await button_tracker.drain()
+            await caseta_event_handler.drain()
+        LOGGER.info("published every detected gesture")
+    except TimeoutError:
+        LOGGER.warning(
+            "the %.1f second drain deadline passed. "
+            "button tracker metrics: %s, publish metrics: %s",
+            drain_deadline_sec,
+            button_tracker.metrics_snapshot(),
+            caseta_event_handler.metrics_snapshot(),
+        )
+
+
 def handle_exception(loop: asyncio.AbstractEventLoop, context: Mapping[str, Any]):
     if "exception" in context:
         exception = context["exception"]
@@ -76,77 +126,266 @@ def new_mqtt_client(
         username=mqtt_credentials.username,
         password=mqtt_credentials.password,
         tls_params=tls_params,
+        max_inflight_messages=mqtt_config.max_inflight_messages,
+        protocol=aiomqtt.ProtocolVersion.V5 if mqtt_config.mqtt5.enabled else None,
     )
 
 
 async def main_loop(configuration: AllConfig):
     shutdown_condition = asyncio.Condition()
+    # replaces the handlers installed by main(), which shut down right away
+    termination_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for termination_signal in _TERMINATION_SIGNALS:
+        loop.add_signal_handler(
+            termination_signal,
+            functools.partial(
+                _on_termination_signal, loop, termination_signal, termination_requested
+            ),
+        )
+    loop_lag_monitor: Optional[LoopLagMonitor] = None
+    if configuration.loop_monitor_config.enabled:
+        loop_lag_monitor = LoopLagMonitor(
+            configuration.loop_monitor_config, shutdown_condition
+        )
+        asyncio.create_task(loop_lag_monitor.run())
+    journal: Optional[EventJournal] = None
+    if configuration.journal_config.enabled:
+        journal = EventJournal(configuration.journal_config)
+        asyncio.create_task(journal.run())
     mqtt_client = new_mqtt_client(
         configuration.mqtt_config, configuration.mqtt_credentials
     )
+    broker_topic_alias_maximum = BrokerTopicAliasMaximum(mqtt_client)
+    sinks = queued_sinks(configuration.sinks_config)
+    rules_engine: Optional[RulesEngine] = None
+    if configuration.rules_config.rules:
+        rules_engine = RulesEngine(configuration.rules_config)
+        sinks.append(QueuedSink(rules_engine, configuration.sinks_config.queue_size))
 
-    async with mqtt_client as context_managed_mqtt_client:
-        caseta_event_handler = EventHandler(
-            context_managed_mqtt_client, shutdown_condition
-        )
-        button_tracker = ButtonTracker(
-            shutdown_condition,
-            caseta_event_handler,
-            configuration.button_watcher_config,
-            datetime.datetime.now,
+    # the client is only used once it is connected, by the handler's run()
+    caseta_event_handler = EventHandler(
+        mqtt_client,
+        shutdown_condition,
+        configuration.mqtt_config,
+        configuration.publish_scheduler_config,
+        LoopClock(),
+        journal,
+        sinks,
+    )
+    button_tracker = ButtonTracker(
+        shutdown_condition,
+        caseta_event_handler,
+        configuration.button_watcher_config,
+        LoopClock(),
+        configuration.task_supervision_config,
+        journal,
+    )
+    asyncio.create_task(button_tracker.log_metrics_periodically())
+    adaptive_double_click_config = (
+        configuration.button_watcher_config.adaptive_double_click
+    )
+    if adaptive_double_click_config.state_file is not None:
+        button_tracker.adaptive_double_click_windows.load(
+            adaptive_double_click_config.state_file
         )
-        current_topology: Optional[Topology] = None
-        while True:
-            new_topology = Topology(
-                default_bridge(configuration.caseta_config),
-                shutdown_condition,
-                button_tracker,
+        asyncio.create_task(
+            button_tracker.adaptive_double_click_windows.save_periodically(
+                adaptive_double_click_config.state_file
             )
-            await new_topology.connect()
-
-            if not current_topology:
-                LOGGER.info("connecting an initial topology instance")
-                current_topology = new_topology
-                current_topology.attach_callbacks()
-            elif current_topology.remotes_by_id != new_topology.remotes_by_id:
-                LOGGER.info(
-                    "new topoology differs from existing topology. "
-                    "swapping out the old topology"
+        )
+    # shared by every topology, so refreshes reuse the ssl context and resume
+    # the tls session
+    bridge_connector = BridgeConnector(configuration.caseta_config)
+    memory_diagnostics = MemoryDiagnostics(
+        configuration.memory_diagnostics_config,
+        {
+            "button_tracker": button_tracker.metrics_snapshot,
+            "event_handler": caseta_event_handler.metrics_snapshot,
+            "bridge_connector": bridge_connector.metrics_snapshot,
+        },
+    )
+    loop.add_signal_handler(
+        signal.SIGUSR1,
+        lambda: asyncio.create_task(memory_diagnostics.log_report()),
+    )
+    config_reloader = ConfigReloader(button_tracker, configuration)
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGHUP, lambda: asyncio.create_task(config_reloader.reload())
+    )
+    asyncio.create_task(
+        config_reloader.watch_config_files(
+            configuration.hot_reload_config.config_file_poll_interval_sec
+        )
+    )
+
+    # the sinks and the rules engine don't need the broker, so they take events
+    # while it is still being connected to
+    asyncio.create_task(caseta_event_handler.run_sinks())
+
+    health_server: Optional[HealthServer] = None
+    if configuration.health_config.enabled:
+        # started first, so checks during startup see the service as live but
+        # not ready yet
+        health_server = HealthServer(
+            configuration.health_config, caseta_event_handler, loop_lag_monitor
+        )
+        await health_server.start()
+
+    current_topology = Topology(
+        default_bridge(bridge_connector),
+        shutdown_condition,
+        button_tracker,
+        rules_engine,
+    )
+    async with contextlib.AsyncExitStack() as exit_stack:
+        if health_server is not None:
+            # closed last, so checks during shutdown see the service as not ready
+            exit_stack.push_async_callback(health_server.close)
+        # both tls handshakes at once. gestures detected before the broker
+        # connection is up wait in the publish scheduler
+        connected = await connect_unless_terminated(
+            asyncio.gather(
+                exit_stack.enter_async_context(mqtt_client),
+                connect_initial_topology(current_topology),
+            ),
+            termination_requested,
+        )
+        if not connected:
+            LOGGER.info("termination requested while connecting. not draining")
+            try:
+                await current_topology.close()
+            except Exception:
+                # already logged. the mqtt client still needs to be closed
+                pass
+        else:
+            LOGGER.info("connected to the mqtt broker")
+            caseta_event_handler.connected(broker_topic_alias_maximum.value)
+            exit_stack.callback(setattr, caseta_event_handler, "mqtt_connected", False)
+            asyncio.create_task(caseta_event_handler.watch_connection())
+            if health_server is not None:
+                health_server.topology = current_topology
+            asyncio.create_task(caseta_event_handler.run_publishing())
+            discovery_publisher = caseta_event_handler.discovery_publisher
+            if discovery_publisher is not None:
+                asyncio.create_task(
+                    update_discovery(discovery_publisher, current_topology)
                 )
-                old_topology = current_topology
-                current_topology = new_topology
-                current_topology.attach_callbacks()
-                asyncio.create_task(old_topology.close())
-            else:
-                LOGGER.debug(
-                    "the new topology is the same as the old topology. "
-                    "closing the new topology instance, since we won't need it anymore"
+            while True:
+                wait_for_caseta_bridge_refresh_interval_task = asyncio.create_task(
+                    asyncio.sleep(
+                        configuration.caseta_config.caseta_bridge_refresh_interval_sec
+                    )
                 )
-                asyncio.create_task(new_topology.close())
-
-            wait_for_caseta_bridge_refresh_interval_task = asyncio.create_task(
-                asyncio.sleep(
-                    configuration.caseta_config.caseta_bridge_refresh_interval_sec
+                wait_for_shutdown_condition_task = asyncio.create_task(
+                    wait_for_shutdown_condition(shutdown_condition)
                 )
-            )
-            wait_for_shutdown_condition_task = asyncio.create_task(
-                wait_for_shutdown_condition(shutdown_condition)
-            )
-            finished_tasks, _unfinished_tasks = await asyncio.wait(
-                [
-                    wait_for_caseta_bridge_refresh_interval_task,
-                    wait_for_shutdown_condition_task,
-                ],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
+                wait_for_termination_request_task = asyncio.create_task(
+                    termination_requested.wait()
+                )
+                finished_tasks, _unfinished_tasks = await asyncio.wait(
+                    [
+                        wait_for_caseta_bridge_refresh_interval_task,
+                        wait_for_shutdown_condition_task,
+                        wait_for_termination_request_task,
+                    ],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if wait_for_shutdown_condition_task in finished_tasks:
+                    asyncio.get_running_loop().call_exception_handler(
+                        {"message": "shutdown condition received"}
+                    )
+                    return
+                elif wait_for_termination_request_task in finished_tasks:
+                    wait_for_caseta_bridge_refresh_interval_task.cancel()
+                    wait_for_shutdown_condition_task.cancel()
+                    await drain(
+                        button_tracker,
+                        caseta_event_handler,
+                        configuration.shutdown_config.drain_deadline_sec,
+                    )
+                    try:
+                        await current_topology.close()
+                    except Exception:
+                        # already logged. the mqtt client still needs to be closed
+                        pass
+                    break
+                else:
+                    wait_for_shutdown_condition_task.cancel()
+                    wait_for_termination_request_task.cancel()
 
-            if wait_for_shutdown_condition_task in finished_tasks:
-                asyncio.get_running_loop().call_exception_handler(
-                    {"message": "shutdown condition received"}
+                new_topology = Topology(
+                    default_bridge(bridge_connector),
+                    shutdown_condition,
+                    button_tracker,
+                    rules_engine,
                 )
-                return
-            else:
-                wait_for_shutdown_condition_task.cancel()
+                await new_topology.connect()
+                if current_topology.fingerprint != new_topology.fingerprint:
+                    LOGGER.info(
+                        "new topoology differs from existing topology. "
+                        "swapping out the old topology"
+                    )
+                    old_topology = current_topology
+                    current_topology = new_topology
+                    current_topology.attach_callbacks()
+                    if health_server is not None:
+                        health_server.topology = current_topology
+                    asyncio.create_task(old_topology.close())
+                    if discovery_publisher is not None:
+                        asyncio.create_task(
+                            update_discovery(discovery_publisher, current_topology)
+                        )
+                else:
+                    LOGGER.debug(
+                        "the new topology is the same as the old topology. closing "
+                        "the new topology instance, since we won't need it anymore"
+                    )
+                    asyncio.create_task(new_topology.close())
+    LOGGER.info("disconnected from the mqtt broker")
+    await shutdown(loop)
+
+
+async def connect_unless_terminated(
+    connecting: asyncio.Future[Any], termination_requested: asyncio.Event
+) -> bool:
+    """
+    waits for `connecting`, which is cancelled if termination is requested first.
+    returns whether it finished
+    """
+    wait_for_termination_request_task = asyncio.create_task(
+        termination_requested.wait()
+    )
+    try:
+        await asyncio.wait(
+            [connecting, wait_for_termination_request_task],
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        wait_for_termination_request_task.cancel()
+    if connecting.done():
+        # raises if connecting failed
+        connecting.result()
+        return True
+    connecting.cancel()
+    await asyncio.gather(connecting, return_exceptions=True)
+    return False
+
+
+async def connect_initial_topology(topology: Topology) -> None:
+    await topology.connect()
+    LOGGER.info("connecting an initial topology instance")
+    topology.attach_callbacks()
+
+
+async def update_discovery(
+    discovery_publisher: DiscoveryPublisher, topology: Topology
+) -> None:
+    assert topology.remotes_by_id is not None
+    await discovery_publisher.update(
+        topology.remotes_by_id.values(), topology.remote_fingerprints
+    )
 
 
 async def wait_for_shutdown_condition(shutdown_condition: asyncio.Condition) -> None:
@@ -155,6 +394,7 @@ async def wait_for_shutdown_condition(shutdown_condition: asyncio.Condition) ->
 
 
 def main():
+    log_listener = configure_logging(_LOGLEVEL, json_output=_LOG_FORMAT == "json")
     configuration = get_config()
     loop = asyncio.new_event_loop()
     for termination_signal in _TERMINATION_SIGNALS:
@@ -171,6 +411,7 @@ def main():
         loop.close()
 
     LOGGER.info("shutdown work complete.")
+    log_listener.stop()
 
 
 if __name__ == "__main__":
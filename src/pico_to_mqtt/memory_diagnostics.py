@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import gc
+import logging
+import tracemalloc
+from typing import Any, Callable, Mapping, Optional
+
+from pylutron_caseta.smartbridge import Smartbridge
+
+from pico_to_mqtt.caseta.button_watcher import ButtonHistory, ButtonWatcher
+from pico_to_mqtt.caseta.topology import Topology
+from pico_to_mqtt.config import MemoryDiagnosticsConfig
+
+LOGGER = logging.getLogger(__name__)
+
+# the objects a long running service could pile up: watchers that are never
+# dropped, and topologies or bridge sessions left over from refresh swaps
+COUNTED_TYPES: tuple[type, ...] = (
+    ButtonWatcher,
+    ButtonHistory,
+    Topology,
+    Smartbridge,
+)
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def live_object_counts(types: tuple[type, ...]) -> Mapping[str, int]:
+    """walks every object the garbage collector tracks, so it takes a while"""
+    counts = dict.fromkeys((counted_type.__name__ for counted_type in types), 0)
+    for tracked_object in gc.get_objects():
+        for counted_type in types:
+            if isinstance(tracked_object, counted_type):
+                counts[counted_type.__name__] += 1
+    return counts
+
+
+class MemoryDiagnostics:
+    """
+    builds memory reports on demand. the slow parts, walking the heap and taking
+    and comparing snapshots, run on a worker thread, so the loop keeps serving
+    button events meanwhile. unless tracing runs from startup, a report traces
+    for a while and then stops tracing, so allocations are only slowed down while
+    a report is being built. otherwise the previous snapshot is kept for the next
+    diff.
+    """
+
+    def __init__(
+        self,
+        memory_diagnostics_config: MemoryDiagnosticsConfig,
+        metrics_sources: Mapping[str, Callable[[], Mapping[str, Any]]] = {},
+    ) -> None:
+        self._memory_diagnostics_config = memory_diagnostics_config
+        self._metrics_sources = metrics_sources
+        self._previous_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._reporting = asyncio.Lock()
+        if memory_diagnostics_config.trace_from_startup:
+            self._start_tracing()
+
+    def _start_tracing(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._previous_snapshot = self._take_snapshot()
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    async def report(self) -> Mapping[str, Any]:
+        async with self._reporting:
+            tracing_for_this_report = not tracemalloc.is_tracing()
+            if tracing_for_this_report:
+                LOGGER.info(
+                    "tracing allocations for %.0f seconds for the memory report",
+                    self._memory_diagnostics_config.trace_window_sec,
+                )
+                await asyncio.to_thread(self._start_tracing)
+            try:
+                if tracing_for_this_report:
+                    await asyncio.sleep(
+                        self._memory_diagnostics_config.trace_window_sec
+                    )
+                # these only make sense on the loop's thread
+                loop_report = {
+                    "asyncio_tasks": len(asyncio.all_tasks()),
+                    **{
+                        name: metrics_source()
+                        for name, metrics_source in self._metrics_sources.items()
+                    },
+                }
+                heap_report = await asyncio.to_thread(self._heap_report)
+            finally:
+                if tracing_for_this_report:
+                    tracemalloc.stop()
+                    self._previous_snapshot = None
+            return {**loop_report, **heap_report}
+
+    def _heap_report(self) -> Mapping[str, Any]:
+        heap_report: dict[str, Any] = {
+            "live_objects": live_object_counts(COUNTED_TYPES),
+            "gc_tracked_objects": len(gc.get_objects()),
+            "gc_uncollectable_objects": len(gc.garbage),
+        }
+        snapshot = self._take_snapshot()
+        traced_bytes, peak_traced_bytes = tracemalloc.get_traced_memory()
+        heap_report["traced_bytes"] = traced_bytes
+        heap_report["peak_traced_bytes"] = peak_traced_bytes
+        heap_report["tracemalloc_overhead_bytes"] = tracemalloc.get_tracemalloc_memory()
+        top_allocation_sites = self._memory_diagnostics_config.top_allocation_sites
+        if self._previous_snapshot is not None:
+            heap_report["top_growth"] = [
+                str(statistic_diff)
+                for statistic_diff in snapshot.compare_to(
+                    self._previous_snapshot, "lineno"
+                )[:top_allocation_sites]
+            ]
+        self._previous_snapshot = snapshot
+        return heap_report
+
+    async def log_report(self) -> None:
+        if self._reporting.locked():
+            LOGGER.info("a memory report is already being built")
+            return
+        LOGGER.info("memory diagnostics: %s", await self.report())
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Mapping
+
+_DEFAULT_MAX_SAMPLES = 1024
+
+
+class LatencyRecorder:
+    """keeps a bounded window of recent latency samples, in seconds"""
+
+    def __init__(self, max_samples: int = _DEFAULT_MAX_SAMPLES) -> None:
+        self._samples: deque[float] = deque(maxlen=max_samples)
+        self.count: int = 0
+        self.max: float = 0.0
+
+    def record(self, latency_sec: float) -> None:
+        self._samples.append(latency_sec)
+        self.count += 1
+        if latency_sec > self.max:
+            self.max = latency_sec
+
+    def percentile(self, percentile: float) -> float:
+        """nearest-rank percentile over the recent samples, 0.0 when empty"""
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        rank = max(math.ceil(percentile / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+    def snapshot(self) -> Mapping[str, float]:
+        return {
+            "count": self.count,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
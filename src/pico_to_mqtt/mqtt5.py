@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional, Sequence
+
+import aiomqtt
+import paho.mqtt.client as paho
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TopicAliasTable:
+    """
+    hands out MQTT v5 topic aliases, one per topic, for the life of a connection.
+
+    the broker learns an alias from a publish that carries both the topic and the
+    alias. paho may hold a QoS > 0 publish back while its in-flight window is
+    full, so an alias only counts as known to the broker once such a publish has
+    completed; until then every publish carries the full topic again.
+    """
+
+    def __init__(self, max_aliases: int) -> None:
+        self._max_aliases = max_aliases
+        self._aliases: dict[str, int] = {}
+        self._established: set[str] = set()
+
+    def alias_for(self, topic: str) -> Optional[int]:
+        """the topic's alias, or None once every alias is taken"""
+        alias = self._aliases.get(topic)
+        if alias is None and len(self._aliases) < self._max_aliases:
+            alias = len(self._aliases) + 1
+            self._aliases[topic] = alias
+            if alias == self._max_aliases:
+                LOGGER.info(
+                    "all %d topic aliases are taken, newer topics are sent in full",
+                    self._max_aliases,
+                )
+        return alias
+
+    def is_established(self, topic: str) -> bool:
+        return topic in self._established
+
+    def mark_established(self, topic: str) -> None:
+        self._established.add(topic)
+
+
+class BrokerTopicAliasMaximum:
+    """
+    the Topic Alias Maximum the broker sent in its last CONNACK, 0 when it sent
+    none. aiomqtt drops the CONNACK properties, so this wraps the on_connect
+    callback of its paho client; it must be created before connecting.
+    """
+
+    def __init__(self, mqtt_client: aiomqtt.Client) -> None:
+        self.value: int = 0
+        paho_client: paho.Client = mqtt_client._client  # pyright: ignore[reportPrivateUsage]
+        on_connect = paho_client.on_connect
+
+        def on_connect_recording_the_maximum(
+            client: paho.Client,
+            userdata: Any,
+            flags: dict[str, int],
+            rc: int | paho.ReasonCodes,
+            properties: Optional[Properties] = None,
+        ) -> None:
+            self.value = getattr(properties, "TopicAliasMaximum", 0)
+            if on_connect is not None:
+                on_connect(client, userdata, flags, rc, properties)
+
+        paho_client.on_connect = on_connect_recording_the_maximum
+
+
+def publish_properties(
+    topic_alias: Optional[int], user_properties: Sequence[tuple[str, str]]
+) -> Optional[Properties]:
+    if topic_alias is None and not user_properties:
+        return None
+    properties = Properties(PacketTypes.PUBLISH)
+    if topic_alias is not None:
+        properties.TopicAlias = topic_alias
+    if user_properties:
+        properties.UserProperty = list(user_properties)
+    return properties
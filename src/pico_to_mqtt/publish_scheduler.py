@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+import attrs
+
+from pico_to_mqtt.caseta.model import ButtonEvent, ButtonId, CasetaEvent
+from pico_to_mqtt.clock import Clock, LoopClock
+from pico_to_mqtt.config import PublishSchedulerConfig
+from pico_to_mqtt.metrics import LatencyRecorder
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PublishLane(Enum):
+    """lanes are drained in declaration order"""
+
+    TERMINAL = 0
+    REPEAT = 1
+
+    @classmethod
+    def of_button_event(cls, button_event: ButtonEvent) -> PublishLane:
+        if button_event == ButtonEvent.LONG_PRESS_ONGOING:
+            return cls.REPEAT
+        return cls.TERMINAL
+
+
+@attrs.frozen
+class QueuedEvent:
+    event: CasetaEvent
+    enqueued_at: float
+
+
+def _button_key(event: CasetaEvent) -> tuple[int, ButtonId]:
+    return (event.remote.device_id, event.button_id)
+
+
+class PublishScheduler:
+    """
+    queues caseta events in front of the publisher so that gestures that have
+    finished are never stuck behind LONG_PRESS_ONGOING ticks.
+
+    repeat ticks are coalesced per button -- only the newest queued tick for a
+    button is kept -- and ticks that waited too long, or that are superseded by a
+    terminal event for the same button, are shed. both lanes are bounded, and
+    shed their oldest events once full.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[CasetaEvent], Awaitable[None]],
+        publish_scheduler_config: PublishSchedulerConfig,
+        clock: Clock = LoopClock(),
+    ) -> None:
+        self._publish = publish
+        self._publish_scheduler_config = publish_scheduler_config
+        self._clock = clock
+        self._terminal_lane: deque[QueuedEvent] = deque()
+        self._repeat_lane: OrderedDict[tuple[int, ButtonId], QueuedEvent] = (
+            OrderedDict()
+        )
+        self._work_available = asyncio.Event()
+        # set while nothing is queued and no publish is in progress
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.queueing_delays: Mapping[PublishLane, LatencyRecorder] = {
+            lane: LatencyRecorder() for lane in PublishLane
+        }
+        self.coalesced_repeat_ticks: int = 0
+        self.shed_repeat_ticks: int = 0
+        self.shed_terminal_events: int = 0
+
+    def submit(self, event: CasetaEvent) -> None:
+        queued_event = QueuedEvent(event, self._clock.now())
+        button_key = _button_key(event)
+        if PublishLane.of_button_event(event.button_event) == PublishLane.TERMINAL:
+            # a stale tick must not be published after the gesture has finished
+            if self._repeat_lane.pop(button_key, None) is not None:
+                self.shed_repeat_ticks += 1
+            self._terminal_lane.append(queued_event)
+            if (
+                len(self._terminal_lane)
+                > self._publish_scheduler_config.max_terminal_backlog
+            ):
+                self._terminal_lane.popleft()
+                self.shed_terminal_events += 1
+                # a power of two, so a backlog is visible without flooding the log
+                if self.shed_terminal_events & (self.shed_terminal_events - 1) == 0:
+                    LOGGER.warning(
+                        "the publish queue is full. dropped %d events so far",
+                        self.shed_terminal_events,
+                    )
+        else:
+            if self._repeat_lane.pop(button_key, None) is not None:
+                self.coalesced_repeat_ticks += 1
+            self._repeat_lane[button_key] = queued_event
+            while (
+                len(self._repeat_lane)
+                > self._publish_scheduler_config.max_repeat_backlog
+            ):
+                self._repeat_lane.popitem(last=False)
+                self.shed_repeat_ticks += 1
+        self._idle.clear()
+        self._work_available.set()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._terminal_lane) + len(self._repeat_lane)
+
+    def _next_queued_event(self) -> Optional[tuple[PublishLane, QueuedEvent]]:
+        if self._terminal_lane:
+            return (PublishLane.TERMINAL, self._terminal_lane.popleft())
+        if self._repeat_lane:
+            _button_key, queued_event = self._repeat_lane.popitem(last=False)
+            return (PublishLane.REPEAT, queued_event)
+        return None
+
+    async def run(self) -> None:
+        while True:
+            await self._work_available.wait()
+            next_queued_event = self._next_queued_event()
+            if next_queued_event is None:
+                self._work_available.clear()
+                self._idle.set()
+                continue
+
+            lane, queued_event = next_queued_event
+            queueing_delay = self._clock.now() - queued_event.enqueued_at
+            if (
+                lane == PublishLane.REPEAT
+                and queueing_delay
+                > self._publish_scheduler_config.max_repeat_tick_age_sec
+            ):
+                self.shed_repeat_ticks += 1
+                continue
+            self.queueing_delays[lane].record(queueing_delay)
+            await self._publish(queued_event.event)
+
+    async def wait_until_idle(self) -> None:
+        """returns once every submitted event was published or shed"""
+        await self._idle.wait()
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "coalesced_repeat_ticks": self.coalesced_repeat_ticks,
+            "shed_repeat_ticks": self.shed_repeat_ticks,
+            "shed_terminal_events": self.shed_terminal_events,
+            "queueing_delay": {
+                lane.name.lower(): recorder.snapshot()
+                for lane, recorder in self.queueing_delays.items()
+            },
+        }
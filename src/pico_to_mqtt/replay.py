@@ -0,0 +1,257 @@
+"""
+feeds the raw button events of a journal through the button tracker on a virtual
+clock, and prints the gestures it detects as JSON lines, followed by one line of
+timing stats.
+
+    pico-to-mqtt-replay path/to/journal --settings settings.toml
+
+the journal only has remote ids, so remotes are replayed under the area `replay`
+and the name `remote-<id>`. gesture profiles keyed by area or remote name do not
+apply to them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tomllib
+from pathlib import Path
+from typing import IO, Any, Iterable, Mapping, MutableMapping, Optional, cast
+
+import attrs
+import typed_settings as ts
+
+from pico_to_mqtt import APP_NAME
+from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.clock import LoopClock
+from pico_to_mqtt.config import ButtonWatcherConfig, TaskSupervisionConfig
+from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.journal import JournalRecord, JournalRecordKind, read_journal
+from pico_to_mqtt.metrics import LatencyRecorder
+from pico_to_mqtt.virtual_time import run_in_virtual_time
+
+_REPLAY_AREA_NAME = "replay"
+
+
+@attrs.frozen
+class DetectedGesture:
+    # virtual seconds since the first replayed event
+    offset_sec: float
+    event: CasetaEvent
+
+    def as_dict(self) -> Mapping[str, Any]:
+        gesture: dict[str, Any] = {
+            "offset_ms": round(self.offset_sec * 1000, 3),
+            "remote_id": self.event.remote.device_id,
+            "button_id": self.event.button_id.name,
+            "action": self.event.button_event.name,
+        }
+        if self.event.hold_duration_sec is not None:
+            gesture["hold_duration_ms"] = round(self.event.hold_duration_sec * 1000)
+        return gesture
+
+
+class _GestureRecorder:
+    """stands in for the EventHandler and keeps every event instead of publishing"""
+
+    def __init__(self, started_at: float) -> None:
+        self._started_at = started_at
+        self._clock = LoopClock()
+        self.gestures: list[DetectedGesture] = []
+        # when each button's last raw event was replayed
+        self.last_action_at: MutableMapping[tuple[int, ButtonId], float] = {}
+        self.detection_delays: MutableMapping[ButtonEvent, LatencyRecorder] = {}
+
+    async def handle_event(self, event: CasetaEvent) -> None:
+        now = self._clock.now()
+        self.gestures.append(DetectedGesture(now - self._started_at, event))
+        last_action_at = self.last_action_at.get(
+            (event.remote.device_id, event.button_id)
+        )
+        if last_action_at is not None:
+            self.detection_delays.setdefault(
+                event.button_event, LatencyRecorder()
+            ).record(now - last_action_at)
+
+
+@attrs.frozen
+class ReplayResult:
+    gestures: list[DetectedGesture]
+    raw_events: int
+    virtual_duration_sec: float
+    wall_duration_sec: float
+    detection_delays: Mapping[ButtonEvent, LatencyRecorder]
+    # button event and watcher tasks the tracker shed. a replay should shed none
+    shed_tasks: int
+
+    def stats(self) -> Mapping[str, Any]:
+        return {
+            "raw_events": self.raw_events,
+            "gestures": len(self.gestures),
+            "shed_tasks": self.shed_tasks,
+            "virtual_duration_sec": round(self.virtual_duration_sec, 3),
+            "wall_duration_sec": round(self.wall_duration_sec, 3),
+            "speedup": (
+                round(self.virtual_duration_sec / self.wall_duration_sec, 1)
+                if self.wall_duration_sec > 0
+                else None
+            ),
+            "raw_events_per_sec": (
+                round(self.raw_events / self.wall_duration_sec)
+                if self.wall_duration_sec > 0
+                else None
+            ),
+            "detection_delay": {
+                button_event.name.lower(): recorder.snapshot()
+                for button_event, recorder in self.detection_delays.items()
+            },
+        }
+
+
+def _replay_remote(remote_id: int) -> PicoRemote:
+    return PicoRemote(
+        remote_id,
+        PicoRemoteType.PICO_THREE_BUTTON_RAISE_LOWER,
+        f"remote-{remote_id}",
+        _REPLAY_AREA_NAME,
+        {},
+    )
+
+
+async def _replay(
+    records: Iterable[JournalRecord], button_watcher_config: ButtonWatcherConfig
+) -> ReplayResult:
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    gesture_recorder = _GestureRecorder(started_at)
+    button_tracker = ButtonTracker(
+        asyncio.Condition(),
+        # only handle_event is used by the tracker and its watchers
+        cast(EventHandler, gesture_recorder),
+        button_watcher_config,
+        LoopClock(),
+        # replayed events arrive as fast as the tracker takes them, so a burst in
+        # the journal must not be shed the way the live service would shed it
+        TaskSupervisionConfig(
+            max_pending_button_events=sys.maxsize,
+            max_button_watchers=sys.maxsize,
+            metrics_log_interval_sec=0,
+        ),
+    )
+    remotes_by_id: dict[int, PicoRemote] = {}
+    first_timestamp: Optional[float] = None
+    raw_events = 0
+    wall_started_at = time.perf_counter()
+    for record in records:
+        if record.kind != JournalRecordKind.BUTTON_ACTION:
+            continue
+        assert record.button_action is not None
+        if first_timestamp is None:
+            first_timestamp = record.timestamp
+        await asyncio.sleep(
+            max(0.0, started_at + record.timestamp - first_timestamp - loop.time())
+        )
+        remote = remotes_by_id.get(record.remote_id)
+        if remote is None:
+            remote = _replay_remote(record.remote_id)
+            remotes_by_id[record.remote_id] = remote
+        gesture_recorder.last_action_at[(record.remote_id, record.button_id)] = (
+            loop.time()
+        )
+        button_tracker.button_event_callback(remote, record.button_id)(
+            record.button_action.name
+        )
+        raw_events += 1
+    await asyncio.sleep(0)
+    await button_tracker.drain()
+    task_metrics = button_tracker.metrics_snapshot()
+    return ReplayResult(
+        gesture_recorder.gestures,
+        raw_events,
+        loop.time() - started_at,
+        time.perf_counter() - wall_started_at,
+        gesture_recorder.detection_delays,
+        sum(
+            task_metrics[task_group]["rejected"]
+            + task_metrics[task_group]["cancelled_for_room"]
+            for task_group in ("button_events", "button_watchers")
+        ),
+    )
+
+
+def replay(
+    records: Iterable[JournalRecord], button_watcher_config: ButtonWatcherConfig
+) -> ReplayResult:
+    """replays the raw button events on a fresh virtual-time event loop"""
+    return run_in_virtual_time(_replay(records, button_watcher_config))
+
+
+def _load_button_watcher_config(settings_file: Optional[Path]) -> ButtonWatcherConfig:
+    if settings_file is None:
+        return ButtonWatcherConfig()
+    return ts.load(
+        ButtonWatcherConfig,
+        APP_NAME,
+        config_files=[settings_file],
+        config_file_section=_button_watcher_config_section(settings_file),
+        config_files_var=None,
+        env_prefix=None,
+    )
+
+
+def _button_watcher_config_section(settings_file: Path) -> str:
+    """
+    the section `config.get_config` takes the button watcher config from.
+    typed-settings turns dashes in keys into underscores, so either spelling of
+    the name works there, but a section name is looked up as written
+    """
+    app_section = APP_NAME.replace("_", "-")
+    with settings_file.open("rb") as settings:
+        app_settings = tomllib.load(settings).get(app_section, {})
+    for key in app_settings:
+        if key.replace("-", "_") == "button_watcher_config":
+            return f"{app_section}.{key}"
+    return f"{app_section}.button_watcher_config"
+
+
+def _write_result(replay_result: ReplayResult, output: IO[str]) -> None:
+    for gesture in replay_result.gestures:
+        output.write(json.dumps(gesture.as_dict()) + "\n")
+    output.write(json.dumps({"stats": replay_result.stats()}) + "\n")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    argument_parser = argparse.ArgumentParser(
+        prog="pico-to-mqtt-replay",
+        description=(
+            "replays the raw button events of a journal through the button "
+            "tracker on a virtual clock"
+        ),
+    )
+    argument_parser.add_argument("journal_directory", type=Path)
+    argument_parser.add_argument(
+        "--settings",
+        type=Path,
+        help="a settings file to take the button watcher config from",
+    )
+    arguments = argument_parser.parse_args(argv)
+
+    replay_result = replay(
+        read_journal(arguments.journal_directory),
+        _load_button_watcher_config(arguments.settings),
+    )
+    _write_result(replay_result, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from pico_to_mqtt.config import SinksConfig
+from pico_to_mqtt.sinks.base import EventSink, QueuedSink, encode_event, event_record
+from pico_to_mqtt.sinks.ndjson import NdjsonSink
+from pico_to_mqtt.sinks.unix_socket import UnixSocketSink
+from pico_to_mqtt.sinks.webhook import WebhookDeliveryError, WebhookSink
+
+__all__ = [
+    "EventSink",
+    "NdjsonSink",
+    "QueuedSink",
+    "UnixSocketSink",
+    "WebhookDeliveryError",
+    "WebhookSink",
+    "encode_event",
+    "event_record",
+    "queued_sinks",
+]
+
+
+def queued_sinks(sinks_config: SinksConfig) -> list[QueuedSink]:
+    """the built-in sinks enabled in the config, each behind its own queue"""
+    sinks: list[EventSink] = []
+    if sinks_config.unix_socket.enabled:
+        sinks.append(UnixSocketSink(sinks_config.unix_socket))
+    if sinks_config.ndjson.enabled:
+        sinks.append(NdjsonSink(sinks_config.ndjson))
+    if sinks_config.webhook.enabled:
+        sinks.append(WebhookSink(sinks_config.webhook))
+    return [QueuedSink(sink, sinks_config.queue_size) for sink in sinks]
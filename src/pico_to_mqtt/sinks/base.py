@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Mapping, Protocol
+
+from pico_to_mqtt.caseta.model import CasetaEvent
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EventSink(Protocol):
+    """a destination for caseta events besides the mqtt broker"""
+
+    name: str
+
+    async def open(self) -> None:
+        ...
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        """`timestamp` is the unix time the event was handled at"""
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+def event_record(event: CasetaEvent, timestamp: float) -> Mapping[str, Any]:
+    record: dict[str, Any] = {
+        "timestamp": timestamp,
+        "area": event.remote.area_name,
+        "remote": event.remote.name,
+        "button_id": event.button_id.name,
+        "action": event.button_event.name,
+        "remote_type": event.remote.type,
+    }
+    if event.hold_duration_sec is not None:
+        record["hold_duration_ms"] = round(event.hold_duration_sec * 1000)
+    if event.gesture_id is not None:
+        record["gesture_id"] = event.gesture_id
+    return record
+
+
+def encode_event(event: CasetaEvent, timestamp: float) -> bytes:
+    """an event as one line of JSON"""
+    return (
+        json.dumps(event_record(event, timestamp), separators=(",", ":")) + "\n"
+    ).encode()
+
+
+class QueuedSink:
+    """
+    feeds a sink from its own bounded queue, so a slow sink never holds up the
+    others or the broker. once the queue is full the oldest event is dropped.
+    a failed delivery is logged and counted; the next event is tried regardless.
+    a sink that fails to open is marked failed, and its events are dropped from
+    then on, so draining never waits for it.
+    """
+
+    def __init__(self, sink: EventSink, queue_size: int) -> None:
+        self.sink = sink
+        self._queue: asyncio.Queue[tuple[CasetaEvent, float]] = asyncio.Queue(
+            queue_size
+        )
+        self.delivered: int = 0
+        self.failed: int = 0
+        self.dropped: int = 0
+        self.failed_to_open: bool = False
+
+    def submit(self, event: CasetaEvent) -> None:
+        if self.failed_to_open:
+            self.dropped += 1
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self.dropped += 1
+        self._queue.put_nowait((event, time.time()))
+
+    async def run(self) -> None:
+        """opens the sink and delivers queued events until cancelled"""
+        try:
+            await self.sink.open()
+        except Exception as e:
+            LOGGER.error(
+                "sink %s could not be opened and won't get events. exception: %s",
+                self.sink.name,
+                e,
+            )
+            self.failed_to_open = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            return
+        try:
+            while True:
+                event, timestamp = await self._queue.get()
+                try:
+                    await self.sink.deliver(event, timestamp)
+                    self.delivered += 1
+                except Exception as e:
+                    self.failed += 1
+                    LOGGER.error(
+                        "sink %s could not deliver an event. event: %s, exception: %s",
+                        self.sink.name,
+                        event,
+                        e,
+                    )
+                finally:
+                    self._queue.task_done()
+        finally:
+            await self.sink.close()
+
+    async def drain(self) -> None:
+        """returns once every event submitted so far was delivered or dropped"""
+        await self._queue.join()
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "failed_to_open": self.failed_to_open,
+        }
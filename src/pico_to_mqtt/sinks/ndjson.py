@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from pico_to_mqtt.caseta.model import CasetaEvent
+from pico_to_mqtt.config import NdjsonSinkConfig
+from pico_to_mqtt.sinks.base import encode_event
+
+
+class NdjsonSink:
+    """
+    appends each event as a line of JSON to a file, or writes it to stdout. a
+    slow disk or a stalled stdout pipe could block, so opening, writing and
+    flushing run on a worker thread.
+    """
+
+    name = "ndjson"
+
+    def __init__(self, ndjson_sink_config: NdjsonSinkConfig) -> None:
+        self._path = ndjson_sink_config.path
+        self._output: Optional[BinaryIO] = None
+
+    async def open(self) -> None:
+        self._output = (
+            await asyncio.to_thread(_open_for_append, self._path)
+            if self._path is not None
+            else sys.stdout.buffer
+        )
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        assert self._output is not None
+        await asyncio.to_thread(
+            _write_line, self._output, encode_event(event, timestamp)
+        )
+
+    async def close(self) -> None:
+        if self._output is not None and self._path is not None:
+            await asyncio.to_thread(self._output.close)
+        self._output = None
+
+
+def _open_for_append(path: Path) -> BinaryIO:
+    return open(path, "ab")
+
+
+def _write_line(output: BinaryIO, line: bytes) -> None:
+    output.write(line)
+    output.flush()
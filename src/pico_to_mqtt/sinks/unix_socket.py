@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import stat
+from typing import Optional
+
+from pico_to_mqtt.caseta.model import CasetaEvent
+from pico_to_mqtt.config import UnixSocketSinkConfig
+from pico_to_mqtt.sinks.base import encode_event
+
+LOGGER = logging.getLogger(__name__)
+
+
+class UnixSocketSink:
+    """
+    listens on a unix domain socket and streams every event, as a line of JSON, to
+    each consumer connected at the time. writes are never awaited: a consumer whose
+    unsent backlog outgrows `max_client_buffer_bytes` is disconnected instead of
+    slowing down the others.
+    """
+
+    name = "unix_socket"
+
+    def __init__(self, unix_socket_sink_config: UnixSocketSinkConfig) -> None:
+        self._path = unix_socket_sink_config.path
+        self._max_client_buffer_bytes = unix_socket_sink_config.max_client_buffer_bytes
+        self._server: Optional[asyncio.Server] = None
+        self._clients: set[asyncio.StreamWriter] = set()
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    async def open(self) -> None:
+        self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(
+            self._on_client_connected, self._path
+        )
+        LOGGER.info("streaming events on %s", self._path)
+
+    def _remove_stale_socket(self) -> None:
+        """a socket file left behind by an unclean exit would fail the bind"""
+        try:
+            if stat.S_ISSOCK(os.stat(self._path).st_mode):
+                os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    async def _on_client_connected(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._clients.add(writer)
+        LOGGER.debug("a consumer connected to %s", self._path)
+        try:
+            # consumers only listen. anything they send is read and ignored, until
+            # they hang up
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self._disconnect(writer)
+
+    def _disconnect(self, writer: asyncio.StreamWriter) -> None:
+        if writer in self._clients:
+            self._clients.discard(writer)
+            writer.close()
+            LOGGER.debug("a consumer disconnected from %s", self._path)
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        if not self._clients:
+            return
+        line = encode_event(event, timestamp)
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > self._max_client_buffer_bytes:
+                LOGGER.warning(
+                    "disconnecting a consumer of %s that fell behind", self._path
+                )
+                self._disconnect(writer)
+                continue
+            writer.write(line)
+
+    async def close(self) -> None:
+        for writer in list(self._clients):
+            self._disconnect(writer)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self._remove_stale_socket()
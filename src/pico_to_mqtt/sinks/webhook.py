@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import logging
+import types
+import urllib.parse
+from typing import Any, Mapping, Optional
+
+import aiohttp
+
+from pico_to_mqtt.caseta.model import CasetaEvent
+from pico_to_mqtt.config import WebhookSinkConfig
+from pico_to_mqtt.sinks.base import event_record
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WebhookDeliveryError(Exception):
+    pass
+
+
+class WebhookSink:
+    """
+    POSTs every event as a JSON object to a url with an aiohttp session, whose
+    keep-alive connections are reused between deliveries. a response status of
+    300 or above counts as a failed delivery.
+    """
+
+    name = "webhook"
+
+    def __init__(self, webhook_sink_config: WebhookSinkConfig) -> None:
+        url = urllib.parse.urlsplit(webhook_sink_config.url)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ValueError(f"not an http(s) webhook url: {webhook_sink_config.url}")
+        self._webhook_sink_config = webhook_sink_config
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.connections_opened: int = 0
+
+    async def open(self) -> None:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        self._session = aiohttp.ClientSession(
+            # deliveries go one at a time, so this is how many stay open idle
+            connector=aiohttp.TCPConnector(
+                limit=self._webhook_sink_config.max_idle_connections
+            ),
+            timeout=aiohttp.ClientTimeout(total=self._webhook_sink_config.timeout_sec),
+            trace_configs=[trace_config],
+        )
+
+    async def _on_connection_created(
+        self,
+        _session: aiohttp.ClientSession,
+        _trace_config_ctx: types.SimpleNamespace,
+        _params: aiohttp.TraceConnectionCreateEndParams,
+    ) -> None:
+        self.connections_opened += 1
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        assert self._session is not None
+        record = event_record(event, timestamp)
+        try:
+            status = await self._post(self._session, record)
+        except aiohttp.ServerDisconnectedError:
+            # the server closed a kept-alive connection. one retry on a new one
+            status = await self._post(self._session, record)
+        if status >= 300:
+            raise WebhookDeliveryError(f"the webhook responded with status {status}")
+
+    async def _post(
+        self, session: aiohttp.ClientSession, record: Mapping[str, Any]
+    ) -> int:
+        async with session.post(self._webhook_sink_config.url, json=record) as response:
+            # reading the body hands the connection back for reuse
+            await response.read()
+            return response.status
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
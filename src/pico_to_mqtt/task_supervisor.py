@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Coroutine, Mapping, Optional
+
+from pico_to_mqtt.config import SheddingPolicy
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SupervisedTaskGroup:
+    """
+    keeps a reference to every task it starts, caps how many run at once and
+    counts what it had to shed. a task that fails is reported to the loop's
+    exception handler, same as an unobserved task failure would be.
+    """
+
+    def __init__(
+        self, name: str, max_tasks: int, shedding_policy: SheddingPolicy
+    ) -> None:
+        self.name = name
+        self._max_tasks = max_tasks
+        self._shedding_policy = shedding_policy
+        # a dict rather than a set, so the oldest task is the first key
+        self._tasks: dict[asyncio.Task[Any], None] = {}
+        self._closed = False
+        self.started: int = 0
+        self.failed: int = 0
+        self.rejected: int = 0
+        self.cancelled_for_room: int = 0
+        self.peak: int = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any]) -> Optional[asyncio.Task[Any]]:
+        """starts the coroutine as a task, or closes it and returns None if shed"""
+        if self._closed or not self._make_room():
+            coroutine.close()
+            self.rejected += 1
+            # a power of two, so a storm is visible without flooding the log
+            if self.rejected & (self.rejected - 1) == 0:
+                LOGGER.warning(
+                    "%s: rejected %d tasks so far. in flight: %d, closed: %s",
+                    self.name,
+                    self.rejected,
+                    len(self._tasks),
+                    self._closed,
+                )
+            return None
+        task = asyncio.create_task(coroutine)
+        self._tasks[task] = None
+        task.add_done_callback(self._on_task_done)
+        self.started += 1
+        self.peak = max(self.peak, len(self._tasks))
+        return task
+
+    def _make_room(self) -> bool:
+        if len(self._tasks) < self._max_tasks:
+            return True
+        if self._shedding_policy == SheddingPolicy.REJECT_NEW:
+            return False
+        oldest_task = next(iter(self._tasks))
+        # the done callback would only run on the next loop iteration
+        del self._tasks[oldest_task]
+        oldest_task.cancel()
+        self.cancelled_for_room += 1
+        return True
+
+    def _on_task_done(self, task: asyncio.Task[Any]) -> None:
+        self._tasks.pop(task, None)
+        if task.cancelled():
+            return
+        exception = task.exception()
+        if exception is not None:
+            self.failed += 1
+            task.get_loop().call_exception_handler(
+                {
+                    "message": f"{self.name}: a supervised task failed",
+                    "exception": exception,
+                    "task": task,
+                }
+            )
+
+    def close(self) -> None:
+        """rejects every task spawned from now on"""
+        self._closed = True
+
+    async def wait(self, timeout_sec: Optional[float] = None) -> bool:
+        """waits for the running tasks. returns False if some were still running"""
+        if not self._tasks:
+            return True
+        _done, pending = await asyncio.wait(list(self._tasks), timeout=timeout_sec)
+        return not pending
+
+    async def cancel_all(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics_snapshot(self) -> Mapping[str, Any]:
+        return {
+            "in_flight": len(self._tasks),
+            "peak": self.peak,
+            "started": self.started,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "cancelled_for_room": self.cancelled_for_room,
+        }
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+import selectors
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+_T = TypeVar("_T")
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    """
+    instead of blocking until the next timer is due, advances virtual time to it.
+    with no timer scheduled it blocks for real, since only I/O can wake it then.
+    """
+
+    def __init__(self, advance: Callable[[float], None]) -> None:
+        super().__init__()
+        self._advance = advance
+
+    def select(
+        self, timeout: Optional[float] = None
+    ) -> list[tuple[selectors.SelectorKey, int]]:
+        if timeout is None:
+            return super().select(None)
+        ready = super().select(0)
+        if not ready and timeout > 0:
+            self._advance(timeout)
+        return ready
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    an event loop whose clock only moves when every task is waiting on a timer, and
+    then jumps straight to the earliest one. sleeps, timeouts and LoopClock all
+    follow it, so hours of button traffic run as fast as the callbacks do.
+
+    work handed to other threads (e.g. `asyncio.to_thread`) does not hold virtual
+    time back, so timers can fire before such work finishes.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._virtual_now = start
+        super().__init__(_VirtualTimeSelector(self._advance))
+
+    def time(self) -> float:
+        return self._virtual_now
+
+    def _advance(self, seconds: float) -> None:
+        self._virtual_now += seconds
+
+
+def run_in_virtual_time(main: Coroutine[Any, Any, _T], start: float = 0.0) -> _T:
+    """like `asyncio.run`, but on a fresh VirtualTimeEventLoop"""
+    loop = VirtualTimeEventLoop(start)
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        loop.close()
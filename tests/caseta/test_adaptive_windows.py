@@ -0,0 +1,162 @@
+from pathlib import Path
+
+import pytest
+from pico_to_mqtt.caseta.adaptive_windows import (
+    AdaptiveDoubleClickWindows,
+    GapHistogram,
+)
+from pico_to_mqtt.caseta.model import ButtonAction, ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.config import AdaptiveDoubleClickConfig
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some_test_remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+@pytest.fixture
+def example_adaptive_double_click_config() -> AdaptiveDoubleClickConfig:
+    return AdaptiveDoubleClickConfig(enabled=True, min_samples=4)
+
+
+def _press_twice(
+    adaptive_double_click_windows: AdaptiveDoubleClickWindows,
+    remote: PicoRemote,
+    gap_sec: float,
+    times: int,
+) -> None:
+    now = 0.0
+    for _ in range(times):
+        adaptive_double_click_windows.observe(
+            remote, ButtonId.POWER_ON, ButtonAction.RELEASE, now
+        )
+        now += gap_sec
+        adaptive_double_click_windows.observe(
+            remote, ButtonId.POWER_ON, ButtonAction.PRESS, now
+        )
+        now += 10
+
+
+def test_gap_histogram_halves_its_counts_past_max_samples():
+    gap_histogram = GapHistogram(bucket_width_ms=25, max_window_ms=100, max_samples=4)
+    for _ in range(4):
+        gap_histogram.record(0.01)
+    gap_histogram.record(5.0)
+
+    assert gap_histogram.buckets == [2, 0, 0, 0]
+    assert gap_histogram.overflow == 0
+    assert gap_histogram.percentile_upper_bound_ms(95) == 25
+
+
+def test_the_configured_window_is_kept_until_enough_gaps_were_seen(
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 0.1, 3)
+
+    assert (
+        adaptive_double_click_windows.double_click_window_sec(
+            example_pico_remote, ButtonId.POWER_ON, 0.3
+        )
+        == 0.3
+    )
+
+
+def test_the_window_shrinks_for_a_button_that_is_never_double_pressed(
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 30.0, 4)
+
+    assert adaptive_double_click_windows.double_click_window_sec(
+        example_pico_remote, ButtonId.POWER_ON, 0.3
+    ) == pytest.approx(0.15)
+
+
+def test_the_window_grows_to_cover_slow_double_presses(
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 0.51, 4)
+
+    # the 500-525 ms bucket, plus the margin
+    assert adaptive_double_click_windows.double_click_window_sec(
+        example_pico_remote, ButtonId.POWER_ON, 0.3
+    ) == pytest.approx(0.575)
+    assert (
+        adaptive_double_click_windows.double_click_window_sec(
+            example_pico_remote, ButtonId.POWER_OFF, 0.3
+        )
+        == 0.3
+    )
+
+
+def test_rare_quick_re_presses_do_not_grow_the_window(
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 3600.0, 99)
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 0.9, 1)
+
+    assert adaptive_double_click_windows.double_click_window_sec(
+        example_pico_remote, ButtonId.POWER_ON, 0.3
+    ) == pytest.approx(0.15)
+
+
+def test_learned_windows_survive_a_save_and_load(
+    tmp_path: Path,
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    state_file = tmp_path / "double-click-windows.json"
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+    _press_twice(adaptive_double_click_windows, example_pico_remote, 0.51, 4)
+    adaptive_double_click_windows.save(state_file)
+
+    restored_windows = AdaptiveDoubleClickWindows(example_adaptive_double_click_config)
+    restored_windows.load(state_file)
+
+    assert restored_windows.double_click_window_sec(
+        example_pico_remote, ButtonId.POWER_ON, 0.3
+    ) == pytest.approx(0.575)
+
+
+def test_an_unreadable_state_file_is_ignored(
+    tmp_path: Path,
+    example_pico_remote: PicoRemote,
+    example_adaptive_double_click_config: AdaptiveDoubleClickConfig,
+):
+    state_file = tmp_path / "double-click-windows.json"
+    state_file.write_text("{not json")
+    adaptive_double_click_windows = AdaptiveDoubleClickWindows(
+        example_adaptive_double_click_config
+    )
+
+    adaptive_double_click_windows.load(state_file)
+
+    assert (
+        adaptive_double_click_windows.double_click_window_sec(
+            example_pico_remote, ButtonId.POWER_ON, 0.3
+        )
+        == 0.3
+    )
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import datetime
+import os
+import ssl
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from pico_to_mqtt.caseta.bridge_connector import BridgeConnector
+from pico_to_mqtt.config import CasetaConfig
+
+
+def issue_certificate(
+    tmp_path: Path,
+    name: str,
+    issuer: tuple[x509.Certificate, ec.EllipticCurvePrivateKey] | None = None,
+) -> tuple[x509.Certificate, ec.EllipticCurvePrivateKey]:
+    """writes `<name>.crt` and `<name>.key`. self-signed as a ca without an issuer"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+    issuer_certificate, issuer_key = issuer if issuer is not None else (None, key)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(
+            issuer_certificate.subject if issuer_certificate is not None else subject
+        )
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=issuer is None, path_length=None), True)
+        .sign(issuer_key, hashes.SHA256())
+    )
+    (tmp_path / f"{name}.crt").write_bytes(
+        certificate.public_bytes(serialization.Encoding.PEM)
+    )
+    (tmp_path / f"{name}.key").write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return certificate, key
+
+
+@pytest.fixture
+def caseta_config(tmp_path: Path) -> CasetaConfig:
+    ca = issue_certificate(tmp_path, "ca")
+    issue_certificate(tmp_path, "bridge", ca)
+    issue_certificate(tmp_path, "client", ca)
+    return CasetaConfig(
+        "127.0.0.1",
+        tmp_path / "client.crt",
+        tmp_path / "client.key",
+        tmp_path / "ca.crt",
+    )
+
+
+@contextlib.asynccontextmanager
+async def serving_bridge(tmp_path: Path) -> AsyncIterator[int]:
+    """a tls server that hangs up right after the handshake. yields its port"""
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(tmp_path / "bridge.crt", tmp_path / "bridge.key")
+    server_context.load_verify_locations(tmp_path / "ca.crt")
+    server_context.verify_mode = ssl.CERT_REQUIRED
+
+    async def hang_up(
+        _reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        writer.close()
+
+    server = await asyncio.start_server(hang_up, "127.0.0.1", 0, ssl=server_context)
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def connect_until_hung_up(bridge_connector: BridgeConnector) -> None:
+    leap = await bridge_connector.connect()
+    # the session tickets arrive before the hang up
+    await leap.run()
+    leap.close()
+
+
+@pytest.mark.asyncio
+async def test_reconnects_resume_the_tls_session(
+    tmp_path: Path, caseta_config: CasetaConfig
+):
+    async with serving_bridge(tmp_path) as port:
+        bridge_connector = BridgeConnector(caseta_config, port)
+        for _ in range(3):
+            await connect_until_hung_up(bridge_connector)
+
+    assert bridge_connector.full_handshakes == 1
+    assert bridge_connector.resumed_handshakes == 2
+    assert bridge_connector.handshake_latency.count == 3
+
+
+@pytest.mark.asyncio
+async def test_changed_tls_files_rebuild_the_ssl_context(
+    tmp_path: Path, caseta_config: CasetaConfig
+):
+    async with serving_bridge(tmp_path) as port:
+        bridge_connector = BridgeConnector(caseta_config, port)
+        await connect_until_hung_up(bridge_connector)
+        await connect_until_hung_up(bridge_connector)
+        later = os.stat(caseta_config.path_to_caseta_client_cert).st_mtime_ns + 10**9
+        os.utime(caseta_config.path_to_caseta_client_cert, ns=(later, later))
+        await connect_until_hung_up(bridge_connector)
+
+    # a new context can't resume the old context's session
+    assert bridge_connector.full_handshakes == 2
+    assert bridge_connector.resumed_handshakes == 1
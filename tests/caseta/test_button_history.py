@@ -1,7 +1,4 @@
-import datetime
-from datetime import timedelta
-from typing import Callable
-from unittest.mock import Mock
+import math
 
 import pytest
 from pico_to_mqtt.caseta.button_watcher import ButtonHistory
@@ -10,11 +7,12 @@ from pico_to_mqtt.caseta.model import (
     ButtonState,
     IllegalStateTransitionError,
 )
+from pico_to_mqtt.clock import FakeClock
 
 
 @pytest.mark.asyncio
 async def test_increment_button_history_increments_through_all_button_states():
-    button_history = ButtonHistory(timedelta.max, datetime.datetime.now)
+    button_history = ButtonHistory(math.inf, FakeClock())
     async with button_history.mutex_locked_button_state.mutex:
         assert button_history.mutex_locked_button_state.state == ButtonState.NOT_PRESSED
     await button_history.increment(ButtonAction.PRESS)
@@ -48,28 +46,32 @@ async def test_increment_button_history_increments_through_all_button_states():
 
 @pytest.mark.asyncio
 async def test_button_history_increment_raises_exception_for_invalid_increments():
-    button_history = ButtonHistory(timedelta.max, datetime.datetime.now)
+    button_history = ButtonHistory(math.inf, FakeClock())
     async with button_history.mutex_locked_button_state.mutex:
         assert button_history.mutex_locked_button_state.state == ButtonState.NOT_PRESSED
     with pytest.raises(IllegalStateTransitionError):
         await button_history.increment(ButtonAction.RELEASE)
 
 
-@pytest.fixture
-def january_first_midnight() -> datetime.datetime:
-    return datetime.datetime.fromisoformat("2023-01-01T00:00:00Z")
+@pytest.mark.asyncio
+async def test_button_history_reports_timeout_when_timeout_exceeded():
+    timeout_sec = 1.0
+    longer_than_timeout_sec = timeout_sec * 2
 
+    clock = FakeClock(start=1000.0)
+    button_history = ButtonHistory(timeout_sec, clock)
+    await button_history.increment(ButtonAction.PRESS)
+    assert not button_history.is_timed_out(clock.now())
+    assert button_history.is_timed_out(clock.now() + longer_than_timeout_sec)
 
-@pytest.mark.asyncio
-async def test_button_history_reports_timeout_when_timeout_exceeded(
-    january_first_midnight: datetime.datetime
-):
-    timeout = timedelta(seconds=1)
-    longer_than_timeout = timeout * 2
 
-    now_provider: Callable[[], datetime.datetime] = Mock(
-        return_value=january_first_midnight
-    )
-    button_history = ButtonHistory(timeout, now_provider)
+@pytest.mark.asyncio
+async def test_button_history_reports_hold_duration_once_released():
+    clock = FakeClock()
+    button_history = ButtonHistory(math.inf, clock)
     await button_history.increment(ButtonAction.PRESS)
-    assert button_history.is_timed_out(january_first_midnight + longer_than_timeout)
+    clock.advance(1.5)
+    assert button_history.hold_duration_sec is None
+
+    await button_history.increment(ButtonAction.RELEASE)
+    assert button_history.hold_duration_sec == 1.5
@@ -0,0 +1,118 @@
+import pytest
+import attrs
+from pico_to_mqtt.caseta.button_timings import ButtonTimings, ButtonTimingTable
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.config import (
+    ButtonWatcherConfig,
+    GestureProfile,
+    GestureProfiles,
+    LongPressRepeatPolicy,
+)
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_THREE_BUTTON_RAISE_LOWER,
+        "entryway",
+        "kitchen",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF, 3: ButtonId.INCREASE},
+    )
+
+
+@pytest.fixture
+def other_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        100,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "bedside",
+        "bedroom",
+        {4: ButtonId.POWER_ON, 5: ButtonId.POWER_OFF},
+    )
+
+
+@pytest.fixture
+def example_button_watcher_config() -> ButtonWatcherConfig:
+    return ButtonWatcherConfig(
+        gesture_profiles=GestureProfiles(
+            by_area={
+                "kitchen": GestureProfile(
+                    double_click_enabled=False, double_click_window_ms=400
+                )
+            },
+            by_remote={"kitchen/entryway": GestureProfile(double_click_window_ms=200)},
+            by_button={
+                "kitchen/entryway/increase": GestureProfile(
+                    double_click_enabled=True,
+                    long_press_repeat_policy=LongPressRepeatPolicy.ACCELERATING,
+                )
+            },
+        )
+    )
+
+
+def test_more_specific_gesture_profiles_win(
+    example_button_watcher_config: ButtonWatcherConfig,
+    example_pico_remote: PicoRemote,
+):
+    button_timing_table = ButtonTimingTable(
+        example_button_watcher_config, [example_pico_remote]
+    )
+
+    power_on_timings = button_timing_table.get(example_pico_remote, ButtonId.POWER_ON)
+    assert not power_on_timings.double_click_enabled
+    assert power_on_timings.double_click_window_sec == 0.2
+    assert power_on_timings.long_press_repeat_policy == LongPressRepeatPolicy.FIXED_RATE
+
+    increase_timings = button_timing_table.get(example_pico_remote, ButtonId.INCREASE)
+    assert increase_timings.double_click_enabled
+    assert increase_timings.double_click_window_sec == 0.2
+    assert (
+        increase_timings.long_press_repeat_policy == LongPressRepeatPolicy.ACCELERATING
+    )
+
+
+def test_buttons_without_a_matching_profile_use_the_global_config(
+    example_button_watcher_config: ButtonWatcherConfig,
+    example_pico_remote: PicoRemote,
+    other_pico_remote: PicoRemote,
+):
+    button_timing_table = ButtonTimingTable(
+        example_button_watcher_config, [example_pico_remote, other_pico_remote]
+    )
+
+    power_on_timings = button_timing_table.get(other_pico_remote, ButtonId.POWER_ON)
+    assert power_on_timings.double_click_enabled
+    assert power_on_timings.double_click_window_sec == 0.3
+
+
+def test_remotes_missing_from_the_table_fall_back_to_the_global_config(
+    example_button_watcher_config: ButtonWatcherConfig,
+    example_pico_remote: PicoRemote,
+):
+    button_timing_table = ButtonTimingTable(example_button_watcher_config)
+
+    increase_timings = button_timing_table.get(example_pico_remote, ButtonId.INCREASE)
+    assert increase_timings.double_click_enabled
+    assert increase_timings.double_click_window_sec == 0.75
+
+
+@pytest.mark.parametrize(
+    ("config_field", "timings_field"),
+    [
+        ("sleep_duration_ms", "sleep_duration_sec"),
+        ("min_repeat_interval_ms", "min_repeat_interval_sec"),
+    ],
+)
+def test_long_press_checkpoint_intervals_must_be_positive(
+    config_field: str, timings_field: str
+):
+    # a zero interval would never move the next checkpoint forward
+    with pytest.raises(ValueError):
+        attrs.evolve(ButtonWatcherConfig(), **{config_field: 0})
+    with pytest.raises(ValueError):
+        attrs.evolve(
+            ButtonTimings.of_config(ButtonWatcherConfig(), ButtonId.POWER_ON),
+            **{timings_field: 0.0},
+        )
@@ -1,18 +1,30 @@
 import asyncio
-import datetime
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from pico_to_mqtt.caseta.button_watcher import ButtonTracker
-from pico_to_mqtt.caseta.model import ButtonAction, ButtonId, PicoRemote, PicoRemoteType
-from pico_to_mqtt.config import ButtonWatcherConfig
-from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.caseta.model import (
+    ButtonAction,
+    ButtonEvent,
+    ButtonId,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.clock import FakeClock, LoopClock
+from pico_to_mqtt.config import (
+    ButtonWatcherConfig,
+    SheddingPolicy,
+    TaskSupervisionConfig,
+)
+from pico_to_mqtt.event_handler import CasetaEvent, EventHandler
 from pytest_mock import MockerFixture
 
+pytestmark = pytest.mark.virtual_time
+
 
 @pytest.fixture
-def january_first_midnight() -> datetime.datetime:
-    return datetime.datetime.fromisoformat("2023-01-01T00:00:00Z")
+def fake_clock() -> FakeClock:
+    return FakeClock()
 
 
 @pytest.fixture
@@ -65,14 +77,14 @@ async def test_button_tracker_tracks_a_new_button_press_event(
     example_button_id: ButtonId,
     mock_event_handler: EventHandler,
     example_button_watcher_config: ButtonWatcherConfig,
-    january_first_midnight: datetime.datetime,
+    fake_clock: FakeClock,
     mock_asyncio_create_task: Mock,
 ):
     button_tracker = ButtonTracker(
         mock_shutdown_condition,
         mock_event_handler,
         example_button_watcher_config,
-        lambda: january_first_midnight,
+        fake_clock,
     )
 
     await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
@@ -89,14 +101,14 @@ async def test_button_tracker_does_not_track_an_initial_release_event(
     example_button_id: ButtonId,
     mock_event_handler: EventHandler,
     example_button_watcher_config: ButtonWatcherConfig,
-    january_first_midnight: datetime.datetime,
+    fake_clock: FakeClock,
     mock_asyncio_create_task: Mock,
 ):
     button_tracker = ButtonTracker(
         mock_shutdown_condition,
         mock_event_handler,
         example_button_watcher_config,
-        lambda: january_first_midnight,
+        fake_clock,
     )
 
     await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
@@ -113,14 +125,14 @@ async def test_button_tracker_increments_an_existing_button_watcher(
     example_button_id: ButtonId,
     mock_event_handler: EventHandler,
     example_button_watcher_config: ButtonWatcherConfig,
-    january_first_midnight: datetime.datetime,
+    fake_clock: FakeClock,
     mock_asyncio_create_task: Mock,
 ):
     button_tracker = ButtonTracker(
         mock_shutdown_condition,
         mock_event_handler,
         example_button_watcher_config,
-        lambda: january_first_midnight,
+        fake_clock,
     )
 
     await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
@@ -133,3 +145,180 @@ async def test_button_tracker_increments_an_existing_button_watcher(
         example_pico_remote, example_button_id, ButtonAction.RELEASE
     )
     mock_asyncio_create_task.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_button_tracker_config_update_only_affects_new_button_watchers(
+    mock_shutdown_condition: asyncio.Condition,
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    mock_event_handler: EventHandler,
+    example_button_watcher_config: ButtonWatcherConfig,
+    fake_clock: FakeClock,
+    mock_asyncio_create_task: Mock,
+):
+    button_tracker = ButtonTracker(
+        mock_shutdown_condition,
+        mock_event_handler,
+        example_button_watcher_config,
+        fake_clock,
+    )
+    mutex_locked_button_watchers = button_tracker._mutex_locked_button_watchers  # pyright: ignore[reportPrivateUsage]
+    button_watchers_by_remote_id = (
+        mutex_locked_button_watchers.button_watchers_by_remote_id
+    )
+
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.PRESS
+    )
+    in_flight_button_watcher = button_watchers_by_remote_id[
+        example_pico_remote.device_id
+    ]
+    button_tracker.update_button_watcher_config(
+        ButtonWatcherConfig(max_duration_ms=1000)
+    )
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.RELEASE
+    )
+    assert (
+        button_watchers_by_remote_id[example_pico_remote.device_id]
+        is in_flight_button_watcher
+    )
+    assert in_flight_button_watcher._button_timings.max_duration_sec == 5.0  # pyright: ignore[reportPrivateUsage]
+
+    in_flight_button_watcher.button_history.is_finished = True
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.PRESS
+    )
+    new_button_watcher = button_watchers_by_remote_id[example_pico_remote.device_id]
+    assert new_button_watcher._button_timings.max_duration_sec == 1.0  # pyright: ignore[reportPrivateUsage]
+
+
+@pytest.mark.asyncio
+async def test_button_tracker_drain_finishes_watched_gestures_but_not_new_ones(
+    mock_shutdown_condition: asyncio.Condition,
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    mock_event_handler: EventHandler,
+    fake_clock: FakeClock,
+):
+    mock_event_handler.handle_event = AsyncMock()
+    button_tracker = ButtonTracker(
+        mock_shutdown_condition,
+        mock_event_handler,
+        ButtonWatcherConfig(),
+        LoopClock(),
+    )
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.PRESS
+    )
+
+    drain_task = asyncio.create_task(button_tracker.drain())
+    await asyncio.sleep(0)
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.RELEASE
+    )
+    async with asyncio.timeout(1):
+        await drain_task
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, ButtonId.POWER_OFF, ButtonAction.PRESS
+    )
+
+    mock_event_handler.handle_event.assert_awaited_once()
+    assert button_tracker.metrics_snapshot()["button_watchers"]["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_button_tracker_handles_holds_on_thousands_of_remotes(
+    mock_shutdown_condition: asyncio.Condition,
+    mock_event_handler: EventHandler,
+):
+    remote_count = 2000
+    mock_event_handler.handle_event = AsyncMock()
+    button_tracker = ButtonTracker(
+        mock_shutdown_condition,
+        mock_event_handler,
+        ButtonWatcherConfig(),
+        LoopClock(),
+        TaskSupervisionConfig(
+            max_pending_button_events=remote_count, max_button_watchers=remote_count
+        ),
+    )
+    pico_remotes = [
+        PicoRemote(
+            remote_id,
+            PicoRemoteType.PICO_TWO_BUTTON,
+            f"remote-{remote_id}",
+            "fancyroom",
+            {1: ButtonId.POWER_ON},
+        )
+        for remote_id in range(remote_count)
+    ]
+
+    for pico_remote in pico_remotes:
+        button_tracker.button_event_callback(pico_remote, ButtonId.POWER_ON)("Press")
+    # held past the initial checkpoint at 0.3 s and one follow-up at 0.55 s
+    await asyncio.sleep(0.6)
+    for pico_remote in pico_remotes:
+        button_tracker.button_event_callback(pico_remote, ButtonId.POWER_ON)(
+            "Release"
+        )
+    await button_tracker.drain()
+
+    handled_events = [
+        call.args[0].button_event
+        for call in mock_event_handler.handle_event.await_args_list
+    ]
+    assert handled_events.count(ButtonEvent.LONG_PRESS_ONGOING) == 2 * remote_count
+    assert handled_events.count(ButtonEvent.LONG_PRESS_COMPLETED) == remote_count
+
+
+@pytest.mark.asyncio
+async def test_button_tracker_watches_again_after_a_watcher_is_cancelled_for_room(
+    mock_shutdown_condition: asyncio.Condition,
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    mock_event_handler: EventHandler,
+):
+    mock_event_handler.handle_event = AsyncMock()
+    button_tracker = ButtonTracker(
+        mock_shutdown_condition,
+        mock_event_handler,
+        ButtonWatcherConfig(),
+        LoopClock(),
+        TaskSupervisionConfig(
+            max_button_watchers=1, shedding_policy=SheddingPolicy.CANCEL_OLDEST
+        ),
+    )
+    other_pico_remote = PicoRemote(
+        100,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "other_test_remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON},
+    )
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        example_pico_remote, example_button_id, ButtonAction.PRESS
+    )
+    # takes the only slot, so the first remote's watcher is cancelled
+    await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+        other_pico_remote, ButtonId.POWER_ON, ButtonAction.PRESS
+    )
+    assert button_tracker.metrics_snapshot()["button_watchers"]["cancelled_for_room"]
+    await asyncio.sleep(0.01)
+
+    for button_action in [
+        ButtonAction.RELEASE,
+        ButtonAction.PRESS,
+        ButtonAction.RELEASE,
+    ]:
+        await button_tracker._process_button_event(  # pyright: ignore[reportPrivateUsage]
+            example_pico_remote, example_button_id, button_action
+        )
+    await asyncio.sleep(0.5)
+
+    mock_event_handler.handle_event.assert_awaited_once_with(
+        CasetaEvent(
+            example_pico_remote, example_button_id, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
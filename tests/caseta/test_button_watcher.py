@@ -1,23 +1,32 @@
 import asyncio
-import datetime
 from unittest.mock import AsyncMock, Mock
 
 import attr
 import pytest
-from pico_to_mqtt.caseta.button_watcher import ButtonWatcher
+from pico_to_mqtt.caseta.button_timings import ButtonTimings
+from pico_to_mqtt.caseta.button_watcher import ButtonWatcher, LongPressRepeatSchedule
 from pico_to_mqtt.caseta.model import (
     ButtonAction,
     ButtonId,
     PicoRemote,
     PicoRemoteType,
 )
-from pico_to_mqtt.config import ButtonWatcherConfig
+from pico_to_mqtt.clock import FakeClock, LoopClock
+from pico_to_mqtt.config import (
+    ButtonWatcherConfig,
+    GestureProfile,
+    GestureProfiles,
+    LongPressRepeatPolicies,
+    LongPressRepeatPolicy,
+)
 from pico_to_mqtt.event_handler import ButtonEvent, CasetaEvent, EventHandler
 
+pytestmark = pytest.mark.virtual_time
+
 
 @pytest.fixture
-def january_first_midnight() -> datetime.datetime:
-    return datetime.datetime.fromisoformat("2023-01-01T00:00:00Z")
+def fake_clock() -> FakeClock:
+    return FakeClock()
 
 
 @pytest.fixture
@@ -67,7 +76,7 @@ def example_event_handler(mock_handle_event_method: AsyncMock):
 
 @pytest.fixture
 def example_button_watcher(
-    january_first_midnight: datetime.datetime,
+    fake_clock: FakeClock,
     example_pico_remote: PicoRemote,
     example_button_watcher_config: ButtonWatcherConfig,
     example_button_id: ButtonId,
@@ -77,10 +86,10 @@ def example_button_watcher(
     return ButtonWatcher(
         example_pico_remote,
         example_button_id,
-        example_button_watcher_config,
+        ButtonTimings.of_config(example_button_watcher_config, example_button_id),
         example_event_handler,
         example_shutdown_condition,
-        lambda: january_first_midnight,
+        fake_clock,
     )
 
 
@@ -230,3 +239,295 @@ async def test_followup_checkpoint_sees_double_press_completed(
     )
 
     mock_handle_event_method.assert_awaited_with(expected_event)
+
+
+@pytest.fixture
+def start_and_duration_button_watcher(
+    fake_clock: FakeClock,
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+) -> ButtonWatcher:
+    button_watcher_config = ButtonWatcherConfig(
+        long_press_repeat_policies=LongPressRepeatPolicies(
+            power_on_repeat_policy=LongPressRepeatPolicy.START_AND_DURATION
+        )
+    )
+    return ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        ButtonTimings.of_config(button_watcher_config, example_button_id),
+        example_event_handler,
+        example_shutdown_condition,
+        fake_clock,
+    )
+
+
+@pytest.mark.asyncio
+async def test_followup_checkpoint_skips_long_press_ongoing_for_start_and_duration(
+    start_and_duration_button_watcher: ButtonWatcher,
+    mock_handle_event_method: AsyncMock,
+):
+    await start_and_duration_button_watcher.increment_history(ButtonAction.PRESS)
+    await start_and_duration_button_watcher._handle_followup_tracking_checkpoints()  # pyright: ignore[reportPrivateUsage]
+
+    mock_handle_event_method.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_followup_checkpoint_reports_hold_duration_for_start_and_duration(
+    start_and_duration_button_watcher: ButtonWatcher,
+    expected_caseta_event_scaffold: CasetaEvent,
+    mock_handle_event_method: AsyncMock,
+    fake_clock: FakeClock,
+):
+    await start_and_duration_button_watcher.increment_history(ButtonAction.PRESS)
+    fake_clock.advance(2)
+    await start_and_duration_button_watcher.increment_history(ButtonAction.RELEASE)
+    await start_and_duration_button_watcher._handle_followup_tracking_checkpoints()  # pyright: ignore[reportPrivateUsage]
+    expected_event = attr.evolve(
+        expected_caseta_event_scaffold,
+        button_event=ButtonEvent.LONG_PRESS_COMPLETED,
+        hold_duration_sec=2.0,
+    )
+
+    mock_handle_event_method.assert_awaited_with(expected_event)
+
+
+def test_accelerating_repeat_schedule_shrinks_down_to_the_min_interval():
+    button_watcher_config = ButtonWatcherConfig(
+        sleep_duration_ms=400,
+        accelerating_repeat_factor=0.5,
+        min_repeat_interval_ms=150,
+    )
+    repeat_schedule = LongPressRepeatSchedule(
+        ButtonTimings.of_config(
+            attr.evolve(
+                button_watcher_config,
+                long_press_repeat_policies=LongPressRepeatPolicies(
+                    increase_repeat_policy=LongPressRepeatPolicy.ACCELERATING
+                ),
+            ),
+            ButtonId.INCREASE,
+        )
+    )
+
+    assert [repeat_schedule.next_interval_sec() for _ in range(4)] == [
+        0.4,
+        0.2,
+        0.15,
+        0.15,
+    ]
+
+
+def test_fixed_rate_repeat_schedule_keeps_the_sleep_duration():
+    repeat_schedule = LongPressRepeatSchedule(
+        ButtonTimings.of_config(ButtonWatcherConfig(), ButtonId.INCREASE)
+    )
+
+    assert {repeat_schedule.next_interval_sec() for _ in range(4)} == {0.25}
+
+
+@pytest.mark.asyncio
+async def test_single_press_is_emitted_on_release_when_double_click_is_disabled(
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+    expected_caseta_event_scaffold: CasetaEvent,
+    mock_handle_event_method: AsyncMock,
+):
+    loop = asyncio.get_running_loop()
+    button_watcher_config = ButtonWatcherConfig(
+        gesture_profiles=GestureProfiles(
+            by_area={
+                example_pico_remote.area_name: GestureProfile(
+                    double_click_enabled=False, double_click_window_ms=60_000
+                )
+            }
+        )
+    )
+    button_watcher = ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        ButtonTimings.of_remote_button(
+            button_watcher_config, example_pico_remote, example_button_id
+        ),
+        example_event_handler,
+        example_shutdown_condition,
+        LoopClock(),
+    )
+    pressed_at = loop.time()
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    button_watcher_loop = asyncio.create_task(button_watcher.button_watcher_loop())
+
+    await asyncio.sleep(0.1)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await button_watcher_loop
+
+    mock_handle_event_method.assert_awaited_once_with(expected_caseta_event_scaffold)
+    assert loop.time() - pressed_at == pytest.approx(0.1)
+
+
+@pytest.mark.asyncio
+async def test_optimistic_single_press_is_followed_by_a_double_press_of_its_gesture(
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+    expected_caseta_event_scaffold: CasetaEvent,
+    mock_handle_event_method: AsyncMock,
+):
+    button_watcher_config = ButtonWatcherConfig(
+        gesture_profiles=GestureProfiles(
+            by_area={
+                example_pico_remote.area_name: GestureProfile(
+                    optimistic_single_press=True
+                )
+            }
+        )
+    )
+    button_watcher = ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        ButtonTimings.of_remote_button(
+            button_watcher_config, example_pico_remote, example_button_id
+        ),
+        example_event_handler,
+        example_shutdown_condition,
+        LoopClock(),
+    )
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    button_watcher_loop = asyncio.create_task(button_watcher.button_watcher_loop())
+
+    await asyncio.sleep(0.1)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await asyncio.sleep(0.05)
+    optimistic_single_press = attr.evolve(
+        expected_caseta_event_scaffold,
+        button_event=ButtonEvent.OPTIMISTIC_SINGLE_PRESS,
+        gesture_id=mock_handle_event_method.await_args_list[-1].args[0].gesture_id,
+    )
+    mock_handle_event_method.assert_awaited_once_with(optimistic_single_press)
+    assert optimistic_single_press.gesture_id is not None
+
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    await asyncio.sleep(0.05)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await button_watcher_loop
+
+    assert mock_handle_event_method.await_args_list[1].args[0] == attr.evolve(
+        optimistic_single_press, button_event=ButtonEvent.DOUBLE_PRESS_COMPLETED
+    )
+    assert mock_handle_event_method.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_optimistic_single_press_is_not_repeated_when_no_second_press_follows(
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+    mock_handle_event_method: AsyncMock,
+):
+    loop = asyncio.get_running_loop()
+    button_watcher = ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        attr.evolve(
+            ButtonTimings.of_config(ButtonWatcherConfig(), example_button_id),
+            optimistic_single_press=True,
+        ),
+        example_event_handler,
+        example_shutdown_condition,
+        LoopClock(),
+    )
+    pressed_at = loop.time()
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    button_watcher_loop = asyncio.create_task(button_watcher.button_watcher_loop())
+
+    await asyncio.sleep(0.1)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await button_watcher_loop
+
+    mock_handle_event_method.assert_awaited_once()
+    assert (
+        mock_handle_event_method.await_args_list[-1].args[0].button_event
+        == ButtonEvent.OPTIMISTIC_SINGLE_PRESS
+    )
+    # the watcher still waits out the double click window before it finishes
+    assert loop.time() - pressed_at == pytest.approx(0.3)
+
+
+@pytest.mark.asyncio
+async def test_long_press_runs_for_the_whole_hold_on_the_virtual_clock(
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+    mock_handle_event_method: AsyncMock,
+):
+    button_watcher = ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        ButtonTimings.of_config(ButtonWatcherConfig(), example_button_id),
+        example_event_handler,
+        example_shutdown_condition,
+        LoopClock(),
+    )
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    button_watcher_loop = asyncio.create_task(button_watcher.button_watcher_loop())
+
+    # checkpoints at 0.3 s, then every 0.25 s
+    await asyncio.sleep(1.4)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await button_watcher_loop
+
+    assert [
+        call.args[0].button_event for call in mock_handle_event_method.await_args_list
+    ] == [ButtonEvent.LONG_PRESS_ONGOING] * 5 + [ButtonEvent.LONG_PRESS_COMPLETED]
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_missed_during_a_slow_publish_are_coalesced(
+    example_pico_remote: PicoRemote,
+    example_button_id: ButtonId,
+    example_event_handler: EventHandler,
+    example_shutdown_condition: asyncio.Condition,
+    mock_handle_event_method: AsyncMock,
+):
+    loop = asyncio.get_running_loop()
+    pressed_at = loop.time()
+    handled_at: list[tuple[ButtonEvent, float]] = []
+
+    async def handle_event(event: CasetaEvent) -> None:
+        handled_at.append((event.button_event, loop.time() - pressed_at))
+        if len(handled_at) == 2:
+            # the checkpoints due at 0.8, 1.05 and 1.3 s pass while this publishes
+            await asyncio.sleep(0.9)
+
+    mock_handle_event_method.side_effect = handle_event
+    button_watcher = ButtonWatcher(
+        example_pico_remote,
+        example_button_id,
+        ButtonTimings.of_config(ButtonWatcherConfig(), example_button_id),
+        example_event_handler,
+        example_shutdown_condition,
+        LoopClock(),
+    )
+    await button_watcher.increment_history(ButtonAction.PRESS)
+    button_watcher_loop = asyncio.create_task(button_watcher.button_watcher_loop())
+
+    await asyncio.sleep(2.0)
+    await button_watcher.increment_history(ButtonAction.RELEASE)
+    await button_watcher_loop
+
+    # the missed checkpoints collapse into the one at 1.55 s instead of firing
+    # back to back when the publish returns at 1.45 s
+    assert [button_event for button_event, _at in handled_at] == [
+        ButtonEvent.LONG_PRESS_ONGOING
+    ] * 4 + [ButtonEvent.LONG_PRESS_COMPLETED]
+    assert [at for _button_event, at in handled_at] == pytest.approx(
+        [0.3, 0.55, 1.55, 1.8, 2.05]
+    )
@@ -0,0 +1,180 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.caseta.rules import RulesEngine, compile_rules
+from pico_to_mqtt.config import Rule, RuleAction, RulesConfig
+from pylutron_caseta.smartbridge import Smartbridge
+
+_SMARTBRIDGE_DEVICES = {
+    "5": {"device_id": "5", "name": "Kitchen_Main Lights", "type": "WallDimmer"},
+    "6": {"device_id": "6", "name": "Kitchen_Pendants", "type": "WallSwitch"},
+}
+_SMARTBRIDGE_SCENES = {"1": {"scene_id": "1", "name": "Movie Night"}}
+
+
+@pytest.fixture
+def mock_smartbridge() -> Mock:
+    mock_smartbridge = Mock(Smartbridge)
+    mock_smartbridge.get_devices = Mock(return_value=_SMARTBRIDGE_DEVICES)
+    mock_smartbridge.get_scenes = Mock(return_value=_SMARTBRIDGE_SCENES)
+    for command in ("turn_on", "turn_off", "set_value", "activate_scene"):
+        setattr(mock_smartbridge, command, AsyncMock())
+    return mock_smartbridge
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        2,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "entryway",
+        "kitchen",
+        {100: ButtonId.POWER_ON, 101: ButtonId.POWER_OFF},
+    )
+
+
+def test_rules_are_resolved_by_button_name_and_target_name_or_id(
+    mock_smartbridge: Mock, example_pico_remote: PicoRemote
+):
+    compiled_rules = compile_rules(
+        [
+            Rule(
+                "kitchen/entryway/power-on",
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+                RuleAction.SET_LEVEL,
+                "kitchen_main lights",
+                level=80,
+            ),
+            Rule(
+                "kitchen/entryway/power-on",
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+                RuleAction.TURN_ON,
+                "6",
+            ),
+            Rule(
+                "kitchen/entryway/power-on",
+                ButtonEvent.DOUBLE_PRESS_COMPLETED,
+                RuleAction.ACTIVATE_SCENE,
+                "Movie Night",
+            ),
+            # unknown button, unknown device
+            Rule(
+                "kitchen/entryway/favorite",
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+                RuleAction.TURN_ON,
+                "6",
+            ),
+            Rule(
+                "kitchen/entryway/power-off",
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+                RuleAction.TURN_OFF,
+                "Garage_Lights",
+            ),
+        ],
+        mock_smartbridge,
+        [example_pico_remote],
+    )
+
+    assert {
+        key: [compiled_rule.rule.target for compiled_rule in rules]
+        for key, rules in compiled_rules.items()
+    } == {
+        (2, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED): [
+            "kitchen_main lights",
+            "6",
+        ],
+        (2, ButtonId.POWER_ON, ButtonEvent.DOUBLE_PRESS_COMPLETED): ["Movie Night"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_matching_rules_run_their_bridge_commands(
+    mock_smartbridge: Mock, example_pico_remote: PicoRemote
+):
+    rules_engine = RulesEngine(
+        RulesConfig(
+            [
+                Rule(
+                    "kitchen/entryway/power-off",
+                    ButtonEvent.SINGLE_PRESS_COMPLETED,
+                    RuleAction.TURN_OFF,
+                    "Kitchen_Main Lights",
+                    fade_time_ms=2000,
+                ),
+                Rule(
+                    "kitchen/entryway/power-off",
+                    ButtonEvent.SINGLE_PRESS_COMPLETED,
+                    RuleAction.TURN_OFF,
+                    "Kitchen_Pendants",
+                ),
+            ]
+        )
+    )
+    rules_engine.attach(mock_smartbridge, [example_pico_remote])
+
+    await rules_engine.deliver(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+        ),
+        1700000000.0,
+    )
+    mock_smartbridge.turn_off.assert_not_awaited()
+
+    await rules_engine.deliver(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_OFF, ButtonEvent.SINGLE_PRESS_COMPLETED
+        ),
+        1700000000.0,
+    )
+    assert [call.args for call in mock_smartbridge.turn_off.await_args_list] == [
+        ("5",),
+        ("6",),
+    ]
+    assert mock_smartbridge.turn_off.await_args_list[0].kwargs == {
+        "fade_time": timedelta(seconds=2)
+    }
+
+
+@pytest.mark.asyncio
+async def test_a_failed_command_does_not_stop_the_other_rules(
+    mock_smartbridge: Mock, example_pico_remote: PicoRemote
+):
+    mock_smartbridge.turn_on = AsyncMock(side_effect=ConnectionResetError())
+    rules_engine = RulesEngine(
+        RulesConfig(
+            [
+                Rule(
+                    "kitchen/entryway/power-on",
+                    ButtonEvent.SINGLE_PRESS_COMPLETED,
+                    RuleAction.TURN_ON,
+                    "5",
+                ),
+                Rule(
+                    "kitchen/entryway/power-on",
+                    ButtonEvent.SINGLE_PRESS_COMPLETED,
+                    RuleAction.ACTIVATE_SCENE,
+                    "1",
+                ),
+            ]
+        )
+    )
+    rules_engine.attach(mock_smartbridge, [example_pico_remote])
+
+    with pytest.raises(RuntimeError):
+        await rules_engine.deliver(
+            CasetaEvent(
+                example_pico_remote,
+                ButtonId.POWER_ON,
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+            ),
+            1700000000.0,
+        )
+    mock_smartbridge.activate_scene.assert_awaited_once_with("1")
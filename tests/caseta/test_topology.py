@@ -4,8 +4,12 @@ from unittest.mock import AsyncMock, Mock
 
 import pytest
 from pico_to_mqtt.caseta.button_watcher import ButtonTracker
-from pico_to_mqtt.caseta.model import PicoRemoteType
-from pico_to_mqtt.caseta.topology import Topology
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.caseta.topology import (
+    Topology,
+    remote_fingerprint,
+    topology_fingerprint,
+)
 from pylutron_caseta.smartbridge import Smartbridge
 from pytest_mock import MockerFixture
 
@@ -68,6 +72,8 @@ async def test_topology_connects_to_smartbridge(
     topology = Topology(mock_smartbridge, shutdown_condition, mock_button_tracker)
     await topology.connect()
     mock_connect.assert_called_once()
+    assert set(topology.remote_fingerprints) == {2}
+    assert topology.fingerprint is not None
 
 
 @pytest.mark.asyncio
@@ -92,3 +98,34 @@ async def test_smartbridge_connection_errors_notify_the_shutdown_condition(
         async with shutdown_condition:
             assert await shutdown_condition.wait()
             return
+
+
+def test_fingerprints_only_change_with_the_remotes():
+    remote = PicoRemote(
+        2,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "entryway",
+        "fancyroom",
+        {101: ButtonId.POWER_OFF, 100: ButtonId.POWER_ON},
+    )
+    same_remote = PicoRemote(
+        2,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "entryway",
+        "fancyroom",
+        {100: ButtonId.POWER_ON, 101: ButtonId.POWER_OFF},
+    )
+    renamed_remote = PicoRemote(
+        2,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "front-door",
+        "fancyroom",
+        {100: ButtonId.POWER_ON, 101: ButtonId.POWER_OFF},
+    )
+
+    assert remote_fingerprint(remote) == remote_fingerprint(same_remote)
+    assert remote_fingerprint(remote) != remote_fingerprint(renamed_remote)
+    assert topology_fingerprint({2: "a", 3: "b"}) == topology_fingerprint(
+        {3: "b", 2: "a"}
+    )
+    assert topology_fingerprint({2: "a"}) != topology_fingerprint({2: "a", 3: "b"})
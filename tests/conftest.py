@@ -0,0 +1,20 @@
+import asyncio
+from typing import Iterator
+
+import pytest
+from pico_to_mqtt.virtual_time import VirtualTimeEventLoop
+
+
+@pytest.fixture
+def event_loop(request: pytest.FixtureRequest) -> Iterator[asyncio.AbstractEventLoop]:
+    """
+    pytest-asyncio's loop, unless the test is marked `virtual_time`. then it runs on
+    a VirtualTimeEventLoop, which skips ahead to the next timer whenever every task
+    is waiting, so double click windows and long holds take no wall time.
+    """
+    if request.node.get_closest_marker("virtual_time"):
+        loop: asyncio.AbstractEventLoop = VirtualTimeEventLoop()
+    else:
+        loop = asyncio.get_event_loop_policy().new_event_loop()
+    yield loop
+    loop.close()
@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.config import NdjsonSinkConfig
+from pico_to_mqtt.sinks import NdjsonSink
+
+
+@pytest.mark.asyncio
+async def test_events_are_appended_as_json_lines(tmp_path: Path):
+    output_path = tmp_path / "events.ndjson"
+    output_path.write_text('{"earlier":"line"}\n')
+    remote = PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+    sink = NdjsonSink(NdjsonSinkConfig(enabled=True, path=output_path))
+
+    await sink.open()
+    await sink.deliver(
+        CasetaEvent(remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED),
+        1700000000.0,
+    )
+    await sink.deliver(
+        CasetaEvent(remote, ButtonId.POWER_OFF, ButtonEvent.DOUBLE_PRESS_COMPLETED),
+        1700000001.0,
+    )
+    await sink.close()
+
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert lines[0] == {"earlier": "line"}
+    assert [(line["button_id"], line["action"]) for line in lines[1:]] == [
+        ("POWER_ON", "SINGLE_PRESS_COMPLETED"),
+        ("POWER_OFF", "DOUBLE_PRESS_COMPLETED"),
+    ]
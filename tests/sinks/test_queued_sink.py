@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.sinks import QueuedSink, encode_event
+
+
+class RecordingSink:
+    name = "recording"
+
+    def __init__(self) -> None:
+        self.opened = False
+        self.closed = False
+        self.events: list[CasetaEvent] = []
+        self.fail_next = False
+        self.fail_open = False
+
+    async def open(self) -> None:
+        if self.fail_open:
+            raise PermissionError("permission denied: events.ndjson")
+        self.opened = True
+
+    async def deliver(self, event: CasetaEvent, timestamp: float) -> None:
+        await asyncio.sleep(0)
+        if self.fail_next:
+            self.fail_next = False
+            raise OSError("no space left on device")
+        self.events.append(event)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+def _event(remote: PicoRemote, button_event: ButtonEvent) -> CasetaEvent:
+    return CasetaEvent(remote, ButtonId.POWER_ON, button_event)
+
+
+@pytest.mark.asyncio
+async def test_the_oldest_events_are_dropped_once_the_queue_is_full(
+    example_pico_remote: PicoRemote,
+):
+    sink = RecordingSink()
+    queued_sink = QueuedSink(sink, 2)
+    for button_event in (
+        ButtonEvent.SINGLE_PRESS_COMPLETED,
+        ButtonEvent.DOUBLE_PRESS_COMPLETED,
+        ButtonEvent.LONG_PRESS_COMPLETED,
+    ):
+        queued_sink.submit(_event(example_pico_remote, button_event))
+
+    run_task = asyncio.create_task(queued_sink.run())
+    await queued_sink.drain()
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+
+    assert [event.button_event for event in sink.events] == [
+        ButtonEvent.DOUBLE_PRESS_COMPLETED,
+        ButtonEvent.LONG_PRESS_COMPLETED,
+    ]
+    assert queued_sink.metrics_snapshot()["dropped"] == 1
+    assert sink.opened and sink.closed
+
+
+@pytest.mark.asyncio
+async def test_a_failed_delivery_does_not_stop_the_sink(
+    example_pico_remote: PicoRemote,
+):
+    sink = RecordingSink()
+    sink.fail_next = True
+    queued_sink = QueuedSink(sink, 10)
+    run_task = asyncio.create_task(queued_sink.run())
+
+    queued_sink.submit(_event(example_pico_remote, ButtonEvent.SINGLE_PRESS_COMPLETED))
+    queued_sink.submit(_event(example_pico_remote, ButtonEvent.DOUBLE_PRESS_COMPLETED))
+    await queued_sink.drain()
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+
+    assert [event.button_event for event in sink.events] == [
+        ButtonEvent.DOUBLE_PRESS_COMPLETED
+    ]
+    assert queued_sink.failed == 1
+    assert queued_sink.delivered == 1
+
+
+@pytest.mark.asyncio
+async def test_a_sink_that_fails_to_open_does_not_hold_up_draining(
+    example_pico_remote: PicoRemote,
+):
+    sink = RecordingSink()
+    sink.fail_open = True
+    queued_sink = QueuedSink(sink, 10)
+    queued_sink.submit(_event(example_pico_remote, ButtonEvent.SINGLE_PRESS_COMPLETED))
+
+    await queued_sink.run()
+    queued_sink.submit(_event(example_pico_remote, ButtonEvent.DOUBLE_PRESS_COMPLETED))
+    await asyncio.wait_for(queued_sink.drain(), 1)
+
+    assert sink.events == []
+    assert queued_sink.metrics_snapshot()["failed_to_open"] is True
+    assert queued_sink.dropped == 2
+
+
+def test_encoded_events_are_one_line_of_json(example_pico_remote: PicoRemote):
+    line = encode_event(
+        CasetaEvent(
+            example_pico_remote,
+            ButtonId.POWER_OFF,
+            ButtonEvent.LONG_PRESS_COMPLETED,
+            hold_duration_sec=1.25,
+        ),
+        1700000000.5,
+    )
+
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert json.loads(line) == {
+        "timestamp": 1700000000.5,
+        "area": "fancyroom",
+        "remote": "some-test-remote",
+        "button_id": "POWER_OFF",
+        "action": "LONG_PRESS_COMPLETED",
+        "remote_type": "Pico2Button",
+        "hold_duration_ms": 1250,
+    }
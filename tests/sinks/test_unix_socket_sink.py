@@ -0,0 +1,78 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.config import UnixSocketSinkConfig
+from pico_to_mqtt.sinks import UnixSocketSink
+
+
+@pytest.fixture
+def example_event() -> CasetaEvent:
+    return CasetaEvent(
+        PicoRemote(
+            99,
+            PicoRemoteType.PICO_TWO_BUTTON,
+            "some-test-remote",
+            "fancyroom",
+            {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+        ),
+        ButtonId.POWER_ON,
+        ButtonEvent.SINGLE_PRESS_COMPLETED,
+    )
+
+
+async def _wait_for_clients(sink: UnixSocketSink, count: int) -> None:
+    while sink.client_count != count:
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+async def test_every_connected_consumer_gets_each_event(
+    tmp_path: Path, example_event: CasetaEvent
+):
+    socket_path = tmp_path / "events.sock"
+    sink = UnixSocketSink(UnixSocketSinkConfig(enabled=True, path=socket_path))
+    await sink.open()
+    consumers = [await asyncio.open_unix_connection(socket_path) for _ in range(2)]
+    await _wait_for_clients(sink, 2)
+
+    await sink.deliver(example_event, 1700000000.0)
+
+    for reader, _writer in consumers:
+        line = await asyncio.wait_for(reader.readline(), 1)
+        assert json.loads(line)["action"] == "SINGLE_PRESS_COMPLETED"
+
+    consumers[0][1].close()
+    await _wait_for_clients(sink, 1)
+    await sink.close()
+    assert await asyncio.wait_for(consumers[1][0].read(), 1) == b""
+    assert not socket_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_a_stale_socket_file_is_replaced(
+    tmp_path: Path, example_event: CasetaEvent
+):
+    socket_path = tmp_path / "events.sock"
+    stale_sink = UnixSocketSink(UnixSocketSinkConfig(enabled=True, path=socket_path))
+    await stale_sink.open()
+    # an unclean exit: the socket file stays behind
+    assert stale_sink._server is not None  # pyright: ignore[reportPrivateUsage]
+    stale_sink._server.close()  # pyright: ignore[reportPrivateUsage]
+
+    sink = UnixSocketSink(UnixSocketSinkConfig(enabled=True, path=socket_path))
+    await sink.open()
+    reader, _writer = await asyncio.open_unix_connection(socket_path)
+    await _wait_for_clients(sink, 1)
+    await sink.deliver(example_event, 1700000000.0)
+
+    assert await asyncio.wait_for(reader.readline(), 1)
+    await sink.close()
@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import json
+from typing import AsyncIterator, Callable
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.config import WebhookSinkConfig
+from pico_to_mqtt.sinks import WebhookDeliveryError, WebhookSink
+
+
+class WebhookServer:
+    """a bare HTTP/1.1 server that answers every request with `respond`"""
+
+    def __init__(self) -> None:
+        self.bodies: list[dict[str, object]] = []
+        self.connections = 0
+        self.respond: Callable[[], bytes] = lambda: (
+            b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n"
+        )
+        self.close_after_response = False
+        self.port = 0
+        self.handlers: set[asyncio.Task[None]] = set()
+
+    async def _on_client_connected(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        handler = asyncio.current_task()
+        assert handler is not None
+        self.handlers.add(handler)
+        try:
+            while request_line := await reader.readline():
+                assert request_line.startswith(b"POST /hook?token=abc HTTP/1.1")
+                content_length = 0
+                while (header_line := await reader.readline()) != b"\r\n":
+                    name, _, value = header_line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        content_length = int(value)
+                self.bodies.append(json.loads(await reader.readexactly(content_length)))
+                writer.write(self.respond())
+                await writer.drain()
+                if self.close_after_response:
+                    break
+        finally:
+            writer.close()
+
+
+@contextlib.asynccontextmanager
+async def serving_webhook() -> AsyncIterator[WebhookServer]:
+    webhook_server = WebhookServer()
+    server = await asyncio.start_server(
+        webhook_server._on_client_connected,  # pyright: ignore[reportPrivateUsage]
+        "127.0.0.1",
+        0,
+    )
+    webhook_server.port = server.sockets[0].getsockname()[1]
+    async with server:
+        yield webhook_server
+        for handler in webhook_server.handlers:
+            handler.cancel()
+        await asyncio.gather(*webhook_server.handlers, return_exceptions=True)
+
+
+@pytest.fixture
+def example_event() -> CasetaEvent:
+    return CasetaEvent(
+        PicoRemote(
+            99,
+            PicoRemoteType.PICO_TWO_BUTTON,
+            "some-test-remote",
+            "fancyroom",
+            {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+        ),
+        ButtonId.POWER_ON,
+        ButtonEvent.SINGLE_PRESS_COMPLETED,
+    )
+
+
+async def _webhook_sink(webhook_server: WebhookServer) -> WebhookSink:
+    sink = WebhookSink(
+        WebhookSinkConfig(
+            enabled=True,
+            url=f"http://127.0.0.1:{webhook_server.port}/hook?token=abc",
+            timeout_sec=1.0,
+        )
+    )
+    await sink.open()
+    return sink
+
+
+@pytest.mark.asyncio
+async def test_deliveries_reuse_one_keep_alive_connection(example_event: CasetaEvent):
+    async with serving_webhook() as webhook_server:
+        sink = await _webhook_sink(webhook_server)
+        webhook_server.respond = lambda: (
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nok\r\n0\r\n\r\n"
+        )
+
+        for _ in range(3):
+            await sink.deliver(example_event, 1700000000.0)
+        await sink.close()
+
+        assert webhook_server.connections == 1
+        assert sink.connections_opened == 1
+        assert [body["action"] for body in webhook_server.bodies] == [
+            "SINGLE_PRESS_COMPLETED"
+        ] * 3
+
+
+@pytest.mark.asyncio
+async def test_a_connection_the_server_closed_is_replaced(example_event: CasetaEvent):
+    async with serving_webhook() as webhook_server:
+        sink = await _webhook_sink(webhook_server)
+        # the response still promises keep-alive, but the server hangs up anyway
+        webhook_server.close_after_response = True
+
+        await sink.deliver(example_event, 1700000000.0)
+        await asyncio.sleep(0.01)
+        await sink.deliver(example_event, 1700000001.0)
+        await sink.close()
+
+        assert len(webhook_server.bodies) == 2
+        assert sink.connections_opened == 2
+
+
+@pytest.mark.asyncio
+async def test_an_error_status_fails_the_delivery(example_event: CasetaEvent):
+    async with serving_webhook() as webhook_server:
+        sink = await _webhook_sink(webhook_server)
+        webhook_server.respond = lambda: (
+            b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 4\r\n\r\noops"
+        )
+
+        with pytest.raises(WebhookDeliveryError):
+            await sink.deliver(example_event, 1700000000.0)
+        await sink.close()
+
+
+@pytest.mark.asyncio
+async def test_responses_without_a_body_keep_the_connection(
+    example_event: CasetaEvent,
+):
+    async with serving_webhook() as webhook_server:
+        sink = await _webhook_sink(webhook_server)
+        # no Content-Length, yet neither ends when the connection closes
+        webhook_server.respond = lambda: (
+            b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n"
+        )
+
+        for _ in range(2):
+            await sink.deliver(example_event, 1700000000.0)
+        await sink.close()
+
+        assert len(webhook_server.bodies) == 2
+        assert sink.connections_opened == 1
+
+
+def test_only_http_urls_are_accepted():
+    with pytest.raises(ValueError):
+        WebhookSink(WebhookSinkConfig(enabled=True, url="ftp://example.com/hook"))
@@ -0,0 +1,143 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+from pico_to_mqtt.aggregate_batcher import AggregateBatcher
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.clock import LoopClock
+from pico_to_mqtt.config import AggregateTopicConfig
+
+pytestmark = pytest.mark.virtual_time
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+@pytest.fixture
+def mock_publish() -> AsyncMock:
+    return AsyncMock()
+
+
+def _published_batches(mock_publish: AsyncMock) -> list[dict[str, object]]:
+    return [json.loads(call.args[1]) for call in mock_publish.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_a_full_batch_is_published_without_waiting_for_the_delay(
+    mock_publish: AsyncMock, example_pico_remote: PicoRemote
+):
+    batcher = AggregateBatcher(
+        mock_publish,
+        AggregateTopicConfig(enabled=True, max_batch_events=2, max_batch_delay_ms=5000),
+        LoopClock(),
+    )
+    run_task = asyncio.create_task(batcher.run())
+    started_at = asyncio.get_running_loop().time()
+
+    batcher.add(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
+    await asyncio.sleep(0.1)
+    batcher.add(
+        CasetaEvent(
+            example_pico_remote,
+            ButtonId.POWER_OFF,
+            ButtonEvent.LONG_PRESS_COMPLETED,
+            hold_duration_sec=1.5,
+            gesture_id="ab12",
+        )
+    )
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert asyncio.get_running_loop().time() - started_at == pytest.approx(0.1)
+    mock_publish.assert_awaited_once()
+    topic, payload, qos, retain = mock_publish.await_args_list[-1].args
+    assert (topic, qos, retain) == ("picotomqtt/aggregate", 0, False)
+    assert " " not in payload
+    batch = json.loads(payload)
+    assert batch["v"] == 1
+    assert batch["seq"] == 0
+    assert batch["events"] == [
+        [
+            0,
+            "fancyroom/some-test-remote/power-on",
+            ButtonEvent.SINGLE_PRESS_COMPLETED.value,
+        ],
+        [
+            100,
+            "fancyroom/some-test-remote/power-off",
+            ButtonEvent.LONG_PRESS_COMPLETED.value,
+            1500,
+            "ab12",
+        ],
+    ]
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_a_partial_batch_is_published_after_the_delay_with_the_next_seq(
+    mock_publish: AsyncMock, example_pico_remote: PicoRemote
+):
+    batcher = AggregateBatcher(
+        mock_publish,
+        AggregateTopicConfig(enabled=True, max_batch_events=10, max_batch_delay_ms=500),
+        LoopClock(),
+    )
+    run_task = asyncio.create_task(batcher.run())
+    event = CasetaEvent(
+        example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+    )
+
+    batcher.add(event)
+    await asyncio.sleep(0.4)
+    mock_publish.assert_not_awaited()
+    await asyncio.sleep(0.2)
+    batcher.add(event)
+    await asyncio.sleep(1)
+
+    batches = _published_batches(mock_publish)
+    assert [batch["seq"] for batch in batches] == [0, 1]
+    assert batches[0]["session"] == batches[1]["session"]
+    assert [len(batch["events"]) for batch in batches] == [1, 1]  # type: ignore
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_flush_publishes_what_is_pending_and_nothing_when_empty(
+    mock_publish: AsyncMock, example_pico_remote: PicoRemote
+):
+    batcher = AggregateBatcher(
+        mock_publish, AggregateTopicConfig(enabled=True), LoopClock()
+    )
+
+    await batcher.flush()
+    mock_publish.assert_not_awaited()
+
+    batcher.add(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
+    await batcher.flush()
+    mock_publish.assert_awaited_once()
+    assert batcher.published_batches == 1
@@ -0,0 +1,83 @@
+import asyncio
+from pathlib import Path
+from unittest.mock import Mock
+
+import attrs
+import pytest
+from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.config import (
+    AllConfig,
+    ButtonWatcherConfig,
+    CasetaConfig,
+    MqttConfig,
+    MqttCredentials,
+)
+from pico_to_mqtt.config_reload import ConfigReloader
+from pico_to_mqtt.event_handler import EventHandler
+
+
+@pytest.fixture
+def example_configuration() -> AllConfig:
+    return AllConfig(
+        CasetaConfig(
+            "caseta-bridge.local",
+            Path("caseta.crt"),
+            Path("caseta.key"),
+            Path("caseta-bridge.crt"),
+        ),
+        MqttConfig(
+            Path("client.crt"),
+            Path("client.key"),
+            Path("ca.pem"),
+            "mosquitto-broker.local",
+            8883,
+        ),
+        MqttCredentials("username", "password"),
+        ButtonWatcherConfig(),
+    )
+
+
+@pytest.fixture
+def button_tracker(example_configuration: AllConfig) -> ButtonTracker:
+    return ButtonTracker(
+        asyncio.Condition(),
+        Mock(EventHandler),
+        example_configuration.button_watcher_config,
+    )
+
+
+@pytest.mark.asyncio
+async def test_reload_applies_a_new_button_watcher_config(
+    example_configuration: AllConfig, button_tracker: ButtonTracker
+):
+    new_button_watcher_config = ButtonWatcherConfig(sleep_duration_ms=100)
+    config_reloader = ConfigReloader(
+        button_tracker,
+        example_configuration,
+        lambda: attrs.evolve(
+            example_configuration, button_watcher_config=new_button_watcher_config
+        ),
+    )
+
+    await config_reloader.reload()
+
+    assert button_tracker.button_watcher_config == new_button_watcher_config
+
+
+@pytest.mark.asyncio
+async def test_reload_keeps_the_current_config_when_loading_fails(
+    example_configuration: AllConfig, button_tracker: ButtonTracker
+):
+    def broken_config_loader() -> AllConfig:
+        raise ValueError("not valid toml")
+
+    config_reloader = ConfigReloader(
+        button_tracker, example_configuration, broken_config_loader
+    )
+
+    await config_reloader.reload()
+
+    assert (
+        button_tracker.button_watcher_config
+        == example_configuration.button_watcher_config
+    )
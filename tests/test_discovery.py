@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import attrs
+import pytest
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.caseta.topology import remote_fingerprint
+from pico_to_mqtt.config import DiscoveryConfig, MqttConfig
+from pico_to_mqtt.discovery import DiscoveryPublisher
+
+_MQTT_CONFIG = MqttConfig(
+    Path("client.crt"),
+    Path("client.key"),
+    Path("ca.pem"),
+    "mosquitto-broker.local",
+    8883,
+    discovery=DiscoveryConfig(enabled=True),
+)
+
+
+def _remote(device_id: int, name: str) -> PicoRemote:
+    return PicoRemote(
+        device_id,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        name,
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+async def _update(
+    discovery_publisher: DiscoveryPublisher, remotes: list[PicoRemote]
+) -> None:
+    await discovery_publisher.update(
+        remotes, {remote.device_id: remote_fingerprint(remote) for remote in remotes}
+    )
+
+
+def _published(mock_publish: AsyncMock) -> dict[str, str]:
+    return {call.args[0]: call.args[1] for call in mock_publish.await_args_list}
+
+
+@pytest.mark.asyncio
+async def test_only_changed_remotes_are_republished_and_removed_ones_cleared():
+    mock_publish = AsyncMock()
+    discovery_publisher = DiscoveryPublisher(mock_publish, _MQTT_CONFIG)
+    entryway, hallway = _remote(2, "entryway"), _remote(3, "hallway")
+
+    await _update(discovery_publisher, [entryway, hallway])
+    # 2 buttons with 4 triggers each, and a manifest, per remote
+    assert mock_publish.await_count == 18
+    assert all(call.args[2:] == (1, True) for call in mock_publish.await_args_list)
+
+    mock_publish.reset_mock()
+    await _update(discovery_publisher, [entryway, hallway])
+    mock_publish.assert_not_awaited()
+
+    await _update(discovery_publisher, [attrs.evolve(entryway, name="front-door")])
+    published = _published(mock_publish)
+    assert len(published) == 18
+    assert json.loads(published["picotomqtt/manifest/2"])["remote"] == "front-door"
+    assert published["picotomqtt/manifest/3"] == ""
+    assert {topic for topic, payload in published.items() if payload == ""} == {
+        topic for topic in published if "_3/" in topic or topic.endswith("/3")
+    }
+
+
+def test_triggers_are_home_assistant_device_triggers():
+    discovery_publisher = DiscoveryPublisher(AsyncMock(), _MQTT_CONFIG)
+
+    messages = discovery_publisher.discovery_messages(_remote(2, "entryway"))
+
+    trigger = json.loads(
+        messages[
+            "homeassistant/device_automation/pico_to_mqtt_2"
+            "/power-on_double_press_completed/config"
+        ]
+    )
+    assert trigger == {
+        "automation_type": "trigger",
+        "topic": "picotomqtt/fancyroom/entryway/power-on",
+        "type": "button_double_press",
+        "subtype": "power-on",
+        "payload": "DOUBLE_PRESS_COMPLETED",
+        "value_template": "{{ value_json.action }}",
+        "device": {
+            "identifiers": ["pico_to_mqtt_2"],
+            "name": "fancyroom entryway",
+            "manufacturer": "Lutron",
+            "model": "Pico2Button",
+            "suggested_area": "fancyroom",
+        },
+    }
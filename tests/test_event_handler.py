@@ -0,0 +1,279 @@
+import asyncio
+import contextlib
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from unittest.mock import AsyncMock, Mock
+
+import aiomqtt
+import attrs
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.config import (
+    Mqtt5Config,
+    MqttConfig,
+    PublishOptions,
+    PublishOptionsByButtonEvent,
+)
+from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.sinks import QueuedSink
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+@pytest.fixture
+def example_mqtt_config() -> MqttConfig:
+    return MqttConfig(
+        Path("client.crt"),
+        Path("client.key"),
+        Path("ca.pem"),
+        "mosquitto-broker.local",
+        8883,
+        publish_options=PublishOptionsByButtonEvent(
+            single_press_completed=PublishOptions(qos=0, retain=True),
+            double_press_completed=PublishOptions(qos=1),
+        ),
+        max_inflight_messages=1,
+    )
+
+
+@pytest.fixture
+def mock_mqtt_client() -> Mock:
+    mqtt_client = Mock(aiomqtt.Client)
+    mqtt_client.publish = AsyncMock()
+    return mqtt_client
+
+
+@pytest.fixture
+def event_handler(mock_mqtt_client: Mock, example_mqtt_config: MqttConfig):
+    return EventHandler(mock_mqtt_client, asyncio.Condition(), example_mqtt_config)
+
+
+@pytest.mark.asyncio
+async def test_publish_uses_the_qos_and_retain_flag_of_the_button_event(
+    event_handler: EventHandler,
+    mock_mqtt_client: Mock,
+    example_pico_remote: PicoRemote,
+):
+    await event_handler._publish_event(  # pyright: ignore[reportPrivateUsage]
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
+
+    mock_mqtt_client.publish.assert_awaited_once()
+    assert mock_mqtt_client.publish.await_args.kwargs == {
+        "qos": 0,
+        "retain": True,
+        "properties": None,
+    }
+    assert mock_mqtt_client.publish.await_args.args[0] == (
+        "picotomqtt/fancyroom/some-test-remote/power-on"
+    )
+
+
+@pytest.mark.asyncio
+async def test_qos_1_publishes_are_capped_by_the_inflight_window(
+    event_handler: EventHandler,
+    mock_mqtt_client: Mock,
+    example_pico_remote: PicoRemote,
+):
+    acknowledged = asyncio.Event()
+
+    async def publish_awaiting_ack(*_args: object, **_kwargs: object):
+        await acknowledged.wait()
+
+    mock_mqtt_client.publish.side_effect = publish_awaiting_ack
+    double_press = CasetaEvent(
+        example_pico_remote, ButtonId.POWER_ON, ButtonEvent.DOUBLE_PRESS_COMPLETED
+    )
+
+    await event_handler._publish_event(double_press)  # pyright: ignore[reportPrivateUsage]
+    second_publish = asyncio.create_task(
+        event_handler._publish_event(double_press)  # pyright: ignore[reportPrivateUsage]
+    )
+    await asyncio.sleep(0)
+    assert not second_publish.done()
+    assert event_handler.metrics_snapshot()["inflight_publishes"] == 1
+
+    acknowledged.set()
+    await second_publish
+    await asyncio.sleep(0)
+
+    assert mock_mqtt_client.publish.await_count == 2
+    assert event_handler.publish_ack_latency.count >= 1
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_queued_and_unacknowledged_publishes(
+    event_handler: EventHandler,
+    mock_mqtt_client: Mock,
+    example_pico_remote: PicoRemote,
+):
+    acknowledged = asyncio.Event()
+
+    async def publish_awaiting_ack(*_args: object, **_kwargs: object):
+        await acknowledged.wait()
+
+    mock_mqtt_client.publish.side_effect = publish_awaiting_ack
+    run_task = asyncio.create_task(event_handler.run())
+    await event_handler.handle_event(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.DOUBLE_PRESS_COMPLETED
+        )
+    )
+
+    drain_task = asyncio.create_task(event_handler.drain())
+    await asyncio.sleep(0.01)
+    assert not drain_task.done()
+
+    acknowledged.set()
+    async with asyncio.timeout(1):
+        await drain_task
+    run_task.cancel()
+
+    mock_mqtt_client.publish.assert_awaited_once()
+    assert event_handler.metrics_snapshot()["inflight_publishes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sinks_get_events_before_publishing_starts(
+    mock_mqtt_client: Mock,
+    example_mqtt_config: MqttConfig,
+    example_pico_remote: PicoRemote,
+):
+    sink = Mock()
+    sink.name = "recording"
+    sink.open = AsyncMock()
+    sink.deliver = AsyncMock()
+    sink.close = AsyncMock()
+    event_handler = EventHandler(
+        mock_mqtt_client,
+        asyncio.Condition(),
+        example_mqtt_config,
+        sinks=[QueuedSink(sink, 10)],
+    )
+    run_sinks_task = asyncio.create_task(event_handler.run_sinks())
+    await event_handler.handle_event(
+        CasetaEvent(
+            example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
+
+    async with asyncio.timeout(1):
+        await event_handler.sinks[0].drain()
+    run_sinks_task.cancel()
+    await asyncio.gather(run_sinks_task, return_exceptions=True)
+
+    assert [call.args[0].button_event for call in sink.deliver.await_args_list] == [
+        ButtonEvent.SINGLE_PRESS_COMPLETED
+    ]
+    mock_mqtt_client.publish.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_a_disconnect_clears_mqtt_connected(
+    event_handler: EventHandler, mock_mqtt_client: Mock
+):
+    async def disconnected_messages() -> AsyncIterator[aiomqtt.Message]:
+        raise aiomqtt.MqttError("Disconnected during message iteration")
+        yield
+
+    @contextlib.asynccontextmanager
+    async def messages() -> AsyncIterator[AsyncIterator[aiomqtt.Message]]:
+        yield disconnected_messages()
+
+    mock_mqtt_client.messages = messages
+    event_handler.mqtt_connected = True
+
+    await event_handler.watch_connection()
+
+    assert event_handler.mqtt_connected is False
+
+
+@pytest.mark.asyncio
+async def test_mqtt5_publishes_reuse_the_topic_alias_and_carry_user_properties(
+    mock_mqtt_client: Mock,
+    example_mqtt_config: MqttConfig,
+    example_pico_remote: PicoRemote,
+):
+    event_handler = EventHandler(
+        mock_mqtt_client,
+        asyncio.Condition(),
+        attrs.evolve(
+            example_mqtt_config,
+            mqtt5=Mqtt5Config(
+                enabled=True, max_topic_aliases=10, metadata_as_user_properties=True
+            ),
+        ),
+    )
+    event_handler.connected(broker_topic_alias_maximum=65535)
+    event = CasetaEvent(
+        example_pico_remote, ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED
+    )
+
+    await event_handler._publish_event(event)  # pyright: ignore[reportPrivateUsage]
+    await event_handler._publish_event(event)  # pyright: ignore[reportPrivateUsage]
+
+    first_publish, second_publish = mock_mqtt_client.publish.await_args_list
+    assert first_publish.args == (
+        "picotomqtt/fancyroom/some-test-remote/power-on",
+        "SINGLE_PRESS_COMPLETED",
+    )
+    assert second_publish.args == ("", "SINGLE_PRESS_COMPLETED")
+    for publish in (first_publish, second_publish):
+        properties = publish.kwargs["properties"]
+        assert properties.TopicAlias == 1
+        assert properties.UserProperty == [
+            ("button_id", "POWER_ON"),
+            ("area", "fancyroom"),
+            ("remote_type", "Pico2Button"),
+        ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("broker_topic_alias_maximum", "expected_topic_alias"), [(1, 1), (0, None)]
+)
+async def test_topic_aliases_stay_within_the_brokers_maximum(
+    mock_mqtt_client: Mock,
+    example_mqtt_config: MqttConfig,
+    example_pico_remote: PicoRemote,
+    broker_topic_alias_maximum: int,
+    expected_topic_alias: Optional[int],
+):
+    event_handler = EventHandler(
+        mock_mqtt_client,
+        asyncio.Condition(),
+        attrs.evolve(
+            example_mqtt_config, mqtt5=Mqtt5Config(enabled=True, max_topic_aliases=10)
+        ),
+    )
+    event_handler.connected(broker_topic_alias_maximum)
+
+    for button_id in (ButtonId.POWER_ON, ButtonId.POWER_OFF):
+        await event_handler._publish_event(  # pyright: ignore[reportPrivateUsage]
+            CasetaEvent(
+                example_pico_remote, button_id, ButtonEvent.SINGLE_PRESS_COMPLETED
+            )
+        )
+
+    topic_aliases = [
+        getattr(publish.kwargs["properties"], "TopicAlias", None)
+        for publish in mock_mqtt_client.publish.await_args_list
+    ]
+    assert topic_aliases == [expected_topic_alias, None]
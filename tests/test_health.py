@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+from unittest.mock import AsyncMock, Mock
+
+import aiohttp
+import aiomqtt
+import pytest
+from pico_to_mqtt.caseta.button_watcher import ButtonTracker
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.caseta.topology import Topology
+from pico_to_mqtt.config import HealthConfig, LoopMonitorConfig, MqttConfig
+from pico_to_mqtt.event_handler import EventHandler
+from pico_to_mqtt.health import HealthServer
+from pico_to_mqtt.loop_monitor import LoopLagMonitor
+from pylutron_caseta.smartbridge import Smartbridge
+
+
+def example_event_handler(mqtt_client: Optional[Mock] = None) -> EventHandler:
+    return EventHandler(
+        mqtt_client if mqtt_client is not None else Mock(aiomqtt.Client),
+        asyncio.Condition(),
+        MqttConfig(
+            Path("client.crt"),
+            Path("client.key"),
+            Path("ca.pem"),
+            "mosquitto-broker.local",
+            8883,
+        ),
+    )
+
+
+@contextlib.asynccontextmanager
+async def serving(health_server: HealthServer) -> AsyncIterator[HealthServer]:
+    await health_server.start()
+    try:
+        yield health_server
+    finally:
+        await health_server.close()
+
+
+async def get(
+    session: aiohttp.ClientSession, health_server: HealthServer, path: str
+) -> tuple[int, dict[str, Any]]:
+    async with session.get(f"http://127.0.0.1:{health_server.port}{path}") as response:
+        assert response.headers["Cache-Control"] == "no-store"
+        return response.status, await response.json()
+
+
+@pytest.mark.asyncio
+async def test_ready_once_the_broker_and_the_bridge_are_up_and_attached():
+    event_handler = example_event_handler()
+    health_server = HealthServer(
+        HealthConfig(port=0), event_handler, loop_lag_monitor=None
+    )
+    async with serving(health_server), aiohttp.ClientSession() as session:
+        status, body = await get(session, health_server, "/livez")
+        assert status == 200
+        status, body = await get(session, health_server, "/readyz")
+        assert status == 503
+        assert body["ready"] is False
+
+        caseta_bridge = Mock(Smartbridge)
+        caseta_bridge.logged_in = True
+        topology = Topology(caseta_bridge, asyncio.Condition(), Mock(ButtonTracker))
+        health_server.topology = topology
+        event_handler.mqtt_connected = True
+        status, body = await get(session, health_server, "/readyz")
+        assert status == 503
+        assert body["topology_attached"] is False
+
+        topology.attached = True
+        status, body = await get(session, health_server, "/health?verbose=1")
+        assert status == 200
+        assert body["live"] is True
+        assert body["ready"] is True
+
+        caseta_bridge.logged_in = False
+        status, body = await get(session, health_server, "/readyz")
+        assert status == 503
+        assert body["bridge_logged_in"] is False
+
+
+@pytest.mark.asyncio
+async def test_not_ready_once_a_publish_fails():
+    mqtt_client = Mock(aiomqtt.Client)
+    mqtt_client.publish = AsyncMock(side_effect=aiomqtt.MqttCodeError(4))
+    event_handler = example_event_handler(mqtt_client)
+    event_handler.mqtt_connected = True
+    health_server = HealthServer(HealthConfig(port=0), event_handler)
+
+    with pytest.raises(aiomqtt.MqttError):
+        await event_handler._publish_event(  # pyright: ignore[reportPrivateUsage]
+            CasetaEvent(
+                PicoRemote(
+                    99,
+                    PicoRemoteType.PICO_TWO_BUTTON,
+                    "some-test-remote",
+                    "fancyroom",
+                    {1: ButtonId.POWER_ON},
+                ),
+                ButtonId.POWER_ON,
+                ButtonEvent.SINGLE_PRESS_COMPLETED,
+            )
+        )
+
+    assert health_server.status()["mqtt_connected"] is False
+
+
+@pytest.mark.asyncio
+async def test_not_live_while_the_loop_lags():
+    loop_lag_monitor = LoopLagMonitor(LoopMonitorConfig(), asyncio.Condition())
+    health_server = HealthServer(
+        HealthConfig(port=0, max_loop_lag_ms=500),
+        example_event_handler(),
+        loop_lag_monitor,
+    )
+    async with serving(health_server), aiohttp.ClientSession() as session:
+        loop_lag_monitor.last_lag_sec = 0.1
+        status, body = await get(session, health_server, "/livez")
+        assert status == 200
+        assert body["loop_lag_ms"] == pytest.approx(100, abs=1)
+
+        loop_lag_monitor.last_lag_sec = 0.6
+        status, body = await get(session, health_server, "/livez")
+        assert status == 503
+        assert body["loop_responsive"] is False
+
+
+@pytest.mark.asyncio
+async def test_reports_when_the_last_event_was_handled():
+    event_handler = example_event_handler()
+    health_server = HealthServer(HealthConfig(port=0), event_handler)
+    assert health_server.status()["last_event_at"] is None
+
+    await event_handler.handle_event(
+        CasetaEvent(
+            PicoRemote(
+                99,
+                PicoRemoteType.PICO_TWO_BUTTON,
+                "some-test-remote",
+                "fancyroom",
+                {1: ButtonId.POWER_ON},
+            ),
+            ButtonId.POWER_ON,
+            ButtonEvent.SINGLE_PRESS_COMPLETED,
+        )
+    )
+
+    assert health_server.status()["last_event_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_unknown_paths_and_malformed_requests_are_rejected():
+    health_server = HealthServer(HealthConfig(port=0), example_event_handler())
+    async with serving(health_server), aiohttp.ClientSession() as session:
+        async with session.get(
+            f"http://127.0.0.1:{health_server.port}/metrics"
+        ) as response:
+            assert response.status == 404
+        async with session.post(
+            f"http://127.0.0.1:{health_server.port}/health"
+        ) as response:
+            assert response.status == 405
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", health_server.port)
+        try:
+            writer.write(b"nonsense\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            assert response.split(b"\r\n", 1)[0].endswith(b" 400 Bad Request")
+        finally:
+            writer.close()
+
+
+@pytest.mark.asyncio
+async def test_closing_stops_answering():
+    health_server = HealthServer(HealthConfig(port=0), example_event_handler())
+    await health_server.start()
+    port = health_server.port
+    await health_server.close()
+
+    with pytest.raises(ConnectionRefusedError):
+        await asyncio.open_connection("127.0.0.1", port)
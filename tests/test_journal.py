@@ -0,0 +1,144 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonAction,
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.config import JournalConfig
+from pico_to_mqtt.journal import (
+    MIN_SEGMENT_SIZE_BYTES,
+    EventJournal,
+    JournalRecord,
+    JournalRecordKind,
+    read_journal,
+    segment_paths,
+)
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+@pytest.mark.asyncio
+async def test_journal_records_round_trip(
+    tmp_path: Path, example_pico_remote: PicoRemote
+):
+    event_journal = EventJournal(JournalConfig(enabled=True, directory=tmp_path))
+    event_journal.record_button_action(
+        example_pico_remote, ButtonId.POWER_ON, ButtonAction.PRESS, 1.5
+    )
+    event_journal.record_caseta_event(
+        CasetaEvent(
+            example_pico_remote,
+            ButtonId.POWER_ON,
+            ButtonEvent.LONG_PRESS_COMPLETED,
+            hold_duration_sec=1.25,
+            gesture_id="0123456789abcdef0123456789abcdef",
+        ),
+        2.75,
+    )
+
+    await event_journal.flush()
+
+    assert list(read_journal(tmp_path)) == [
+        JournalRecord(
+            JournalRecordKind.BUTTON_ACTION,
+            1.5,
+            99,
+            ButtonId.POWER_ON,
+            button_action=ButtonAction.PRESS,
+        ),
+        JournalRecord(
+            JournalRecordKind.CASETA_EVENT,
+            2.75,
+            99,
+            ButtonId.POWER_ON,
+            button_event=ButtonEvent.LONG_PRESS_COMPLETED,
+            hold_duration_sec=1.25,
+            gesture_id="0123456789abcdef0123456789abcdef",
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_journal_rotates_segments_and_removes_the_oldest(
+    tmp_path: Path, example_pico_remote: PicoRemote
+):
+    # room for two records per segment
+    event_journal = EventJournal(
+        JournalConfig(
+            enabled=True, directory=tmp_path, segment_size_bytes=80, max_segments=2
+        )
+    )
+    for timestamp in range(7):
+        event_journal.record_button_action(
+            example_pico_remote, ButtonId.POWER_OFF, ButtonAction.PRESS, timestamp
+        )
+
+    await event_journal.flush()
+
+    assert [path.name for path in segment_paths(tmp_path)] == [
+        "journal-00000002.bin",
+        "journal-00000003.bin",
+    ]
+    assert [record.timestamp for record in read_journal(tmp_path)] == [4, 5, 6]
+
+
+@pytest.mark.asyncio
+async def test_segments_must_hold_at_least_one_record(
+    tmp_path: Path, example_pico_remote: PicoRemote
+):
+    with pytest.raises(ValueError):
+        JournalConfig(segment_size_bytes=MIN_SEGMENT_SIZE_BYTES - 1)
+
+    event_journal = EventJournal(
+        JournalConfig(
+            enabled=True,
+            directory=tmp_path,
+            segment_size_bytes=MIN_SEGMENT_SIZE_BYTES,
+        )
+    )
+    for timestamp in range(2):
+        event_journal.record_button_action(
+            example_pico_remote, ButtonId.POWER_OFF, ButtonAction.PRESS, timestamp
+        )
+    await event_journal.flush()
+
+    assert len(segment_paths(tmp_path)) == 2
+    assert [record.timestamp for record in read_journal(tmp_path)] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_journal_writes_pending_records_when_cancelled(
+    tmp_path: Path, example_pico_remote: PicoRemote
+):
+    event_journal = EventJournal(
+        JournalConfig(enabled=True, directory=tmp_path, flush_interval_ms=60_000)
+    )
+    run_task = asyncio.create_task(event_journal.run())
+    await asyncio.sleep(0)
+    event_journal.record_button_action(
+        example_pico_remote, ButtonId.POWER_ON, ButtonAction.RELEASE, 3.0
+    )
+
+    run_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run_task
+
+    assert [record.button_action for record in read_journal(tmp_path)] == [
+        ButtonAction.RELEASE
+    ]
+    assert event_journal.metrics_snapshot()["written_records"] == 1
@@ -0,0 +1,87 @@
+import json
+import logging
+import queue
+
+import pytest
+from pico_to_mqtt.caseta.model import ButtonId, PicoRemote, PicoRemoteType
+from pico_to_mqtt.logging_config import (  # pyright: ignore[reportPrivateUsage]
+    ButtonLogContext,
+    JsonFormatter,
+    _DeferredFormattingQueueHandler,
+)
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_TWO_BUTTON,
+        "some-test-remote",
+        "fancyroom",
+        {1: ButtonId.POWER_ON, 2: ButtonId.POWER_OFF},
+    )
+
+
+class _CountingButtonLogContext(ButtonLogContext):
+    __slots__ = ("times_formatted",)
+
+    def __init__(self, remote: PicoRemote, button_id: ButtonId) -> None:
+        super().__init__(remote, button_id)
+        self.times_formatted = 0
+
+    def __str__(self) -> str:
+        self.times_formatted += 1
+        return super().__str__()
+
+
+def test_button_log_context_is_not_formatted_when_the_level_is_disabled(
+    example_pico_remote: PicoRemote,
+):
+    logger = logging.getLogger("test_lazy_button_log_context")
+    logger.setLevel(logging.INFO)
+    log_context = _CountingButtonLogContext(example_pico_remote, ButtonId.POWER_ON)
+
+    logger.debug("%s: a single press has completed", log_context)
+
+    assert log_context.times_formatted == 0
+
+
+def test_json_formatter_includes_the_button_log_context_fields(
+    example_pico_remote: PicoRemote,
+):
+    record = logging.LogRecord(
+        "pico_to_mqtt.caseta.button_watcher",
+        logging.DEBUG,
+        __file__,
+        1,
+        "%s: a single press has completed",
+        (ButtonLogContext(example_pico_remote, ButtonId.POWER_ON),),
+        None,
+    )
+
+    log_entry = json.loads(JsonFormatter().format(record))
+
+    assert log_entry["level"] == "DEBUG"
+    assert log_entry["remote_id"] == 99
+    assert log_entry["button_id"] == "POWER_ON"
+    assert log_entry["message"].endswith("a single press has completed")
+
+
+def test_queued_records_keep_the_arguments_as_they_were_when_logged(
+    example_pico_remote: PicoRemote,
+):
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    logger = logging.getLogger("test_deferred_formatting")
+    logger.propagate = False
+    logger.addHandler(_DeferredFormattingQueueHandler(log_queue))
+    log_context = _CountingButtonLogContext(example_pico_remote, ButtonId.POWER_ON)
+    pressed_buttons = [ButtonId.POWER_ON]
+
+    logger.warning("%s: pressed %r", log_context, pressed_buttons)
+    pressed_buttons.append(ButtonId.POWER_OFF)
+
+    record = log_queue.get_nowait()
+    # immutable arguments are still formatted on the writer thread
+    assert log_context.times_formatted == 0
+    assert record.getMessage().endswith(": pressed [<ButtonId.POWER_ON: 0>]")
+    assert log_context.times_formatted == 1
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+from pico_to_mqtt.config import LoopMonitorConfig
+from pico_to_mqtt.loop_monitor import LoopLagMonitor
+
+
+def _block_the_loop(duration_sec: float) -> None:
+    time.sleep(duration_sec)
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_lag_and_the_blocking_callback():
+    loop_lag_monitor = LoopLagMonitor(
+        LoopMonitorConfig(sample_interval_ms=10, slow_callback_threshold_ms=20),
+        asyncio.Condition(),
+    )
+    monitor_task = asyncio.create_task(loop_lag_monitor.run())
+    await asyncio.sleep(0.03)
+
+    _block_the_loop(0.15)
+    await asyncio.sleep(0.03)
+    monitor_task.cancel()
+
+    assert loop_lag_monitor.lag.max >= 0.1
+    assert loop_lag_monitor.slow_callbacks
+    assert "_block_the_loop" in loop_lag_monitor.slow_callbacks[0].stack
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_watchdog_notifies_the_shutdown_condition():
+    shutdown_condition = asyncio.Condition()
+    loop_lag_monitor = LoopLagMonitor(
+        LoopMonitorConfig(
+            sample_interval_ms=10,
+            slow_callback_threshold_ms=1000,
+            watchdog_lag_threshold_ms=5,
+            watchdog_trip_after_ms=30,
+        ),
+        shutdown_condition,
+    )
+
+    async def keep_blocking_the_loop():
+        while True:
+            _block_the_loop(0.02)
+            await asyncio.sleep(0)
+
+    monitor_task = asyncio.create_task(loop_lag_monitor.run())
+    blocking_task = asyncio.create_task(keep_blocking_the_loop())
+    try:
+        async with asyncio.timeout(1):
+            async with shutdown_condition:
+                assert await shutdown_condition.wait()
+    finally:
+        blocking_task.cancel()
+        monitor_task.cancel()
@@ -0,0 +1,65 @@
+import asyncio
+import tracemalloc
+from typing import Iterator
+
+import pytest
+from pico_to_mqtt.caseta.button_watcher import ButtonHistory
+from pico_to_mqtt.clock import FakeClock
+from pico_to_mqtt.config import MemoryDiagnosticsConfig
+from pico_to_mqtt.memory_diagnostics import MemoryDiagnostics, live_object_counts
+
+
+@pytest.fixture(autouse=True)
+def stop_tracing() -> Iterator[None]:
+    yield
+    tracemalloc.stop()
+
+
+def test_live_objects_are_counted_by_type():
+    histories = [ButtonHistory(1.0, FakeClock()) for _ in range(3)]
+
+    counts = live_object_counts((ButtonHistory, asyncio.Lock))
+
+    assert counts["ButtonHistory"] >= len(histories)
+    assert set(counts) == {"ButtonHistory", "Lock"}
+
+
+@pytest.mark.asyncio
+async def test_a_report_traces_only_while_it_is_built():
+    memory_diagnostics = MemoryDiagnostics(
+        MemoryDiagnosticsConfig(trace_window_sec=0.2, top_allocation_sites=3),
+        {"button_tracker": lambda: {"tracked_remotes": 2}},
+    )
+    assert not tracemalloc.is_tracing()
+
+    report_task = asyncio.create_task(memory_diagnostics.report())
+    await asyncio.sleep(0.05)
+    assert tracemalloc.is_tracing()
+    leaked = [bytearray(1024) for _ in range(1000)]
+    report = await report_task
+
+    assert not tracemalloc.is_tracing()
+    assert report["button_tracker"] == {"tracked_remotes": 2}
+    assert report["asyncio_tasks"] >= 1
+    assert "ButtonWatcher" in report["live_objects"]
+    assert report["traced_bytes"] >= 1000 * 1024
+    assert len(report["top_growth"]) == 3
+    assert __file__ in report["top_growth"][0]
+    del leaked
+
+
+@pytest.mark.asyncio
+async def test_tracing_from_startup_shows_growth_since_the_previous_report():
+    memory_diagnostics = MemoryDiagnostics(
+        MemoryDiagnosticsConfig(trace_from_startup=True, top_allocation_sites=3)
+    )
+    assert tracemalloc.is_tracing()
+
+    await memory_diagnostics.report()
+    leaked = [bytearray(1024) for _ in range(1000)]
+    report = await memory_diagnostics.report()
+
+    assert tracemalloc.is_tracing()
+    assert len(report["top_growth"]) == 3
+    assert __file__ in report["top_growth"][0]
+    del leaked
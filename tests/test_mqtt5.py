@@ -0,0 +1,57 @@
+import aiomqtt
+import paho.mqtt.client as paho
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from pico_to_mqtt.mqtt5 import (
+    BrokerTopicAliasMaximum,
+    TopicAliasTable,
+    publish_properties,
+)
+
+
+def test_each_topic_keeps_its_alias_until_the_table_is_full():
+    topic_aliases = TopicAliasTable(2)
+
+    assert topic_aliases.alias_for("picotomqtt/a/remote/on") == 1
+    assert topic_aliases.alias_for("picotomqtt/a/remote/off") == 2
+    assert topic_aliases.alias_for("picotomqtt/a/remote/on") == 1
+    assert topic_aliases.alias_for("picotomqtt/a/remote/raise") is None
+
+
+def test_an_alias_is_established_only_once_marked():
+    topic_aliases = TopicAliasTable(1)
+    topic_aliases.alias_for("picotomqtt/a/remote/on")
+
+    assert not topic_aliases.is_established("picotomqtt/a/remote/on")
+    topic_aliases.mark_established("picotomqtt/a/remote/on")
+    assert topic_aliases.is_established("picotomqtt/a/remote/on")
+
+
+def test_publish_properties_are_only_built_when_needed():
+    assert publish_properties(None, []) is None
+
+    properties = publish_properties(3, [("area", "fancyroom")])
+
+    assert properties is not None
+    # paho sets the properties dynamically, so they are unknown to type checkers
+    assert getattr(properties, "TopicAlias") == 3
+    assert getattr(properties, "UserProperty") == [("area", "fancyroom")]
+
+
+def test_the_brokers_topic_alias_maximum_is_read_from_the_connack():
+    mqtt_client = aiomqtt.Client(
+        "mosquitto-broker.local", protocol=aiomqtt.ProtocolVersion.V5
+    )
+    broker_topic_alias_maximum = BrokerTopicAliasMaximum(mqtt_client)
+    paho_client: paho.Client = mqtt_client._client  # pyright: ignore[reportPrivateUsage]
+    assert paho_client.on_connect is not None
+    connack_properties = Properties(PacketTypes.CONNACK)
+    connack_properties.TopicAliasMaximum = 5
+
+    paho_client.on_connect(paho_client, None, {}, 0, connack_properties)
+    assert broker_topic_alias_maximum.value == 5
+    # aiomqtt still learns about the connection
+    assert mqtt_client._connected.done()  # pyright: ignore[reportPrivateUsage]
+
+    paho_client.on_connect(paho_client, None, {}, 0, Properties(PacketTypes.CONNACK))
+    assert broker_topic_alias_maximum.value == 0
@@ -0,0 +1,197 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from pico_to_mqtt.caseta.model import (
+    ButtonEvent,
+    ButtonId,
+    CasetaEvent,
+    PicoRemote,
+    PicoRemoteType,
+)
+from pico_to_mqtt.clock import FakeClock
+from pico_to_mqtt.config import PublishSchedulerConfig
+from pico_to_mqtt.publish_scheduler import PublishLane, PublishScheduler
+
+
+@pytest.fixture
+def example_pico_remote() -> PicoRemote:
+    return PicoRemote(
+        99,
+        PicoRemoteType.PICO_THREE_BUTTON_RAISE_LOWER,
+        "some_test_remote",
+        "fancyroom",
+        {1: ButtonId.INCREASE, 2: ButtonId.DECREASE},
+    )
+
+
+@pytest.fixture
+def fake_clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def mock_publish() -> AsyncMock:
+    return AsyncMock()
+
+
+@pytest.fixture
+def publish_scheduler(mock_publish: AsyncMock, fake_clock: FakeClock):
+    return PublishScheduler(mock_publish, PublishSchedulerConfig(), fake_clock)
+
+
+async def _drain(publish_scheduler: PublishScheduler) -> None:
+    run_task = asyncio.create_task(publish_scheduler.run())
+    while publish_scheduler.queue_depth:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    run_task.cancel()
+
+
+def _published_events(mock_publish: AsyncMock) -> list[CasetaEvent]:
+    return [call.args[0] for call in mock_publish.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_terminal_events_are_published_before_repeat_ticks(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+):
+    ongoing = CasetaEvent(
+        example_pico_remote, ButtonId.INCREASE, ButtonEvent.LONG_PRESS_ONGOING
+    )
+    single_press = CasetaEvent(
+        example_pico_remote, ButtonId.DECREASE, ButtonEvent.SINGLE_PRESS_COMPLETED
+    )
+    publish_scheduler.submit(ongoing)
+    publish_scheduler.submit(single_press)
+
+    await _drain(publish_scheduler)
+
+    assert _published_events(mock_publish) == [single_press, ongoing]
+
+
+@pytest.mark.asyncio
+async def test_repeat_ticks_for_the_same_button_are_coalesced(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+):
+    ongoing = CasetaEvent(
+        example_pico_remote, ButtonId.INCREASE, ButtonEvent.LONG_PRESS_ONGOING
+    )
+    for _ in range(5):
+        publish_scheduler.submit(ongoing)
+
+    await _drain(publish_scheduler)
+
+    assert _published_events(mock_publish) == [ongoing]
+    assert publish_scheduler.coalesced_repeat_ticks == 4
+
+
+@pytest.mark.asyncio
+async def test_terminal_event_sheds_pending_repeat_tick_for_the_same_button(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+):
+    ongoing = CasetaEvent(
+        example_pico_remote, ButtonId.INCREASE, ButtonEvent.LONG_PRESS_ONGOING
+    )
+    completed = CasetaEvent(
+        example_pico_remote, ButtonId.INCREASE, ButtonEvent.LONG_PRESS_COMPLETED
+    )
+    publish_scheduler.submit(ongoing)
+    publish_scheduler.submit(completed)
+
+    await _drain(publish_scheduler)
+
+    assert _published_events(mock_publish) == [completed]
+    assert publish_scheduler.shed_repeat_ticks == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_repeat_ticks_are_shed(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+    fake_clock: FakeClock,
+):
+    publish_scheduler.submit(
+        CasetaEvent(
+            example_pico_remote, ButtonId.INCREASE, ButtonEvent.LONG_PRESS_ONGOING
+        )
+    )
+    fake_clock.advance(1.0)
+
+    await _drain(publish_scheduler)
+
+    mock_publish.assert_not_awaited()
+    assert publish_scheduler.shed_repeat_ticks == 1
+
+
+@pytest.mark.asyncio
+async def test_events_queued_before_the_scheduler_runs_are_bounded(
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+    fake_clock: FakeClock,
+):
+    publish_scheduler = PublishScheduler(
+        mock_publish, PublishSchedulerConfig(max_terminal_backlog=2), fake_clock
+    )
+    events = [
+        CasetaEvent(example_pico_remote, ButtonId.INCREASE, button_event)
+        for button_event in (
+            ButtonEvent.SINGLE_PRESS_COMPLETED,
+            ButtonEvent.DOUBLE_PRESS_COMPLETED,
+            ButtonEvent.LONG_PRESS_COMPLETED,
+        )
+    ]
+    for event in events:
+        publish_scheduler.submit(event)
+
+    await _drain(publish_scheduler)
+
+    assert _published_events(mock_publish) == events[1:]
+    assert publish_scheduler.shed_terminal_events == 1
+
+
+@pytest.mark.asyncio
+async def test_queueing_delay_is_recorded_per_lane(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    fake_clock: FakeClock,
+):
+    publish_scheduler.submit(
+        CasetaEvent(
+            example_pico_remote, ButtonId.INCREASE, ButtonEvent.SINGLE_PRESS_COMPLETED
+        )
+    )
+    fake_clock.advance(0.25)
+
+    await _drain(publish_scheduler)
+
+    terminal_delays = publish_scheduler.queueing_delays[PublishLane.TERMINAL]
+    assert terminal_delays.count == 1
+    assert terminal_delays.max == pytest.approx(0.25)
+    assert publish_scheduler.queueing_delays[PublishLane.REPEAT].count == 0
+
+
+@pytest.mark.asyncio
+async def test_wait_until_idle_returns_once_queued_events_are_published(
+    publish_scheduler: PublishScheduler,
+    example_pico_remote: PicoRemote,
+    mock_publish: AsyncMock,
+):
+    single_press = CasetaEvent(
+        example_pico_remote, ButtonId.DECREASE, ButtonEvent.SINGLE_PRESS_COMPLETED
+    )
+    publish_scheduler.submit(single_press)
+    run_task = asyncio.create_task(publish_scheduler.run())
+
+    async with asyncio.timeout(1):
+        await publish_scheduler.wait_until_idle()
+    run_task.cancel()
+
+    assert _published_events(mock_publish) == [single_press]
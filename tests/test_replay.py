@@ -0,0 +1,115 @@
+import io
+import json
+from pathlib import Path
+
+from pico_to_mqtt.caseta.model import ButtonAction, ButtonEvent, ButtonId
+from pico_to_mqtt.config import ButtonWatcherConfig
+from pico_to_mqtt.journal import JournalRecord, JournalRecordKind
+from pico_to_mqtt.replay import (  # pyright: ignore[reportPrivateUsage]
+    _load_button_watcher_config,
+    _write_result,
+    replay,
+)
+
+
+def _button_action(
+    timestamp: float,
+    button_id: ButtonId,
+    button_action: ButtonAction,
+    remote_id: int = 7,
+) -> JournalRecord:
+    return JournalRecord(
+        JournalRecordKind.BUTTON_ACTION,
+        timestamp,
+        remote_id,
+        button_id,
+        button_action=button_action,
+    )
+
+
+def test_replay_detects_gestures_on_a_virtual_clock():
+    records = [
+        # a single press
+        _button_action(1000.0, ButtonId.POWER_ON, ButtonAction.PRESS),
+        _button_action(1000.1, ButtonId.POWER_ON, ButtonAction.RELEASE),
+        # a double press, an hour later
+        _button_action(4600.0, ButtonId.POWER_OFF, ButtonAction.PRESS),
+        _button_action(4600.05, ButtonId.POWER_OFF, ButtonAction.RELEASE),
+        _button_action(4600.1, ButtonId.POWER_OFF, ButtonAction.PRESS),
+        _button_action(4600.15, ButtonId.POWER_OFF, ButtonAction.RELEASE),
+    ]
+
+    replay_result = replay(records, ButtonWatcherConfig())
+
+    assert [
+        (gesture.event.button_id, gesture.event.button_event)
+        for gesture in replay_result.gestures
+    ] == [
+        (ButtonId.POWER_ON, ButtonEvent.SINGLE_PRESS_COMPLETED),
+        (ButtonId.POWER_OFF, ButtonEvent.DOUBLE_PRESS_COMPLETED),
+    ]
+    assert replay_result.gestures[0].offset_sec == 0.3
+    assert replay_result.virtual_duration_sec > 3600
+    assert replay_result.wall_duration_sec < 5
+    assert replay_result.raw_events == 6
+
+
+def test_replay_does_not_shed_a_burst_the_live_service_would_shed():
+    # more held buttons than the live service watches at once by default
+    remote_ids = range(200)
+    records = [
+        *(
+            _button_action(0.0, ButtonId.POWER_ON, ButtonAction.PRESS, remote_id)
+            for remote_id in remote_ids
+        ),
+        *(
+            _button_action(1.0, ButtonId.POWER_ON, ButtonAction.RELEASE, remote_id)
+            for remote_id in remote_ids
+        ),
+    ]
+
+    replay_result = replay(records, ButtonWatcherConfig())
+
+    assert replay_result.shed_tasks == 0
+    assert [gesture.event.button_event for gesture in replay_result.gestures].count(
+        ButtonEvent.LONG_PRESS_COMPLETED
+    ) == len(remote_ids)
+
+
+def test_replay_output_is_one_json_line_per_gesture_then_the_stats():
+    replay_result = replay(
+        [
+            _button_action(0.0, ButtonId.POWER_ON, ButtonAction.PRESS),
+            _button_action(0.1, ButtonId.POWER_ON, ButtonAction.RELEASE),
+        ],
+        ButtonWatcherConfig(),
+    )
+    output = io.StringIO()
+
+    _write_result(replay_result, output)
+
+    first_line, stats_line = output.getvalue().splitlines()
+    assert json.loads(first_line) == {
+        "offset_ms": 300.0,
+        "remote_id": 7,
+        "button_id": "POWER_ON",
+        "action": "SINGLE_PRESS_COMPLETED",
+    }
+    stats = json.loads(stats_line)["stats"]
+    assert stats["gestures"] == 1
+    assert stats["shed_tasks"] == 0
+    assert stats["detection_delay"]["single_press_completed"]["count"] == 1
+
+
+def test_the_settings_are_read_from_the_section_the_service_reads(tmp_path: Path):
+    settings_file = tmp_path / "settings.toml"
+    settings_file.write_text(
+        "[pico-to-mqtt.mqtt-config]\n"
+        'mqtt_hostname = "mosquitto-broker.local"\n'
+        "[pico-to-mqtt.button-watcher-config]\n"
+        "sleep_duration_ms = 123\n"
+    )
+
+    button_watcher_config = _load_button_watcher_config(settings_file)
+
+    assert button_watcher_config.sleep_duration_ms == 123
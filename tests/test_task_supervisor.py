@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from pico_to_mqtt.config import SheddingPolicy
+from pico_to_mqtt.task_supervisor import SupervisedTaskGroup
+
+
+async def _sleep_forever() -> None:
+    await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+async def test_a_full_group_rejects_new_tasks():
+    supervised_task_group = SupervisedTaskGroup(
+        "test", max_tasks=2, shedding_policy=SheddingPolicy.REJECT_NEW
+    )
+    first_task = supervised_task_group.spawn(_sleep_forever())
+    second_task = supervised_task_group.spawn(_sleep_forever())
+
+    assert supervised_task_group.spawn(_sleep_forever()) is None
+    assert supervised_task_group.metrics_snapshot()["rejected"] == 1
+    assert len(supervised_task_group) == 2
+    assert first_task is not None and not first_task.cancelled()
+    assert second_task is not None
+
+    await supervised_task_group.cancel_all()
+    assert len(supervised_task_group) == 0
+
+
+@pytest.mark.asyncio
+async def test_a_full_group_can_cancel_its_oldest_task_instead():
+    supervised_task_group = SupervisedTaskGroup(
+        "test", max_tasks=2, shedding_policy=SheddingPolicy.CANCEL_OLDEST
+    )
+    oldest_task = supervised_task_group.spawn(_sleep_forever())
+    supervised_task_group.spawn(_sleep_forever())
+
+    newest_task = supervised_task_group.spawn(_sleep_forever())
+    await asyncio.sleep(0)
+
+    assert newest_task is not None
+    assert oldest_task is not None and oldest_task.cancelled()
+    assert supervised_task_group.metrics_snapshot()["cancelled_for_room"] == 1
+    assert len(supervised_task_group) == 2
+    await supervised_task_group.cancel_all()
+
+
+@pytest.mark.asyncio
+async def test_a_closed_group_rejects_new_tasks_and_waits_for_running_ones():
+    supervised_task_group = SupervisedTaskGroup(
+        "test", max_tasks=2, shedding_policy=SheddingPolicy.REJECT_NEW
+    )
+    running_task = supervised_task_group.spawn(asyncio.sleep(0.01))
+    supervised_task_group.close()
+
+    assert supervised_task_group.spawn(_sleep_forever()) is None
+    assert await supervised_task_group.wait(timeout_sec=1)
+    assert running_task is not None and running_task.done()
+
+
+@pytest.mark.asyncio
+async def test_failed_tasks_are_reported_to_the_loop_exception_handler():
+    reported_contexts = []
+    asyncio.get_running_loop().set_exception_handler(
+        lambda _loop, context: reported_contexts.append(context)
+    )
+    supervised_task_group = SupervisedTaskGroup(
+        "test", max_tasks=2, shedding_policy=SheddingPolicy.REJECT_NEW
+    )
+
+    async def _fail() -> None:
+        raise ValueError("boom")
+
+    supervised_task_group.spawn(_fail())
+    await supervised_task_group.wait()
+    await asyncio.sleep(0)
+
+    assert supervised_task_group.metrics_snapshot()["failed"] == 1
+    assert isinstance(reported_contexts[0]["exception"], ValueError)